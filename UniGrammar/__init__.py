@@ -1,37 +1,101 @@
 """UniGrammar is a tool and a lib to deal with parser generators uniformly"""
 
 import typing
+import os
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from copy import deepcopy
 import warnings
 
 from .core.backend.Generator import Generator, TranspiledResult
 from .core.ast import Grammar
+from .core.templater import preexpandTemplates
+from .cache import TranspilationCache
 from .ownGrammarFormat import parseUniGrammarFile
+from .utils.tempFiles import getTempPath
 
 
 class GrammarTranspilationResults:  # pylint: disable=too-few-public-methods
-	"""Represents transpilation results of an unigrammar: mainly a transpiled grammar"""
+	"""Represents transpilation results of an unigrammar: mainly a transpiled grammar. If all the results were taken from a cache, the grammar is parsed from `grammarFile` only when it is accessed."""
 
-	__slots__ = ("grammar", "backendResultMapping")
+	__slots__ = ("_grammar", "grammarFile", "backendResultMapping")
 
-	def __init__(self, grammar: Grammar, backendResultMapping: typing.Dict[typing.Any, TranspiledResult]) -> None:
-		self.grammar = grammar
+	def __init__(self, grammar: typing.Optional[Grammar], backendResultMapping: typing.Dict[typing.Any, TranspiledResult], grammarFile: typing.Optional[Path] = None) -> None:
+		self._grammar = grammar
+		self.grammarFile = grammarFile
 		self.backendResultMapping = backendResultMapping
 
+	@property
+	def grammar(self) -> Grammar:
+		if self._grammar is None and self.grammarFile is not None:
+			self._grammar = parseUniGrammarFile(self.grammarFile)
+		return self._grammar
 
-def transpile(grammar: Grammar, backend: Generator) -> str:
-	"""Transpiles a unigrammar into backend-specific grammar"""
+	@grammar.setter
+	def grammar(self, v: Grammar) -> None:
+		self._grammar = v
+
+
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+def transpileToLines(grammar: Grammar, backend: Generator) -> typing.Iterator[str]:
+	"""Transpiles a unigrammar into backend-specific grammar lazily, yielding its lines (without `\\n`)"""
 	ctx = backend.initContext(grammar)
 	backend.preprocessGrammar(grammar, ctx)
-	lines = backend._transpile(grammar, ctx)
+	yield from backend._transpile(grammar, ctx)
 
+
+def transpile(grammar: Grammar, backend: Generator) -> str:
+	"""Transpiles a unigrammar into backend-specific grammar"""
+	lines = transpileToLines(grammar, backend)
 	return TranspiledResult(grammar.meta.id, "\n".join(lines))
 
 
+def writeLines(lines: typing.Iterable[str], stream: typing.TextIO) -> None:
+	"""Writes lines into a stream, giving the same result as writing `"\\n".join(lines)`, but without building the whole text in memory"""
+	lines = iter(lines)
+	for line in lines:
+		stream.write(line)
+		break
+	for line in lines:
+		stream.write("\n")
+		stream.write(line)
+
+
+def getTranspiledFilePath(outputDir: Path, grammarId: str, backend: Generator) -> Path:
+	return outputDir / (grammarId + "." + backend.META.mainExtension)
+
+
+def writeLinesToFile(lines: typing.Iterable[str], path: Path) -> None:
+	"""Streams lines into a temporary file in the dir of `path` and replaces `path` with it only when all of them are written, so a failure in the middle doesn't leave a truncated file in place of the previous one"""
+	tmp = getTempPath(path)
+	try:
+		with tmp.open("wt", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+			writeLines(lines, f)
+		os.replace(tmp, path)
+	except BaseException:
+		try:
+			tmp.unlink()
+		except FileNotFoundError:
+			pass
+		raise
+
+
+def transpileToFile(grammar: Grammar, backend: Generator, outputDir: Path, cache: typing.Optional[TranspilationCache] = None, cacheKey: typing.Optional[str] = None) -> Path:
+	"""Transpiles a unigrammar into backend-specific grammar streaming it into a file in `outputDir`. Returns the path of the file. If `cache` is given, the result is streamed into its entry `cacheKey` too."""
+	res = getTranspiledFilePath(outputDir, grammar.meta.id, backend)
+	lines = transpileToLines(grammar, backend)
+	if cache is not None:
+		lines = cache.teeLines(cacheKey, grammar.meta.id, lines)
+	writeLinesToFile(lines, res)
+	return res
+
+
 def _transpileGrammarForGenerators(gr: Grammar, backends: typing.Iterable[Generator]) -> typing.Iterator[typing.Tuple[Generator, TranspiledResult]]:
+	gr = preexpandTemplates(gr)
 	for backend in backends:
-		yield backend, transpile(deepcopy(gr), backend)  # during transpilation AST is modified, so we need a fresh copy
+		yield backend, transpile(gr.fork(), backend)  # during transpilation AST is modified, so we need a fresh copy. Rules are shared between forks and are copied only when modified.
 
 
 def transpileGrammarForGenerators(gr: Grammar, backends: typing.Iterable[Generator]) -> GrammarTranspilationResults:
@@ -39,20 +103,125 @@ def transpileGrammarForGenerators(gr: Grammar, backends: typing.Iterable[Generat
 	return GrammarTranspilationResults(gr, dict(_transpileGrammarForGenerators(gr, backends)))
 
 
-def transpileFileForGenerators(grammarFile: Path, backends: typing.Iterable[Generator]) -> GrammarTranspilationResults:
-	"""Just transpiles a unigrammar for multiple backends"""
-	gr = parseUniGrammarFile(grammarFile)  # during transpilation AST is modified, so we need a fresh copy
-	return transpileGrammarForGenerators(gr, backends)
+def _lookupCache(grammarFile: Path, backends: typing.Iterable[Generator], cache: TranspilationCache) -> typing.Tuple[typing.Dict[Generator, TranspiledResult], typing.Dict[Generator, str]]:
+	"""Splits backends into the ones which results are in the cache and the ones needing transpilation (mapped to the cache keys of their results)"""
+	source = grammarFile.read_bytes()
+	hits = {}
+	misses = {}
+	for backend in backends:
+		key = cache.computeKey(grammarFile, source, backend)
+		res = cache.get(key)
+		if res is None:
+			misses[backend] = key
+		else:
+			hits[backend] = res
+	return hits, misses
+
+
+def transpileFileForGenerators(grammarFile: Path, backends: typing.Iterable[Generator], cache: typing.Optional[TranspilationCache] = None) -> GrammarTranspilationResults:
+	"""Just transpiles a unigrammar for multiple backends. If `cache` is given, the results for unchanged grammars are taken from it without parsing them."""
+	if cache is None:
+		gr = parseUniGrammarFile(grammarFile)
+		return transpileGrammarForGenerators(gr, backends)
+
+	backends = tuple(backends)
+	hits, misses = _lookupCache(grammarFile, backends, cache)
+	gr = None
+	backendResultMapping = {}
+	for backend in backends:
+		res = hits.get(backend, None)
+		if res is None:
+			if gr is None:
+				gr = parseUniGrammarFile(grammarFile)
+				preexpanded = preexpandTemplates(gr)
+			cache[misses[backend]] = res = transpile(preexpanded.fork(), backend)
+		backendResultMapping[backend] = res
+	return GrammarTranspilationResults(gr, backendResultMapping, grammarFile)
 
 
-def transpileFilesForGenerators(files: typing.Iterable[Path], backends: typing.Iterable[Generator]) -> typing.Iterable[typing.Tuple[Path, GrammarTranspilationResults]]:
+def transpileFilesForGenerators(files: typing.Iterable[Path], backends: typing.Iterable[Generator], cache: typing.Optional[TranspilationCache] = None) -> typing.Iterable[typing.Tuple[Path, GrammarTranspilationResults]]:
 	"""Just transpiles multiple unigrammar files for multiple backends"""
 	for file in files:
-		yield file, transpileFileForGenerators(file, backends)
-
-
-def saveTranspiled(transpiledFiles: typing.Dict[Path, GrammarTranspilationResults], outputDir: Path) -> None:
-	"""Saves transpiled grammars (retured by `transpileFilesForGenerators` into files"""
-	for transpiled in transpiledFiles.values():
+		yield file, transpileFileForGenerators(file, backends, cache)
+
+
+_workerGrammarsCache = {}
+
+
+def _transpileUnitInWorker(grammarFile: Path, backend: Generator, returnGrammar: bool) -> typing.Tuple[typing.Optional[Grammar], TranspiledResult]:
+	"""Transpiles a grammar file for a single backend within a worker process. Each worker parses every file and expands the templates not depending on backend only once, the transpilation is done on forks of the result. The parsed grammar is sent back to the parent only if `returnGrammar`, pickling it is not cheap."""
+	cached = _workerGrammarsCache.get(grammarFile, None)
+	if cached is None:
+		gr = parseUniGrammarFile(grammarFile)
+		_workerGrammarsCache[grammarFile] = cached = (gr, preexpandTemplates(gr))
+	gr, preexpanded = cached
+	return (gr if returnGrammar else None), transpile(preexpanded.fork(), backend)
+
+
+def transpileFilesForGeneratorsInParallel(files: typing.Iterable[Path], backends: typing.Iterable[Generator], jobs: typing.Optional[int] = None, cache: typing.Optional[TranspilationCache] = None, returnGrammars: bool = False) -> typing.Iterable[typing.Tuple[Path, GrammarTranspilationResults]]:
+	"""Like `transpileFilesForGenerators`, but spreads (file, backend) pairs over a pool of `jobs` processes (`None` means the count of CPUs). The results are yielded in the same order as `transpileFilesForGenerators` yields them. The parsed grammars are sent back from the workers only if `returnGrammars`, otherwise `GrammarTranspilationResults.grammar` parses the file on access."""
+	if jobs is not None and jobs < 1:
+		raise ValueError("The count of jobs must be positive", jobs)
+
+	files = tuple(Path(file) for file in files)
+	backends = tuple(backends)
+
+	if jobs == 1 or not backends or len(files) * len(backends) == 1:
+		yield from transpileFilesForGenerators(files, backends, cache)
+		return
+
+	with ProcessPoolExecutor(max_workers=jobs) as pool:
+		units = []
+		for file in files:
+			if cache is not None:
+				hits, misses = _lookupCache(file, backends, cache)
+			else:
+				hits, misses = {}, dict.fromkeys(backends)
+			futures = {backend: pool.submit(_transpileUnitInWorker, file, backend, returnGrammars and not i) for i, backend in enumerate(misses)}
+			units.append((file, hits, misses, futures))
+
+		for file, hits, misses, futures in units:
+			gr = None
+			backendResultMapping = {}
+			for backend in backends:
+				res = hits.get(backend, None)
+				if res is None:
+					unitGrammar, res = futures[backend].result()
+					if unitGrammar is not None:
+						gr = unitGrammar
+					if cache is not None:
+						cache[misses[backend]] = res
+				backendResultMapping[backend] = res
+			yield file, GrammarTranspilationResults(gr, backendResultMapping, file)
+
+
+def transpileFilesForGeneratorsToDir(files: typing.Iterable[Path], backends: typing.Iterable[Generator], outputDir: Path, cache: typing.Optional[TranspilationCache] = None) -> typing.Iterable[typing.Tuple[Path, Generator, Path]]:
+	"""Transpiles multiple unigrammar files for multiple backends streaming the results into files in `outputDir` as soon as they are produced. Yields tuples (source file, backend, output file)."""
+	backends = tuple(backends)
+	for file in files:
+		file = Path(file)
+		if cache is not None:
+			hits, misses = _lookupCache(file, backends, cache)
+		else:
+			hits, misses = {}, dict.fromkeys(backends)
+
+		gr = None
+		for backend in backends:
+			res = hits.get(backend, None)
+			if res is not None:
+				resFile = getTranspiledFilePath(outputDir, res.id, backend)
+				writeLinesToFile((res.text,), resFile)
+			else:
+				if gr is None:
+					gr = preexpandTemplates(parseUniGrammarFile(file))
+				resFile = transpileToFile(gr.fork(), backend, outputDir, cache, misses[backend])
+			yield file, backend, resFile
+
+
+def saveTranspiled(transpiledFiles: typing.Union[typing.Mapping[Path, GrammarTranspilationResults], typing.Iterable[typing.Tuple[Path, GrammarTranspilationResults]]], outputDir: Path) -> None:
+	"""Saves transpiled grammars (retured by `transpileFilesForGenerators`) into files. If an iterable is passed instead of a mapping, every file results are written as soon as they are produced."""
+	if isinstance(transpiledFiles, Mapping):
+		transpiledFiles = transpiledFiles.items()
+	for _, transpiled in transpiledFiles:
 		for backend, transpiledResult in transpiled.backendResultMapping.items():
-			(outputDir / (transpiledResult.id + "." + backend.META.mainExtension)).write_text(transpiledResult.text, encoding="utf-8")
+			writeLinesToFile((transpiledResult.text,), getTranspiledFilePath(outputDir, transpiledResult.id, backend))
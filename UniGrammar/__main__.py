@@ -1,61 +1,65 @@
 """This module defines the CLI"""
 import typing
+import os
 import re
+import json
+import time
 import warnings
 from pathlib import Path
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from threading import Lock, RLock
+from concurrent.futures import ProcessPoolExecutor
 
 from plumbum import cli
 from pantarei import chosenProgressReporter
 
-from UniGrammarRuntimeCore.PoolManager import PoolManager
 from UniGrammarRuntime.ParserBundle import InMemoryGrammarResources, ParserBundle
 
-from . import parseUniGrammarFile, saveTranspiled, transpileFilesForGenerators, transpile
+from . import GrammarTranspilationResults, parseUniGrammarFile, saveTranspiled, transpileFilesForGenerators, transpileFilesForGeneratorsInParallel, transpileFilesForGeneratorsToDir, transpile
+from .build import Build, discoverGrammars
+from .cache import TranspilationCache
+from .daemon import DaemonClient, getDefaultSocketPath, serve
 from .core.backend.Generator import Generator
 from .core.backend.Runner import Runner, NotYetImplementedRunner
+from .core.backend.Pools import compileParser, parsersFactoriesAndCompilersPool, runnersPool
 from UniGrammarRuntime.grammarClasses import GrammarClass
 from .core.WrapperGen import WrapperGen
-from .tools.multilanguage.antlr4 import ANTLR
-from .tools.multilanguage.CoCoR import CoCoR
-from .tools.multilanguage.waxeye import Waxeye
-from .tools.python.parglare import Parglare
-from .tools.python.arpeggio import Arpeggio
-from .tools.python.parsimonious import Parsimonious
-from .tools.python.TatSu import TatSu
-from .tools.python.lark import Lark
-
-backendz = (Parglare, ANTLR, Waxeye, TatSu, Parsimonious, Arpeggio, CoCoR, Lark)
-backendsNames = {b.RUNNER.PARSER.META.product.name: b for b in backendz}
+from .utils.fileWatcher import createFileWatcher
+from .utils.taskGraph import TaskStatus
+from .core.backend.Registry import backendsRegistry
 
 
 class selectors:
-	"""Contains methods to retrieve backends matching some criteria. Each method corresponds to a criteria"""
+	"""Contains methods to retrieve backends matching some criteria. Each method corresponds to a criteria. Only the selected backends are imported."""
 
 	@staticmethod
 	def name(name: str) -> typing.Iterable[Generator]:
 		"""Selects a backend based on its name"""
-		b = backendsNames.get(name, None)
-		if b is None:
-			raise KeyError(name, backendsNames)
+		d = backendsRegistry.byName.get(name, None)
+		if d is None:
+			raise KeyError(name, tuple(backendsRegistry.byName))
 
-		yield b
+		yield backendsRegistry.load(d)
 
 	@staticmethod
 	def lang(lang: str) -> typing.Iterable[Generator]:
 		"""Selects a backend based on languages supported by the backend"""
-		for b in backendz:
-			if lang in b.META.runtimeLib:
-				yield b
+		for d in backendsRegistry.iterDescribed():
+			if lang in d.langs:
+				tool = backendsRegistry.tryLoad(d)
+				if tool is not None:
+					yield tool
 
 	@staticmethod
 	def cls(grammarClass: str) -> typing.Iterable[Generator]:
 		"""Selects a backend based on classes of grammars that can be implemented using it."""
 		grammarClass = GrammarClass.fromStr(grammarClass)
-		for b in backendz:
-			for gCl in b.META.grammarClasses:
+		for d in backendsRegistry.iterDescribed():
+			for gCl in d.grammarClasses:
 				if grammarClass < gCl:
-					yield b
+					tool = backendsRegistry.tryLoad(d)
+					if tool is not None:
+						yield tool
 					break
 
 
@@ -79,7 +83,7 @@ allToolsNames = frozenset(("all", "*"))
 
 def _parseToolsStrings(s: str) -> typing.Iterable[Generator]:
 	if s in allToolsNames:
-		return backendz
+		return iter(backendsRegistry)
 	for bs in s.split(":"):
 		return parseToolsString(bs)
 
@@ -89,6 +93,15 @@ def parseToolsStrings(s: str) -> typing.Set[Generator]:
 	return set(_parseToolsStrings(s))
 
 
+@cli.Predicate
+def nonNegativeInt(s: str) -> int:
+	"""Parses a count of jobs, 0 means the count of CPUs"""
+	res = int(s)
+	if res < 0:
+		raise ValueError("Must not be negative", res)
+	return res
+
+
 class UniGrammarCLI(cli.Application):
 	"""UniGrammar is a tool for transpiling grammars to other parsers generators."""
 
@@ -104,12 +117,29 @@ def createGeneratorsToToolsMapping(tools):
 class UniGrammarCLICommandInvolvingTranspilation(cli.Application):
 	"""A CLI command that requires transpilation of a grammar"""
 
-	def prepare(self, tools, *files):  # pylint:disable=no-self-use
+	jobs = cli.SwitchAttr(["-j", "--jobs"], nonNegativeInt, default=1, help="The count of processes to transpile grammars in. 0 means the count of CPUs")
+	noCache = cli.Flag(["--no-cache"], help="Do not use the cache of transpiled grammars")
+	noDaemon = cli.Flag(["--no-daemon"], help="Do the work in this process even if a daemon (see `serve`) is running")
+
+	def getCache(self) -> typing.Optional[TranspilationCache]:
+		return None if self.noCache else TranspilationCache()
+
+	def getDaemon(self) -> typing.Optional[DaemonClient]:
+		"""Returns a client of a running daemon, if the command should be forwarded to it"""
+		if self.noDaemon:
+			return None
+		return DaemonClient.connect()
+
+	def transpileLazily(self, generators, files, returnGrammars: bool = False):
+		"""Transpiles the files yielding the results for each file as soon as they are produced"""
+		return transpileFilesForGeneratorsInParallel(files, generators, self.jobs or None, self.getCache(), returnGrammars)
+
+	def prepare(self, tools, *files, returnGrammars: bool = False):
 		"""Transpiles the files into in-memory grammar sources in the target DSLs ready to for further usage"""
 		tools = parseToolsStrings(tools)
 		generators = createGeneratorsToToolsMapping(tools)
 		files = tuple(Path(file) for file in files)
-		fileResMapping = dict(transpileFilesForGenerators(files, generators))
+		fileResMapping = dict(self.transpileLazily(generators, files, returnGrammars))
 		return generators, fileResMapping, len(tools)
 
 
@@ -118,8 +148,20 @@ class UniGrammarTranspileCLI(UniGrammarCLICommandInvolvingTranspilation):
 	"""Transpile a unigrammar into a set of grammar files specific for parser generators."""
 
 	def main(self, backends="all", *files: cli.ExistingFile):  # pylint:disable=keyword-arg-before-vararg,arguments-differ
-		generatorsToTools, fileResMapping, toolsCount = self.prepare(backends, *files)
-		saveTranspiled(fileResMapping, Path("."))
+		outputDir = Path(".")
+		daemon = self.getDaemon()
+		if daemon is not None:
+			with daemon:
+				daemon("transpile", backends=backends, files=[str(Path(f).absolute()) for f in files], outputDir=str(outputDir.absolute()), noCache=self.noCache)
+			return
+
+		generators = createGeneratorsToToolsMapping(parseToolsStrings(backends))
+		files = tuple(Path(file) for file in files)
+		if self.jobs == 1:
+			for _ in transpileFilesForGeneratorsToDir(files, generators, outputDir, self.getCache()):
+				pass
+		else:
+			saveTranspiled(self.transpileLazily(generators, files), outputDir)
 
 
 @UniGrammarCLI.subcommand("gen-bundle")
@@ -175,12 +217,11 @@ class UniGrammarGenBundleCLI(UniGrammarCLICommandInvolvingTranspilation):
 
 def runTestsForGenerator(tests, runner, transpilationResult):
 	"""Runs tests for a transpiled grammar using a specific runner (usually associated to a backend)."""
-	compiler = parsersFactoriesAndCompilersPool(runner.COMPILER)
-	parserFactory = parsersFactoriesAndCompilersPool(runner.PARSER)
+	runTestsOnParser(tests, compileParser(runner, transpilationResult))
 
-	compiled = compiler.compileStr(transpilationResult.text, "python")
-	parser = parserFactory.fromInternal(compiled)
 
+def runTestsOnParser(tests, parser):
+	"""Runs tests using an already compiled parser."""
 	with chosenProgressReporter(len(tests), "testing") as pb:
 		for i, test in enumerate(tests):
 			try:
@@ -191,10 +232,6 @@ def runTestsForGenerator(tests, runner, transpilationResult):
 				print(ex, file=pb)
 
 
-runnersPool = PoolManager()
-parsersFactoriesAndCompilersPool = PoolManager()
-
-
 def runTests(generatorsToToolsMapping, fileResMapping, toolsCount):
 	"""Runs tests for transpiled grammars."""
 	print()
@@ -221,10 +258,240 @@ class UniGrammarTestCLI(UniGrammarCLICommandInvolvingTranspilation):
 	"""Transpile a specific unigrammar into a grammar and run tests on it"""
 
 	def main(self, backends="all", *files: cli.ExistingFile):  # pylint:disable=keyword-arg-before-vararg,arguments-differ
-		generatorsToToolsMapping, fileResMapping, toolsCount = self.prepare(backends, *files)
+		daemon = self.getDaemon()
+		if daemon is not None:
+			with daemon:
+				results = daemon("test", backends=backends, files=[str(Path(f).absolute()) for f in files], noCache=self.noCache)
+			printDaemonTestsResults(results)
+			return
+
+		generatorsToToolsMapping, fileResMapping, toolsCount = self.prepare(backends, *files, returnGrammars=True)
 		runTests(generatorsToToolsMapping, fileResMapping, toolsCount)
 
 
+def printDaemonTestsResults(results) -> None:
+	for r in results:
+		if r["failures"] is None:
+			print(r["file"], r["tool"], "skipped: runner is not yet implemented")
+			continue
+		print(r["file"], r["tool"], r["count"] - len(r["failures"]), "/", r["count"], "passed")
+		for test, error in r["failures"]:
+			print(repr(test))
+			print(error)
+
+
+compiledParsersCache = OrderedDict()
+compiledParsersCacheLock = RLock()
+COMPILED_PARSERS_CACHE_SIZE = 64
+
+
+class LockedParser:  # pylint: disable=too-few-public-methods
+	"""A parser shared between the threads of `serve`. Parsers of backends are not thread-safe, so a parser is used by a single thread at a time."""
+
+	__slots__ = ("parser", "lock")
+
+	def __init__(self, parser) -> None:
+		self.parser = parser
+		self.lock = Lock()
+
+	def __call__(self, text: str) -> typing.Any:
+		with self.lock:
+			return self.parser(text)
+
+
+def getCompiledParser(tool, transpilationResult) -> LockedParser:
+	"""Returns a parser for a transpiled grammar, compiling it only if it has not been compiled recently"""
+	key = (tool, transpilationResult.text)
+	with compiledParsersCacheLock:
+		res = compiledParsersCache.get(key, None)
+		if res is not None:
+			compiledParsersCache.move_to_end(key)
+			return res
+
+	res = LockedParser(compileParser(runnersPool(tool.RUNNER), transpilationResult))
+	with compiledParsersCacheLock:
+		compiledParsersCache[key] = res
+		while len(compiledParsersCache) > COMPILED_PARSERS_CACHE_SIZE:
+			compiledParsersCache.popitem(last=False)
+	return res
+
+
+class daemonOps:
+	"""Requests `serve` processes. Arguments and results must be serializable into JSON, paths must be absolute."""
+
+	@staticmethod
+	def transpile(backends: str, files: typing.List[str], outputDir: str, noCache: bool = False) -> typing.List[str]:
+		generators = createGeneratorsToToolsMapping(parseToolsStrings(backends))
+		cache = None if noCache else TranspilationCache()
+		return [str(resFile) for _, _, resFile in transpileFilesForGeneratorsToDir([Path(f) for f in files], generators, Path(outputDir), cache)]
+
+	@staticmethod
+	def test(backends: str, files: typing.List[str], noCache: bool = False) -> typing.List[typing.Dict[str, typing.Any]]:
+		generatorsToToolsMapping = createGeneratorsToToolsMapping(parseToolsStrings(backends))
+		cache = None if noCache else TranspilationCache()
+		res = []
+		for f, transpiled in transpileFilesForGenerators([Path(f) for f in files], generatorsToToolsMapping, cache):
+			tests = tuple(transpiled.grammar.tests.getTests(f.parent))
+			for generator, transpilationResult in transpiled.backendResultMapping.items():
+				for tool in generatorsToToolsMapping[generator]:
+					r = {"file": str(f), "tool": tool.__name__, "count": len(tests), "failures": None}
+					res.append(r)
+					if tool.RUNNER is None or issubclass(tool.RUNNER, NotYetImplementedRunner):
+						continue
+
+					parser = getCompiledParser(tool, transpilationResult)
+					r["failures"] = failures = []
+					for test in tests:
+						try:
+							parser(test)
+						except Exception as ex:  # pylint: disable=broad-except
+							failures.append((test, str(ex)))
+		return res
+
+
+@UniGrammarCLI.subcommand("serve")
+class UniGrammarServeCLI(cli.Application):
+	"""Runs a daemon keeping backends, compilers and parsers warm. While it is running, `transpile` and `test` commands are forwarded to it. The socket path can be set with `UNIGRAMMAR_DAEMON_SOCKET` env var."""
+
+	def main(self):  # pylint:disable=arguments-differ
+		socketPath = getDefaultSocketPath()
+		print("Listening on", socketPath)
+		serve({"transpile": daemonOps.transpile, "test": daemonOps.test}, socketPath)
+
+
+class WatchedGrammar:
+	"""Keeps the state of a watched unigrammar warm: its AST, its tests, transpiled grammars and compiled parsers"""
+
+	__slots__ = ("file", "grammar", "testFiles", "tests", "transpiled", "parsers")
+
+	def __init__(self, file: Path) -> None:
+		self.file = file
+		self.grammar = None
+		self.testFiles = frozenset()
+		self.tests = ()
+		self.transpiled = {}
+		self.parsers = {}
+
+	def reparse(self) -> None:
+		self.grammar = parseUniGrammarFile(self.file)
+		self.reloadTests()
+
+	def reloadTests(self) -> None:
+		spec = self.grammar.tests
+		if spec is None:
+			self.testFiles = frozenset()
+			self.tests = ()
+			return
+
+		baseDir = self.file.parent
+		self.testFiles = frozenset(f.absolute() for f in spec.getTestFiles(baseDir))
+		self.tests = tuple(spec.getTests(baseDir))
+
+	def getParser(self, tool, transpilationResult):
+		"""Returns a compiled parser, recompiling it only if the transpiled grammar has changed"""
+		prev = self.parsers.get(tool, None)
+		if prev is not None and prev[0] == transpilationResult.text:
+			return prev[1]
+
+		parser = compileParser(runnersPool(tool.RUNNER), transpilationResult)
+		self.parsers[tool] = (transpilationResult.text, parser)
+		return parser
+
+
+@UniGrammarCLI.subcommand("watch")
+class UniGrammarWatchCLI(cli.Application):
+	"""Watches unigrammars and their tests. When a grammar is modified, it is retranspiled, its parsers are recompiled (if the transpiled grammar has changed) and tested. When only tests are modified, they are rerun on the already compiled parsers. All of it is done in this process, keeping the state warm, so there are no options for jobs, the cache and the daemon."""
+
+	noTests = cli.Flag(["-T", "--no-tests"], help="Only transpile grammars, do not compile and test them")
+	outDir = cli.SwitchAttr(["-O", "--output-dir"], default=None, help="The dir to save transpiled grammars to. If not set, they are not saved")
+
+	def transpileAndTest(self, st: WatchedGrammar, generatorsToToolsMapping, reparse: bool = True) -> None:
+		if reparse:
+			st.reparse()
+			for generator in generatorsToToolsMapping:
+				transpiledResult = st.transpiled[generator] = transpile(st.grammar.fork(), generator)
+				if self.outDir is not None:
+					saveTranspiled({st.file: GrammarTranspilationResults(st.grammar, {generator: transpiledResult})}, Path(self.outDir))
+		else:
+			st.reloadTests()
+
+		if self.noTests:
+			return
+
+		for generator, tools in generatorsToToolsMapping.items():
+			for tool in tools:
+				if tool.RUNNER is None or issubclass(tool.RUNNER, NotYetImplementedRunner):
+					continue
+				print(st.file.name, tool.__name__)
+				runTestsOnParser(st.tests, st.getParser(tool, st.transpiled[generator]))
+
+	def process(self, st: WatchedGrammar, generatorsToToolsMapping, reparse: bool) -> None:
+		startTime = time.perf_counter()
+		try:
+			self.transpileAndTest(st, generatorsToToolsMapping, reparse)
+		except Exception as ex:  # pylint: disable=broad-except
+			print(st.file, ex)
+			return
+		print(st.file, "processed in", round((time.perf_counter() - startTime) * 1000), "ms")
+
+	def main(self, backends="all", *files: cli.ExistingFile):  # pylint:disable=keyword-arg-before-vararg,arguments-differ
+		generatorsToToolsMapping = createGeneratorsToToolsMapping(parseToolsStrings(backends))
+		states = [WatchedGrammar(Path(f).absolute()) for f in files]
+
+		with createFileWatcher() as watcher:
+			for st in states:
+				self.process(st, generatorsToToolsMapping, True)
+
+			try:
+				while True:
+					watchedFiles = set()
+					for st in states:
+						watchedFiles.add(st.file)
+						watchedFiles |= st.testFiles
+					watcher.watch(watchedFiles)
+
+					modified = watcher.wait()
+					for st in states:
+						if st.file in modified:
+							self.process(st, generatorsToToolsMapping, True)
+						elif st.grammar is not None and not st.testFiles.isdisjoint(modified):
+							self.process(st, generatorsToToolsMapping, False)
+			except KeyboardInterrupt:
+				pass
+
+
+@UniGrammarCLI.subcommand("build")
+class UniGrammarBuildCLI(cli.Application):
+	"""Builds all the unigrammars within a dir: transpiles them for the backends, compiles, tests them and puts them into a parser bundle. Tasks which inputs have not changed since the previous build are skipped. Prints a summary in JSON."""
+
+	outDir = cli.SwitchAttr(["-O", "--output-dir"], default="./build", help="The dir to put the results into")
+	jobs = cli.SwitchAttr(["-j", "--jobs"], nonNegativeInt, default=0, help="The count of threads and processes to build in. 0 means the count of CPUs")
+	summaryFile = cli.SwitchAttr(["--summary"], default=None, help="The file to write the summary into instead of printing it")
+	noTests = cli.Flag(["-T", "--no-tests"], help="Do not run tests")
+	noBundle = cli.Flag(["-B", "--no-bundle"], help="Do not generate a parser bundle")
+
+	def main(self, dir: cli.ExistingDirectory, backends="all"):  # pylint:disable=arguments-differ,redefined-builtin
+		generatorsToToolsMapping = createGeneratorsToToolsMapping(parseToolsStrings(backends))
+		b = Build(discoverGrammars(Path(dir)), generatorsToToolsMapping, Path(self.outDir), not self.noTests, not self.noBundle)
+
+		jobs = self.jobs or os.cpu_count() or 1
+		if jobs == 1:
+			summary = b(jobs)
+		else:
+			with ProcessPoolExecutor(jobs) as pool:
+				summary = b(jobs, pool)
+
+		summaryText = json.dumps(summary, indent="\t")
+		if self.summaryFile is None:
+			print(summaryText)
+		else:
+			Path(self.summaryFile).write_text(summaryText, encoding="utf-8")
+
+		if TaskStatus.failed in summary["counts"]:
+			return 1
+		return None
+
+
 @UniGrammarCLI.subcommand("vis")
 class UniGrammarVisCLI(cli.Application):
 	"""Visualizes the parse tree using the tools specific to the backend"""
@@ -247,5 +514,35 @@ class UniGrammarVisCLI(cli.Application):
 			parser = parserFactory.fromInternal(compiled)
 			runner.visualize(parser, test)
 
+@UniGrammarCLI.subcommand("cache")
+class UniGrammarCacheCLI(cli.Application):
+	"""Manages the cache of transpiled grammars. Its dir can be set with `UNIGRAMMAR_CACHE_DIR` env var, its size cap (in bytes) - with `UNIGRAMMAR_CACHE_SIZE` one."""
+
+	def main(self):  # pylint:disable=arguments-differ
+		if self.nested_command is None:
+			self.help()
+			return 1
+		return None
+
+
+@UniGrammarCacheCLI.subcommand("stats")
+class UniGrammarCacheStatsCLI(cli.Application):
+	"""Shows the count and the total size of cached transpiled grammars"""
+
+	def main(self):  # pylint:disable=arguments-differ
+		stats = TranspilationCache().stats()
+		print("dir:", stats.dir)
+		print("entries:", stats.count)
+		print("size:", stats.size, "/", stats.maxSize)
+
+
+@UniGrammarCacheCLI.subcommand("clear")
+class UniGrammarCacheClearCLI(cli.Application):
+	"""Removes all the cached transpiled grammars"""
+
+	def main(self):  # pylint:disable=arguments-differ
+		TranspilationCache().clear()
+
+
 if __name__ == "__main__":
 	UniGrammarCLI.run()
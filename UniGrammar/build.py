@@ -0,0 +1,323 @@
+"""Building whole repositories of grammars: every grammar is parsed, its templates are expanded and it is transpiled for every backend; the results are compiled, tested and put into a parser bundle. The work is represented as a graph of tasks, the ones which inputs have not changed since the previous build are skipped."""
+
+import typing
+import json
+import time
+import warnings
+from copy import deepcopy
+from hashlib import sha256
+from pathlib import Path
+
+from . import getTranspiledFilePath, transpile, writeLinesToFile
+from .cache import getUniGrammarVersion
+from .core.ast import Grammar
+from .core.ast.compact import CompactGrammar
+from .core.backend.Generator import Generator, TranspiledResult
+from .core.backend.Pools import compileGrammar, instantiateParser, runnersPool
+from .core.backend.Runner import NotYetImplementedRunner
+from .core.backend.Tool import Tool
+from .core.templater import preexpandTemplates
+from .ownGrammarFormat import parseUniGrammarFile
+from .ownGrammarFormat.decodeExtension import detectFormatFromFileExtension
+from .utils.taskGraph import Task, TaskStatus, WorkStealingExecutor
+
+__all__ = ("discoverGrammars", "Build", "TestsFailed")
+
+STAMPS_FILE_NAME = ".UniGrammarBuild.json"
+
+
+class TestsFailed(Exception):
+	"""Some tests have failed to be parsed"""
+
+
+def discoverGrammars(rootDir: Path) -> typing.List[Path]:
+	"""Finds unigrammars (but not the files of tests in unigrammar format) within a dir recursively"""
+	res = []
+	for f in sorted(rootDir.glob("**/*.?ug")):
+		try:
+			isTest = detectFormatFromFileExtension(f.suffix)[2]
+		except (ValueError, LookupError, NotImplementedError) as ex:  # not a unigrammar, or its format is not supported on this machine
+			warnings.warn("Skipping " + str(f) + ": " + repr(ex))
+			continue
+		if not isTest:
+			res.append(f)
+	return res
+
+
+def _hash(*parts: typing.Union[str, bytes]) -> str:
+	h = sha256()
+	for p in parts:
+		if isinstance(p, str):
+			p = p.encode("utf-8")
+		h.update(p)
+		h.update(b"\0")
+	return h.hexdigest()
+
+
+def _hashFile(f: Path) -> str:
+	try:
+		return _hash(f.read_bytes())
+	except FileNotFoundError:
+		return ""
+
+
+def _getQualName(cls: type) -> str:
+	return cls.__module__ + "." + cls.__qualname__
+
+
+def _transpileSerialized(serialized: bytes, generator: typing.Type[Generator]) -> TranspiledResult:
+	"""Transpiles a grammar serialized into `CompactGrammar` within a worker process. The compact serialization is far cheaper to send than a pickled AST."""
+	return transpile(CompactGrammar.fromBytes(serialized).toGrammar(), generator)
+
+
+class BuildStamps:
+	"""Keys of the inputs of the tasks done during the previous build, paths of their outputs and lists of tests files of grammars"""
+
+	__slots__ = ("path", "keys", "outputs", "testFiles")
+
+	def __init__(self, path: Path) -> None:
+		self.path = path
+		self.keys = {}
+		self.outputs = {}
+		self.testFiles = {}
+
+		try:
+			data = json.loads(path.read_text(encoding="utf-8"))
+		except (FileNotFoundError, ValueError):
+			return
+
+		if data.get("version", None) == getUniGrammarVersion():
+			self.keys = data["keys"]
+			self.outputs = data["outputs"]
+			self.testFiles = data["testFiles"]
+
+	def isUpToDate(self, task: Task) -> bool:
+		if task.key is None or self.keys.get(task.name, None) != task.key:
+			return False
+		output = self.outputs.get(task.name, None)
+		if output is None:
+			return True
+		if isinstance(output, str):
+			output = (output,)
+		return all(Path(o).exists() for o in output)
+
+	def save(self) -> None:
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.path.write_text(json.dumps({"version": getUniGrammarVersion(), "keys": self.keys, "outputs": self.outputs, "testFiles": self.testFiles}, indent="\t"), encoding="utf-8")
+
+
+class Build:
+	"""Builds a graph of tasks for a set of grammars and backends and executes it"""
+
+	__slots__ = ("files", "generatorsToToolsMapping", "outputDir", "runTests", "makeBundle", "stamps", "tasks", "executor", "_loaders", "_outputs", "_testsTasksFiles")
+
+	def __init__(self, files: typing.Iterable[Path], generatorsToToolsMapping: typing.Mapping[typing.Type[Generator], typing.Iterable[typing.Type[Tool]]], outputDir: Path, runTests: bool = True, makeBundle: bool = True) -> None:
+		self.files = tuple(files)
+		self.generatorsToToolsMapping = generatorsToToolsMapping
+		self.outputDir = outputDir
+		self.runTests = runTests
+		self.makeBundle = makeBundle
+		self.stamps = BuildStamps(outputDir / STAMPS_FILE_NAME)
+		self.tasks = []
+		self.executor = None
+		self._loaders = {}
+		self._outputs = {}
+		self._testsTasksFiles = {}
+
+	def addTask(self, name: str, kind: str, func: typing.Callable, deps: typing.Iterable[Task] = (), key: typing.Optional[str] = None, loader: typing.Optional[typing.Callable] = None) -> Task:
+		"""`loader` loads the result of an up-to-date task from its outputs."""
+		t = Task(name, kind, func, deps, key)
+		if loader is not None:
+			self._loaders[t] = loader
+		self.tasks.append(t)
+		return t
+
+	def runInProcess(self, func: typing.Callable, *args) -> typing.Any:
+		return self.executor.runInProcess(func, *args)
+
+	def _addGrammarTasks(self, file: Path) -> typing.Tuple[typing.List[typing.Tuple[typing.Type[Generator], typing.Type[Tool], Task]], typing.Optional[Task]]:
+		"""The grammar is parsed once, the parsed grammar is passed to the tasks expanding templates, running tests and generating wrappers, the expanded one is passed to the tasks transpiling it for each backend."""
+		fileName = str(file)
+		parseKey = _hash(getUniGrammarVersion(), file.name, file.read_bytes())
+		parseTask = self.addTask("parse:" + fileName, "parse", lambda: parseUniGrammarFile(file), key=parseKey)
+		expandTask = self.addTask("expand:" + fileName, "expand", self._expand, (parseTask,), _hash(parseKey, "expand"))
+
+		compileTasks = []
+		for generator, tools in self.generatorsToToolsMapping.items():
+			generatorName = _getQualName(generator)
+			suffix = fileName + ":" + generatorName
+			transpileTaskName = "transpile:" + suffix
+			transpileTask = self.addTask(
+				transpileTaskName, "transpile",
+				lambda expanded, generator=generator, transpileTaskName=transpileTaskName: self._saveTranspiled(transpileTaskName, generator, self._transpile(expanded, generator)),
+				(expandTask,), _hash(parseKey, generatorName, repr(generator.getRenderingConfigKey())),
+				loader=lambda transpileTaskName=transpileTaskName: self._loadTranspiled(transpileTaskName)
+			)
+
+			for tool in tools:
+				if tool.RUNNER is None or issubclass(tool.RUNNER, NotYetImplementedRunner):
+					continue
+				toolSuffix = suffix + ":" + _getQualName(tool)
+				compileKey = _hash(transpileTask.key, _getQualName(tool))
+				compileTask = self.addTask("compile:" + toolSuffix, "compile", lambda transpiled, tool=tool: compileGrammar(runnersPool(tool.RUNNER), transpiled.text), (transpileTask,), compileKey)
+				compileTasks.append((generator, tool, compileTask))
+
+				if self.runTests:
+					testFiles = self.stamps.testFiles.get(fileName, None)
+					testKey = None if testFiles is None else self._getTestKey(compileKey, testFiles)
+					testTask = self.addTask("test:" + toolSuffix, "test", lambda grammar, compiled, tool=tool, file=file: self._test(file, grammar, tool, compiled), (parseTask, compileTask), testKey)
+					self._testsTasksFiles[testTask] = fileName
+
+		wrapperTask = None
+		if self.makeBundle:
+			wrapperTask = self.addTask("wrapper:" + fileName, "wrapper", self._genWrapper, (parseTask,), _hash(parseKey, "wrapper"))
+		return compileTasks, wrapperTask
+
+	def _expand(self, grammar: Grammar) -> typing.Tuple[Grammar, typing.Optional[bytes]]:
+		"""Expands the templates not depending on backend. If transpilation is offloaded to processes, the result is serialized once for all the backends."""
+		preexpanded = preexpandTemplates(grammar)
+		serialized = None
+		if self.executor.processPool is not None:
+			serialized = CompactGrammar.fromGrammar(preexpanded).toBytes()
+		return preexpanded, serialized
+
+	def _transpile(self, expanded: typing.Tuple[Grammar, typing.Optional[bytes]], generator: typing.Type[Generator]) -> TranspiledResult:
+		preexpanded, serialized = expanded
+		if serialized is None:
+			return transpile(preexpanded.fork(), generator)
+		return self.runInProcess(_transpileSerialized, serialized, generator)
+
+	@staticmethod
+	def _getTestKey(compileKey: str, testFiles: typing.Iterable[str]) -> str:
+		return _hash(compileKey, *(f + ":" + _hashFile(Path(f)) for f in testFiles))
+
+	def _saveTranspiled(self, taskName: str, generator: typing.Type[Generator], res: TranspiledResult) -> TranspiledResult:
+		resFile = getTranspiledFilePath(self.outputDir, res.id, generator)
+		writeLinesToFile((res.text,), resFile)
+		self._outputs[taskName] = str(resFile)
+		return res
+
+	def _loadTranspiled(self, taskName: str) -> TranspiledResult:
+		resFile = self.stamps.outputs[taskName]
+		self._outputs[taskName] = resFile
+		resFile = Path(resFile)
+		return TranspiledResult(resFile.stem, resFile.read_text(encoding="utf-8"))
+
+	def _test(self, file: Path, grammar: Grammar, tool: typing.Type[Tool], compiled: typing.Any) -> int:
+		testFiles = []
+		tests = ()
+		if grammar.tests is not None:
+			testFiles = [str(f.absolute()) for f in grammar.tests.getTestFiles(file.parent)]
+			tests = tuple(grammar.tests.getTests(file.parent))
+
+		parser = instantiateParser(runnersPool(tool.RUNNER), compiled)
+		failures = []
+		for test in tests:
+			try:
+				parser(test)
+			except Exception as ex:  # pylint: disable=broad-except
+				failures.append((test, str(ex)))
+
+		self.stamps.testFiles[str(file)] = testFiles
+		if failures:
+			raise TestsFailed(str(len(failures)) + " of " + str(len(tests)) + " tests have failed: " + "; ".join(repr(t) + ": " + e for t, e in failures))
+		return len(tests)
+
+	@staticmethod
+	def _genWrapper(grammar: Grammar) -> typing.Tuple[str, typing.Any, typing.Any, typing.Any]:
+		from .core.WrapperGen import WrapperGen  # pylint:disable=import-outside-toplevel
+
+		sourceAST, caplessSchema, iterlessSchema = WrapperGen.transpile(deepcopy(grammar))
+		return grammar.meta.id, sourceAST, caplessSchema, list(iterlessSchema)
+
+	def _makeBundle(self, compileTasks: typing.Iterable[typing.Tuple[typing.Type[Generator], typing.Type[Tool], Task]], wrapperTasks: typing.Iterable[Task], *results) -> str:  # pylint:disable=unused-argument
+		from UniGrammarRuntime.ParserBundle import ParserBundle  # pylint:disable=import-outside-toplevel
+
+		bundleDir = self.outputDir / "parserBundle"
+		b = ParserBundle(bundleDir)
+		grammarsIds = {}
+		for wrapperTask in wrapperTasks:
+			grammarId, sourceAST, caplessSchema, iterlessSchema = wrapperTask.result
+			grammarsIds[wrapperTask.deps[0]] = grammarId
+			thisR = b.grammars[grammarId]
+			thisR.capSchema = caplessSchema
+			thisR.iterSchema = iterlessSchema
+			thisR.wrapperAST = sourceAST
+
+		for generator, tool, compileTask in compileTasks:
+			transpiled = compileTask.deps[0].result
+			runnersPool(tool.RUNNER).saveCompiled(compileTask.result, b.grammars[transpiled.id], generator.META)
+
+		b.save()
+		return str(bundleDir)
+
+	def _prune(self) -> None:
+		"""Marks up-to-date tasks. The ones needed by the tasks to be done are either loaded from their outputs, or done again."""
+		needed = []
+		for t in self.tasks:
+			if self.stamps.isUpToDate(t):
+				t.status = TaskStatus.upToDate
+			else:
+				needed.append(t)
+
+		while needed:
+			t = needed.pop()
+			for d in t.deps:
+				if d.status != TaskStatus.upToDate:
+					continue
+				loader = self._loaders.get(d, None)
+				if loader is not None:
+					d.func = lambda *depsResults, loader=loader: loader()  # loading needs no inputs
+					d.kind = "load"
+					d.status = TaskStatus.pending
+				else:
+					d.status = TaskStatus.pending
+					needed.append(d)
+
+	def __call__(self, jobs: int, processPool: typing.Optional["ProcessPoolExecutor"] = None) -> typing.Dict[str, typing.Any]:
+		"""Builds. Returns a summary serializable into JSON"""
+		startTime = time.perf_counter()
+		self.outputDir.mkdir(parents=True, exist_ok=True)
+
+		allCompileTasks = []
+		wrapperTasks = []
+		for file in self.files:
+			compileTasks, wrapperTask = self._addGrammarTasks(file)
+			allCompileTasks.extend(compileTasks)
+			if wrapperTask is not None:
+				wrapperTasks.append(wrapperTask)
+
+		if self.makeBundle:
+			bundleDeps = [ct for _, _, ct in allCompileTasks] + wrapperTasks
+			bundleKey = _hash("bundle", *sorted(t.key for t in bundleDeps))
+			self.addTask("bundle", "bundle", lambda *results: self._makeBundle(allCompileTasks, wrapperTasks, *results), bundleDeps, bundleKey)
+			self.stamps.outputs["bundle"] = str(self.outputDir / "parserBundle")
+
+		self._prune()
+
+		self.executor = WorkStealingExecutor(jobs, processPool)
+		self.executor(self.tasks)
+
+		for t in self.tasks:
+			if t.status == TaskStatus.done:
+				if t.kind == "test":  # the list of tests files is known only after the grammar is parsed
+					t.key = self._getTestKey(t.deps[1].key, self.stamps.testFiles[self._testsTasksFiles[t]])
+				self.stamps.keys[t.name] = t.key
+				if t.name in self._outputs:
+					self.stamps.outputs[t.name] = self._outputs[t.name]
+			elif t.status in (TaskStatus.failed, TaskStatus.cancelled):
+				self.stamps.keys.pop(t.name, None)
+		self.stamps.save()
+
+		return self.summarize(time.perf_counter() - startTime)
+
+	def summarize(self, duration: float) -> typing.Dict[str, typing.Any]:
+		counts = {}
+		tasks = []
+		for t in self.tasks:
+			counts[t.status] = counts.get(t.status, 0) + 1
+			rec = {"name": t.name, "kind": t.kind, "status": t.status, "duration": t.duration}
+			if t.error is not None:
+				rec["error"] = str(t.error)
+			tasks.append(rec)
+		return {"duration": duration, "counts": counts, "tasks": tasks}
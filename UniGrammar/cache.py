@@ -0,0 +1,210 @@
+"""A persistent content-addressed cache of transpiled grammars"""
+
+import typing
+import os
+import json
+from hashlib import sha256
+from pathlib import Path
+
+from .core.backend.Generator import Generator, TranspiledResult
+from .ownGrammarFormat import deriveGrammarIdFromFilesNames
+from .utils.tempFiles import getTempPath
+from .utils.version import getUniGrammarVersion
+
+__all__ = ("TranspilationCache", "CacheStats", "getUniGrammarVersion")
+
+CACHE_ENTRY_EXTENSION = ".json"
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+def getDefaultCacheDir() -> Path:
+	res = os.environ.get("UNIGRAMMAR_CACHE_DIR", None)
+	if res:
+		return Path(res)
+
+	res = os.environ.get("XDG_CACHE_HOME", None)
+	if res:
+		res = Path(res)
+	else:
+		res = Path.home() / ".cache"
+	return res / "UniGrammar"
+
+
+def _unlinkIfExists(p: Path) -> None:
+	try:
+		p.unlink()
+	except FileNotFoundError:
+		pass
+
+
+class CacheStats:  # pylint: disable=too-few-public-methods
+	__slots__ = ("dir", "count", "size", "maxSize")
+
+	def __init__(self, dir: Path, count: int, size: int, maxSize: int) -> None:  # pylint:disable=redefined-builtin
+		self.dir = dir
+		self.count = count
+		self.size = size
+		self.maxSize = maxSize
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + ", ".join(k + "=" + repr(getattr(self, k)) for k in self.__class__.__slots__) + ")"
+
+
+class TranspilationCache:
+	"""Stores `TranspiledResult`s on disk keyed by a hash of the grammar source, the generator and the version of UniGrammar. When the total size of entries exceeds `maxSize`, the least recently used ones are evicted."""
+
+	__slots__ = ("dir", "maxSize", "_size")
+
+	def __init__(self, dir: typing.Optional[Path] = None, maxSize: typing.Optional[int] = None) -> None:  # pylint:disable=redefined-builtin
+		if dir is None:
+			dir = getDefaultCacheDir()
+		if maxSize is None:
+			maxSize = int(os.environ.get("UNIGRAMMAR_CACHE_SIZE", DEFAULT_MAX_SIZE))
+		self.dir = Path(dir)
+		self.maxSize = maxSize
+		self._size = None
+
+	@staticmethod
+	def computeKey(grammarFile: Path, source: bytes, generator: typing.Type[Generator]) -> str:
+		"""Computes a key of a transpilation result. The rendering switches of the generator (see `Generator.getRenderingConfigKey`) matter, the file name matters because the grammar id may be derived from it, and the extension determines the format."""
+		h = sha256()
+		for el in (getUniGrammarVersion(), generator.__module__ + "." + generator.__qualname__, repr(generator.getRenderingConfigKey()), deriveGrammarIdFromFilesNames(grammarFile), grammarFile.suffix):
+			h.update(el.encode("utf-8"))
+			h.update(b"\0")
+		h.update(source)
+		return h.hexdigest()
+
+	def _getEntryPath(self, key: str) -> Path:
+		return self.dir / (key + CACHE_ENTRY_EXTENSION)
+
+	def _iterEntries(self) -> typing.Iterator[os.DirEntry]:
+		try:
+			with os.scandir(self.dir) as it:
+				for e in it:
+					if e.name.endswith(CACHE_ENTRY_EXTENSION) and e.is_file():
+						yield e
+		except FileNotFoundError:
+			pass
+
+	def get(self, key: str) -> typing.Optional[TranspiledResult]:
+		p = self._getEntryPath(key)
+		try:
+			res = json.loads(p.read_text(encoding="utf-8"))
+		except (OSError, ValueError):  # missing, unreadable or corrupted
+			return None
+
+		try:
+			os.utime(p)  # for LRU eviction
+		except OSError:  # a read-only or a shared cache, the hit is still valid
+			pass
+		return TranspiledResult(res["id"], res["text"])
+
+	def _prepareEntry(self, key: str) -> typing.Tuple[Path, Path]:
+		"""Returns the path of an entry and the path of the temporary file to write it into before `_commitEntry`"""
+		self.dir.mkdir(parents=True, exist_ok=True)
+		p = self._getEntryPath(key)
+		return p, getTempPath(p)
+
+	def __setitem__(self, key: str, res: TranspiledResult) -> None:
+		"""Stores the result. Failures (i.e. a read-only or a shared cache) are ignored, the cache is just an optimization."""
+		try:
+			p, tmp = self._prepareEntry(key)
+			tmp.write_text(json.dumps({"id": res.id, "text": res.text}), encoding="utf-8")
+		except OSError:
+			return
+		self._commitEntry(tmp, p)
+
+	def teeLines(self, key: str, grammarId: str, lines: typing.Iterable[str]) -> typing.Iterator[str]:
+		"""Yields `lines` storing them, joined with `\\n`, as the text of the entry `key`. The text is streamed into the entry file, so it is never kept in memory as a whole. The entry is stored only if all the lines have been consumed. Failures to store it are ignored, as in `__setitem__`, the lines are yielded anyway."""
+		try:
+			p, tmp = self._prepareEntry(key)
+			f = tmp.open("wt", encoding="utf-8")
+		except OSError:
+			yield from lines
+			return
+
+		isWritable = True
+
+		def write(s: str) -> None:
+			nonlocal isWritable
+			if isWritable:
+				try:
+					f.write(s)
+				except OSError:
+					isWritable = False
+
+		try:
+			write('{"id": ' + json.dumps(grammarId) + ', "text": "')
+			isFirst = True
+			for line in lines:
+				if not isFirst:
+					write("\\n")
+				isFirst = False
+				write(json.dumps(line)[1:-1])
+				yield line
+			write('"}')
+		except BaseException:
+			isWritable = False
+			raise
+		finally:
+			try:
+				f.close()
+			except OSError:  # flushing the rest has failed
+				isWritable = False
+			if not isWritable:
+				_unlinkIfExists(tmp)
+
+		if isWritable:
+			self._commitEntry(tmp, p)
+
+	def _commitEntry(self, tmp: Path, p: Path) -> None:
+		try:
+			try:
+				prevSize = p.stat().st_size  # an overwritten entry must not be accounted twice
+			except FileNotFoundError:
+				prevSize = 0
+			os.replace(tmp, p)
+		except OSError:
+			_unlinkIfExists(tmp)
+			return
+
+		try:
+			if self._size is None:
+				self._size = self.stats().size
+			else:
+				self._size += p.stat().st_size - prevSize
+
+			if self._size > self.maxSize:
+				self.evict()
+		except OSError:  # i.e. the entry has been evicted by another process sharing the cache
+			self._size = None
+
+	def evict(self) -> None:
+		"""Removes the least recently used entries until the total size of the rest fits into `maxSize`"""
+		entries = [(st.st_mtime_ns, st.st_size, e.path) for e, st in ((e, e.stat()) for e in self._iterEntries())]
+		entries.sort()
+		size = sum(e[1] for e in entries)
+		for _, entrySize, path in entries:
+			if size <= self.maxSize:
+				break
+			try:
+				os.unlink(path)
+			except FileNotFoundError:
+				pass
+			except OSError:  # a read-only cache, the entry stays
+				continue
+			size -= entrySize
+		self._size = size
+
+	def stats(self) -> CacheStats:
+		count = 0
+		size = 0
+		for e in self._iterEntries():
+			count += 1
+			size += e.stat().st_size
+		return CacheStats(self.dir, count, size, self.maxSize)
+
+	def clear(self) -> None:
+		for e in self._iterEntries():
+			os.unlink(e.path)
+		self._size = 0
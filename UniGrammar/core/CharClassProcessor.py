@@ -2,7 +2,9 @@ import typing
 from abc import ABC, abstractmethod
 
 from ..utils.charRanges import ranges2CharClassRangedString
+from ..utils.charSet import CharSet
 from .ast import Grammar
+from .ast.base import Node
 from .ast.characters import CharClass, CharClassUnion, CharRange, _CharClass
 from .backend.Generator import Generator
 
@@ -63,6 +65,16 @@ class CharClassProcessor(ABC):
 
 	range = classmethod(StandaloneCharRangeProcessor(".."))
 
+	@classmethod
+	def getCost(cls, backend: typing.Type[Generator], obj: _CharClass, grammar: Grammar) -> int:
+		"""The cost of encoding of a char class in the backend, by default the length of the rendered class"""
+		return len(backend.resolve(obj, grammar))
+
+	@classmethod
+	def chooseCheapest(cls, backend: typing.Type[Generator], candidates: typing.Sequence[_CharClass], grammar: Grammar) -> _CharClass:
+		"""Chooses the cheapest of the equivalent encodings of a char class, the first one of the equally cheap ones"""
+		return min(candidates, key=lambda obj: cls.getCost(backend, obj, grammar))
+
 
 class CharClassMergeProcessor(CharClassProcessor):
 	charClassSetStart = "["
@@ -70,7 +82,28 @@ class CharClassMergeProcessor(CharClassProcessor):
 
 	@classmethod
 	def union(cls, backend: typing.Type[Generator], union: CharClassUnion, grammar: Grammar) -> str:
-		return cls.wrapCharClass(backend, ranges2CharClassRangedString(union.getRanges(grammar), escaper=backend.charClassEscaper), union, grammar)
+		if not union.negative:
+			natives = []
+			merged = []
+			for c in union.children:
+				s = cls.renderNativeMember(backend, c, grammar)
+				if s is None:
+					merged.append(c)
+				else:
+					natives.append(s)
+			if natives:
+				return cls.unionWithNativeMembers(backend, CharClassUnion(*merged).getPositiveCharSet(grammar), natives, grammar)
+		return cls.wrapCharClass(backend, ranges2CharClassRangedString(union.getPositiveCharSet(grammar), escaper=backend.charClassEscaper), union, grammar)
+
+	@classmethod
+	def renderNativeMember(cls, backend: typing.Type[Generator], obj: Node, grammar: Grammar) -> typing.Optional[str]:  # pylint:disable=unused-argument
+		"""Renders a member of a positive union having a syntax of its own in the backend (i.e. a Unicode property), so it is not merged into the ranges. `None` means the member is merged."""
+		return None
+
+	@classmethod
+	def unionWithNativeMembers(cls, backend: typing.Type[Generator], charSet: CharSet, natives: typing.Sequence[str], grammar: Grammar) -> str:
+		"""Renders a positive union of the chars merged into `charSet` and the members rendered by `renderNativeMember`"""
+		raise NotImplementedError
 
 	@classmethod
 	def wrapNegativeOuter(cls, obj: typing.Union[CharClassUnion, CharClass], s: str) -> str:
@@ -0,0 +1,106 @@
+"""Rewriting of the char classes of the `chars` section into the cheapest equivalent encodings for a backend"""
+
+import typing
+
+from ..utils.charSet import CharSet
+from .ast import Characters, Grammar, Section
+from .ast.base import Name, Node, Ref
+from .ast.characters import CharClassUnion, _CharClass
+from .ast.passes import PassManager, ReferencesAnalysis, Transformation
+from .ast.visitors import Visitor
+
+__all__ = ("CharClassesCanonicalizer", "CharClassesCanonicalization")
+
+
+def _referencesChars(obj: _CharClass) -> bool:
+	if isinstance(obj, CharClassUnion):
+		return any(isinstance(c, Ref) or _referencesChars(c) for c in obj.children)
+	return False
+
+
+class CharClassesCanonicalizer(Visitor):
+	"""Computes the set of chars matched by each class of the `chars` section, drops the members of the unions matching nothing the other members don't, and replaces the class with the cheapest of the equivalent encodings, as `CHAR_CLASS_PROCESSOR` of the backend costs them. The candidates are the class itself, a reference to a previous class matching the same chars, and the canonical positive and negated classes of the set. The negated one is offered only if the backend renders negated classes correctly (`CANONICALIZE_INTO_NEGATED_CHAR_CLASSES`). Only the classes not referencing other classes are referenced, so no cycles are introduced. The classes not resolvable into sets of chars are kept as they are."""
+
+	__slots__ = ("grammar", "backend", "canonicalNames", "duplicates", "redundantMembers")
+
+	def __init__(self, grammar: Grammar, backend: "UsualGenerator") -> None:
+		super().__init__(copyOnWrite=True)
+		self.grammar = grammar
+		self.backend = backend
+		self.canonicalNames = {}  # sets of chars to the names of the first classes matching them and not referencing other classes
+		self.duplicates = {}  # names of classes replaced with references to the ones matching the same chars
+		self.redundantMembers = {}  # names of unions to their dropped members
+
+	def enterSection(self, node: Section, parent: typing.Optional[Node]) -> bool:  # pylint:disable=unused-argument
+		return False
+
+	def enterCharacters(self, node: Characters, parent: typing.Optional[Node]) -> bool:  # pylint:disable=unused-argument
+		return True
+
+	def enterName(self, node: Name, parent: typing.Optional[Node]) -> bool:  # pylint:disable=unused-argument
+		return False
+
+	def leaveName(self, node: Name, parent: typing.Optional[Node]) -> Name:  # pylint:disable=unused-argument
+		obj = node.child
+		if not isinstance(obj, _CharClass):
+			return node
+
+		try:
+			charSet = obj.getCharSet(self.grammar)
+			obj = self.dropRedundantMembers(node.name, obj)
+		except (KeyError, AttributeError, ValueError, ImportError):  # references something not being a char class, or a Unicode property unknown or needing `regex`, for which the backend may still have a syntax
+			return node
+
+		candidates = [obj]
+		canonicalName = self.canonicalNames.get(charSet, None)
+		if canonicalName is not None:
+			candidates.append(CharClassUnion(Ref(canonicalName)))
+		if charSet:
+			candidates.append(CharClassUnion.fromCharSet(charSet))
+		if self.backend.CANONICALIZE_INTO_NEGATED_CHAR_CLASSES:
+			complement = ~charSet
+			if complement:
+				candidates.append(CharClassUnion.fromCharSet(complement, negative=True))
+
+		res = self.backend.CHAR_CLASS_PROCESSOR.chooseCheapest(self.backend, candidates, self.grammar)
+		if canonicalName is not None and res is candidates[1]:
+			self.duplicates[node.name] = canonicalName
+		elif canonicalName is None and not _referencesChars(res):
+			self.canonicalNames[charSet] = node.name
+
+		if res is node.child:
+			return node
+		return Name(node.name, res)
+
+	def dropRedundantMembers(self, name: str, obj: _CharClass) -> _CharClass:
+		"""Returns the union without the members matching only the chars matched by the other members"""
+		if not isinstance(obj, CharClassUnion) or len(obj.children) < 2:
+			return obj
+
+		children = list(obj.children)
+		sets = list(obj.iterChildrenCharSets(self.grammar))
+		dropped = []
+		for i in reversed(range(len(children))):
+			if sets[i] <= CharSet.unite(sets[:i] + sets[i + 1:]):
+				dropped.append(children.pop(i))
+				del sets[i]
+
+		if not dropped:
+			return obj
+		self.redundantMembers[name] = dropped
+		return CharClassUnion(*children, negative=obj.negative)
+
+
+class CharClassesCanonicalization(Transformation):
+	"""Rewrites the char classes into the cheapest encodings for `backend`, see `CharClassesCanonicalizer`. The names are kept, so only `ReferencesAnalysis` is invalidated."""
+
+	__slots__ = ("backend",)
+
+	INVALIDATES = frozenset((ReferencesAnalysis.NAME,))
+	SHALLOW = True
+
+	def __init__(self, backend: "UsualGenerator") -> None:
+		self.backend = backend
+
+	def createVisitor(self, manager: PassManager) -> CharClassesCanonicalizer:
+		return CharClassesCanonicalizer(manager.grammar, self.backend)
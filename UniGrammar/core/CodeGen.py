@@ -2,8 +2,8 @@ import typing
 from abc import ABC, abstractmethod
 
 from .ast import Grammar
-from .ast.base import Ref
-from .ast.characters import CharClass, CharClassUnion, CharRange, WellKnownChars
+from .ast.base import Node, Ref
+from .ast.characters import CharClass, CharClassUnion, CharRange, UnicodeProperty, WellKnownChars
 from .ast.prods import Cap
 from .ast.templates import TemplateInstantiation
 from .ast.tokens import Alt, Iter, Lit, Opt, Seq
@@ -20,9 +20,51 @@ class CodeGenContext:
 		return self.__class__(self.currentProdName)
 
 
+def _getAllSubclasses(cls: type) -> typing.Iterator[type]:
+	stack = [cls]
+	while stack:
+		cls = stack.pop()
+		yield cls
+		stack.extend(cls.__subclasses__())
+
+
+def passThrough(obj: str, grammar: typing.Optional[Grammar], ctx: typing.Any = None) -> str:
+	return obj
+
+
 class CodeGen(ABC):
+	"""Processors of nodes are methods named the same as the classes of the nodes. `DISPATCH` maps types of nodes to them: it is populated for every subclass when it is created, and the types appeared later are added to it on the first lookup."""
+
 	__slots__ = ()
 
+	DISPATCH = None  # type: typing.Dict[type, typing.Callable]
+
+	def __init_subclass__(cls, **kwargs) -> None:
+		super().__init_subclass__(**kwargs)
+		cls.DISPATCH = dispatch = {str: passThrough}
+		for nodeType in _getAllSubclasses(Node):
+			processor = getattr(cls, nodeType.__name__, None)
+			if processor is not None:
+				dispatch[nodeType] = processor
+
+	@classmethod
+	def getProcessor(cls, nodeType: type) -> typing.Callable:
+		"""Returns a method processing nodes of `nodeType`. Raises `AttributeError` if there is no such a method."""
+		try:
+			return cls.DISPATCH[nodeType]
+		except KeyError:
+			pass
+
+		if issubclass(nodeType, str):
+			res = passThrough
+		elif issubclass(nodeType, Node):
+			res = getattr(cls, nodeType.__name__)
+		else:
+			raise ValueError("This stuff must be a Node", nodeType)
+
+		cls.DISPATCH[nodeType] = res
+		return res
+
 	@classmethod
 	def Ref(cls, obj: Ref, grammar: typing.Optional[Grammar], ctx: typing.Any = None) -> str:
 		return obj.name
@@ -62,6 +104,11 @@ class CodeGen(ABC):
 	def WellKnownChars(cls, obj: WellKnownChars, grammar: Grammar, ctx: typing.Any = None) -> typing.Any:
 		raise NotImplementedError()
 
+	@classmethod
+	@abstractmethod
+	def UnicodeProperty(cls, obj: UnicodeProperty, grammar: Grammar, ctx: typing.Any = None) -> typing.Any:
+		raise NotImplementedError()
+
 	@classmethod
 	@abstractmethod
 	def CharClassUnion(cls, obj: CharClassUnion, grammar: Grammar, ctx: typing.Any = None) -> typing.Any:
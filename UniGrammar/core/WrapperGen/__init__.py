@@ -5,11 +5,10 @@ from collections import defaultdict
 
 from ..ast import Characters, Fragmented, Grammar, Keywords, Section, Tokens
 from ..ast.base import Name, Node, Ref, Wrapper
-from ..ast.characters import CharClass, CharClassUnion, CharRange, WellKnownChars
+from ..ast.characters import CharClass, CharClassUnion, CharRange, UnicodeProperty, WellKnownChars
 from ..ast.prods import Cap
 from ..ast.templates import TemplateInstantiation
 from ..ast.tokens import Alt, Iter, Lit, Opt, Seq
-from ..ast.transformations import getNames
 from ..defaults import mainParserVarName, runtimeModuleName, runtimeWrapperInterfaceModuleName, runtimeWrapperInterfaceName, runtimeParserResultBaseName
 from ..CodeGen import CodeGen, CodeGenContext
 
@@ -95,7 +94,7 @@ class WrapperGen(CodeGen):
 	TemplateInstantiation = classmethod(TemplateInstantiationWrapperFuncGen())
 	Prefer = classmethod(NopWrapperFuncGen())
 
-	CharRange = CharClassUnion = WellKnownChars = CharClass = Cap = Lit = classmethod(NotImplementedWrapperFuncGen())
+	CharRange = CharClassUnion = WellKnownChars = UnicodeProperty = CharClass = Cap = Lit = classmethod(NotImplementedWrapperFuncGen())
 
 	@classmethod
 	def transpile(cls, grammar: Grammar) -> typing.Tuple[str, typing.Mapping]:
@@ -104,8 +103,10 @@ class WrapperGen(CodeGen):
 
 	@classmethod
 	def _processItem(cls, el, grammar, ctx):
-		clsNm = type(el).__name__
-		processor = getattr(cls, clsNm)
+		try:
+			processor = cls.DISPATCH[type(el)]
+		except KeyError:
+			processor = cls.getProcessor(type(el))
 		return processor(el, grammar, ctx)
 
 
@@ -127,7 +128,7 @@ class WrapperGen(CodeGen):
 			level=0,
 		))
 
-		allBindings = getNames(grammar)
+		allBindings = grammar.symbols
 		capToNameSchema = defaultdict(dict)
 		itersProdNames = set()
 
@@ -32,19 +32,29 @@ def getRefNameAndNodeForARef(nodeOrName: typing.Union[Wrapper, Ref, str], ctx: "
 		raise NotImplementedError("We need a separate production for this stuff.", nodeOrName)
 
 	if node is None:
-		node, section = ctx.allBindings[refName]
+		section, node, _ = ctx.allBindings[refName]
 
 	return refName, node, section
 
 
-def getProcessorFuncNameForANode(node, ctx, refName=None):
-	nodeName = type(node).__name__
-	funcGen = getattr(WrapperGen, nodeName, None)
-	if funcGen is not None:
-		return funcGen.getFuncName(node, ctx, refName)
-	else:
+def getFuncGenForANode(node: Node) -> typing.Any:
+	if not isinstance(node, Node):
 		raise ValueError("Unsupported node", node)
 
+	try:
+		return WrapperGen.DISPATCH[type(node)]
+	except KeyError:
+		pass
+
+	try:
+		return WrapperGen.getProcessor(type(node))
+	except (AttributeError, ValueError):
+		raise ValueError("Unsupported node", node) from None
+
+
+def getProcessorFuncNameForANode(node, ctx, refName=None):
+	return getFuncGenForANode(node).getFuncName(node, ctx, refName)
+
 
 def getProcessorFuncNameForARef(nodeOrName: typing.Union[Wrapper, Ref, str], ctx: "WrapperGenContext", refName: str = None) -> ast.Attribute:
 	refName, node, section = getRefNameAndNodeForARef(nodeOrName, ctx, refName)
@@ -58,12 +68,7 @@ def getProcessorFuncNameForARef(nodeOrName: typing.Union[Wrapper, Ref, str], ctx
 
 
 def getReturnTypeForANode(node, ctx, refName=None):
-	nodeName = type(node).__name__
-	funcGen = getattr(WrapperGen, nodeName, None)
-	if funcGen is not None:
-		return funcGen.getType(node, ctx, refName)
-	else:
-		raise ValueError("Unsupported node", node)
+	return getFuncGenForANode(node).getType(node, ctx, refName)
 
 
 def getReturnTypeForARef(nodeOrName: typing.Union[Wrapper, Ref, str], ctx: "WrapperGenContext", refName: str = None) -> typing.Union[ast.Name, ast.Subscript]:
@@ -3,6 +3,7 @@ from collections.abc import Iterable
 from pathlib import Path
 
 from .base import Wrapper, Collection, Name, Node
+from .symbols import SymbolTable
 from ..testing import TestingSpec
 
 StrOrListOfStrs = typing.Union[str, typing.Iterable[str]]
@@ -40,24 +41,62 @@ class MultiLineComment(Comment):
 
 
 class Section(Collection):
-	__slots__ = ("index",)
+	"""A section of a grammar. Within a `Grammar` the section is attached to its `SymbolTable`, so the names are bound and unbound as the items are added, replaced and deleted, and `index` is a view over the table. Don't modify `children` directly, use the methods of the section."""
+
+	__slots__ = ("index", "symbols")
 
 	EMPTY_MAKES_SENSE = True
+	COPY_ON_WRITE = False
 
 	def __init__(self, children: typing.List[Name] = ()) -> None:
 		super().__init__(children)
 		self.index = None
+		self.symbols = None
 
 	def embed(self, another: "Section") -> None:
 		if another is not None:
 			self.children += another.children
+			if self.symbols is not None:
+				for item in another.children:
+					self.symbols.bind(self, item)
 
 	def __iadd__(self, another: "Section") -> "Section":
 		self.embed(another)
 		return self
 
+	def append(self, item: Node) -> None:
+		if isinstance(self.children, tuple):
+			self.children = list(self.children)
+		self.children.append(item)
+		if self.symbols is not None:
+			self.symbols.bind(self, item)
+
+	def __setitem__(self, k: int, v: Node) -> None:
+		if self.symbols is not None:
+			self.symbols.unbind(self, self.children[k])
+		super().__setitem__(k, v)
+		if self.symbols is not None:
+			self.symbols.bind(self, v)
+
+	def __delitem__(self, k: int) -> None:
+		if self.symbols is not None:
+			self.symbols.unbind(self, self.children[k])
+		super().__delitem__(k)
+
+	def shallowCopy(self) -> "Section":
+		"""The copy is not attached to any `SymbolTable`"""
+		res = super().shallowCopy()
+		res.symbols = None
+		if self.symbols is not None:
+			res.recomputeIndex()
+		elif self.index is not None:
+			res.index = dict(self.index)
+		return res
+
 	def recomputeIndex(self) -> None:
-		self.index = {n.name: n.child for n in self.children if isinstance(n, Name)}
+		"""Indexes a section not attached to a `SymbolTable`, the index of an attached one is always up to date"""
+		if self.symbols is None:
+			self.index = {n.name: n.child for n in self.children if isinstance(n, Name)}
 
 	def findFirstRule(self) -> typing.Optional[Name]:
 		for r in self.children:
@@ -111,24 +150,45 @@ def GrammarInitSignature(self, *, meta: GrammarMeta, tests: typing.Iterable[Test
 
 
 class Grammar(Node, Iterable):
+	"""A grammar. `symbols` maps all the names bound in it to their `Symbol`s, `dependencies` is the graph of references between them. Replace the sections using `__setitem__` to keep them up to date.
+	`backendTemplatesLeft` is `None` if the grammar can contain any template instantiations, otherwise only the ones of templates depending on backend can be left, and it is their count (see `preexpandTemplates`)."""
+
 	sectionsDescriptors = (("chars", Characters), ("keywords", Keywords), ("tokens", Tokens), ("fragmented", Fragmented), ("prods", Productions))
-	__slots__ = ("meta", "tests") + tuple(s[0] for s in sectionsDescriptors)
+	__slots__ = ("meta", "tests", "symbols", "backendTemplatesLeft", "_dependencies") + tuple(s[0] for s in sectionsDescriptors)
 
 	EMPTY_MAKES_SENSE = True
+	COPY_ON_WRITE = False
 
 	def __init__(self, *, meta: GrammarMeta, tests: typing.Iterable[TestingSpec] = None, **sections) -> None:
 		super().__init__()
 		self.meta = meta
 		self.tests = tests
+		self.backendTemplatesLeft = None
 
 		for k, typ in self.__class__.sectionsDescriptors:
 			v = sections.get(k, None)
 			if v is None:
 				v = typ()
 			setattr(self, k, v)
+		self._attachSections()
 
 	__init__.__wraps__ = GrammarInitSignature
 
+	def _attachSections(self) -> None:
+		self.symbols = SymbolTable()
+		self._dependencies = None
+		for i, s in enumerate(self):
+			self.symbols.attach(s, i)
+
+	@property
+	def dependencies(self) -> "DependencyGraph":
+		"""The graph of references between the rules, created on the first use"""
+		if self._dependencies is None:
+			from .dependencies import DependencyGraph  # pylint:disable=import-outside-toplevel
+
+			self._dependencies = DependencyGraph(self)
+		return self._dependencies
+
 	def embed(self, another: "Grammar") -> None:
 		for name, typ in self.__class__.sectionsDescriptors:  # pylint:disable=unused-variable
 			v = getattr(self, name)
@@ -139,6 +199,14 @@ class Grammar(Node, Iterable):
 		self.embed(another)
 		return self
 
+	def fork(self) -> "Grammar":
+		"""Creates a cheap logical copy of the grammar. Sections are copied, but rules are shared with this grammar, so they must be transformed in copy-on-write mode (see `walkAST`)."""
+		res = self.shallowCopy()
+		for k, typ in self.__class__.sectionsDescriptors:  # pylint:disable=unused-variable
+			setattr(res, k, getattr(self, k).shallowCopy())
+		res._attachSections()  # pylint:disable=protected-access
+		return res
+
 	def __iter__(self):
 		for k, typ in self.__class__.sectionsDescriptors:  # pylint:disable=unused-variable
 			yield getattr(self, k)
@@ -150,7 +218,10 @@ class Grammar(Node, Iterable):
 		return getattr(self, self.__class__.sectionsDescriptors[k][0])
 
 	def __setitem__(self, k, v):
-		return setattr(self, self.__class__.sectionsDescriptors[k][0], v)
+		attrName = self.__class__.sectionsDescriptors[k][0]
+		self.symbols.detach(getattr(self, attrName))
+		setattr(self, attrName, v)
+		self.symbols.attach(v, k)
 
 
 class Import(Node):
@@ -2,14 +2,47 @@ import typing
 from collections.abc import Iterable
 
 
+_slotsCache = {}
+
+
+def _getAllSlots(cls: typing.Type["Node"]) -> typing.Tuple[str, ...]:
+	"""Returns the slots holding the properties of nodes of `cls`. The private slots (starting from `_`) hold caches, so they are skipped."""
+	res = _slotsCache.get(cls, None)
+	if res is None:
+		res = []
+		for c in reversed(cls.__mro__):
+			slots = c.__dict__.get("__slots__", ())
+			if isinstance(slots, str):
+				slots = (slots,)
+			for s in slots:
+				if s not in res and s[0] != "_":
+					res.append(s)
+		_slotsCache[cls] = res = tuple(res)
+	return res
+
+
 class Node:
 	"""Just a node of our AST"""
 
-	__slots__ = ()
+	__slots__ = ("_digestCache",)  # see `digests`
+
+	COPY_ON_WRITE = True  # the node is shared between grammars forks, so it must be copied before modification. Set to `False` for the nodes copied eagerly by `Grammar.fork`
 
 	def __init__(self) -> None:
 		pass
 
+	def shallowCopy(self) -> "Node":
+		"""Creates a node of the same type having the same properties. Children are not copied, they are shared with this node."""
+		cls = self.__class__
+		res = cls.__new__(cls)
+		for k in _getAllSlots(cls):
+			try:
+				v = getattr(self, k)
+			except AttributeError:
+				continue
+			setattr(res, k, v)
+		return res
+
 
 class Collection(Node, Iterable):
 	"""A node of AST that can have multiple children"""
@@ -37,6 +70,11 @@ class Collection(Node, Iterable):
 	def __delitem__(self, k):
 		del self.children[k]
 
+	def shallowCopy(self) -> "Collection":
+		res = super().shallowCopy()
+		res.children = list(self.children)
+		return res
+
 
 class Wrapper(Node):
 	"""A node of AST which has exactly one child"""
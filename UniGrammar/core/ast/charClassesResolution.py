@@ -0,0 +1,65 @@
+"""Resolution of char classes into `CharSet`s. The sets of unions are memoized in `charSetsCache`, shared by all the generators within a process. They are keyed by the digests of the unions with the digests of the char classes they reference mixed in (see `getDigest`), so a set is recomputed only if the union or any class it depends on has been modified. Cyclic references between char classes are detected."""
+
+import typing
+from threading import local
+
+from ...utils.charSet import CharSet
+from ..backend.RulesRenderingCache import RulesRenderingCache
+from . import Grammar
+from .characters import CharClassUnion
+from .digests import getDigest
+
+__all__ = ("getUnionPositiveCharSet", "getNamedCharSet", "CharClassesCycleError", "charSetsCache")
+
+charSetsCache = RulesRenderingCache(4096)
+
+
+class _ResolutionState(local):
+	"""The state of the resolution going on within the current thread. The grammar is not modified during a resolution, so the digests of the referenced char classes are memoized in `closures` until the outermost call returns."""
+
+	def __init__(self) -> None:
+		super().__init__()
+		self.names = []  # the stack of the names of the char classes being resolved
+		self.closures = None
+
+
+_state = _ResolutionState()
+
+
+class CharClassesCycleError(ValueError):
+	"""Char classes reference each other in a cycle"""
+
+	def __init__(self, cycle: typing.Sequence[str]) -> None:
+		super().__init__("Char classes reference each other in a cycle: " + " -> ".join(cycle))
+		self.cycle = cycle
+
+
+def getUnionPositiveCharSet(union: CharClassUnion, grammar: typing.Optional[Grammar]) -> CharSet:
+	"""The union of the chars matched by the children of `union`, memoized"""
+	state = _state
+	isOutermost = state.closures is None
+	if isOutermost:
+		state.closures = {}
+	try:
+		key = getDigest(union, grammar, closures=state.closures)
+		res = charSetsCache.get(key)
+		if res is None:
+			res = CharSet.unite(union.iterChildrenCharSets(grammar))
+			charSetsCache[key] = res
+		return res
+	finally:
+		if isOutermost:
+			state.closures = None
+
+
+def getNamedCharSet(grammar: Grammar, name: str) -> CharSet:
+	"""The chars matched by the char class `name` of the `chars` section of `grammar`. Raises `CharClassesCycleError` if it references itself, directly or not."""
+	names = _state.names
+	if name in names:
+		raise CharClassesCycleError(names[names.index(name):] + [name])
+
+	names.append(name)
+	try:
+		return grammar.chars.index[name].getCharSet(grammar)
+	finally:
+		names.pop()
@@ -2,6 +2,8 @@ import typing
 import string
 from abc import ABC, abstractmethod
 
+from ...utils.charSet import CharSet
+from ...utils.unicodeProperties import getUnicodePropertyCharSet, validateUnicodeProperty
 from .base import Container, Node, Ref, Wrapper
 
 
@@ -12,9 +14,21 @@ class _CharClass(ABC):
 		self.negative = negative  # pylint: disable=assigning-non-slot
 
 	@abstractmethod
-	def getRanges(self, grammar=None):
+	def getPositiveCharSet(self, grammar: typing.Optional["Grammar"] = None) -> CharSet:
+		"""The chars listed in the class, `negative` is not applied"""
 		raise NotImplementedError
 
+	def getCharSet(self, grammar: typing.Optional["Grammar"] = None) -> CharSet:
+		"""The chars matched by the class"""
+		res = self.getPositiveCharSet(grammar)
+		if self.negative:
+			res = ~res
+		return res
+
+	def getRanges(self, grammar: typing.Optional["Grammar"] = None) -> typing.Iterator[range]:
+		"""The sorted disjoint ranges of `getPositiveCharSet`"""
+		return iter(self.getPositiveCharSet(grammar))
+
 
 class CharClass(Node, _CharClass):
 	__slots__ = ("chars", "negative",)
@@ -24,10 +38,8 @@ class CharClass(Node, _CharClass):
 		_CharClass.__init__(self, negative)
 		self.chars = chars
 
-	def getRanges(self, grammar: None = None) -> typing.Iterator[range]:
-		for c in self.chars:
-			c = ord(c)
-			yield range(c, c + 1)
+	def getPositiveCharSet(self, grammar: None = None) -> CharSet:
+		return CharSet.fromString(self.chars)
 
 	def __repr__(self):
 		return self.__class__.__name__ + "(" + repr(self.chars) + ", " + repr(self.negative) + ")"
@@ -40,8 +52,8 @@ class WellKnownChars(Wrapper, _CharClass):
 		self.name = name
 		Wrapper.__init__(self, CharClass(getattr(string, name), negative))  # fucking `super` doesn't wor well in the case of multiple inheritance
 
-	def getRanges(self, grammar: None = None) -> typing.Iterator[range]:
-		return self.child.getRanges()
+	def getPositiveCharSet(self, grammar: None = None) -> CharSet:
+		return self.child.getPositiveCharSet()
 
 	@property
 	def negative(self):
@@ -72,28 +84,72 @@ class CharRange(Node, _CharClass):
 		"""INCLUSIVE!"""
 		return chr(self.range.stop - 1)
 
-	def getRanges(self, grammar: None = None) -> typing.Iterator[range]:
-		yield self.range
+	def getPositiveCharSet(self, grammar: None = None) -> CharSet:
+		return CharSet.fromRange(self.range.start, self.range.stop)
 
 	def __repr__(self):
 		return self.__class__.__name__ + "(" + repr(self.negative) + ", " + repr(self.range) + ")"
 
 
+class UnicodeProperty(Node, _CharClass):
+	"""The chars having a value of a Unicode property: `kind` is `category` (a general category, like `Lu` or `L`) or `script` (like `Greek`). Unknown values raise `ValueError`."""
+
+	__slots__ = ("kind", "value", "negative")
+
+	def __init__(self, kind: str, value: str, negative: bool = False) -> None:
+		validateUnicodeProperty(kind, value)
+		Node.__init__(self)
+		_CharClass.__init__(self, negative)
+		self.kind = kind
+		self.value = value
+
+	def getPositiveCharSet(self, grammar: None = None) -> CharSet:
+		return getUnicodePropertyCharSet(self.kind, self.value)
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + repr(self.kind) + ", " + repr(self.value) + ", " + repr(self.negative) + ")"
+
+
 class CharClassUnion(Container, _CharClass):
 	__slots__ = ("negative",)
 
 	EMPTY_MAKES_SENSE = True
 
+	MAX_CHARS_RANGE_LENGTH = 3  # `fromCharSet` lists the chars of shorter ranges instead of creating `CharRange`s
+
 	def __init__(self, *children, negative=False) -> None:
 		Container.__init__(self, *children)
 		_CharClass.__init__(self, negative)
 
-	def getRanges(self, grammar: typing.Optional["Grammar"] = None) -> None:
+	@classmethod
+	def fromCharSet(cls, charSet: CharSet, negative: bool = False) -> "CharClassUnion":
+		"""The canonical class of the chars of `charSet`: a `CharClass` of the chars of the short ranges and a `CharRange` for each long one"""
+		chars = []
+		ranges = []
+		for r in charSet:
+			if len(r) <= cls.MAX_CHARS_RANGE_LENGTH:
+				chars.extend(map(chr, r))
+			else:
+				ranges.append(CharRange(chr(r.start), chr(r.stop - 1)))
+		if chars:
+			ranges.insert(0, CharClass("".join(chars)))
+		return cls(*ranges, negative=negative)
+
+	def getPositiveCharSet(self, grammar: typing.Optional["Grammar"] = None) -> CharSet:
+		"""The union of the chars matched by the children, so negative children are complemented. Memoized, see `charClassesResolution`."""
+		from .charClassesResolution import getUnionPositiveCharSet  # pylint:disable=import-outside-toplevel
+
+		return getUnionPositiveCharSet(self, grammar)
+
+	def iterChildrenCharSets(self, grammar: typing.Optional["Grammar"]) -> typing.Iterator[CharSet]:
+		"""The chars matched by each child, the references are resolved within the `chars` section of `grammar`"""
+		from .charClassesResolution import getNamedCharSet  # pylint:disable=import-outside-toplevel
+
 		for c in self.children:
 			if isinstance(c, Ref):
-				yield from grammar.chars.index[c.name].getRanges(grammar)
+				yield getNamedCharSet(grammar, c.name)
 			else:
-				yield from c.getRanges(grammar)
+				yield c.getCharSet(grammar)
 
 	def __repr__(self):
 		return self.__class__.__name__ + "(" + repr(self.negative) + ", " + repr(self.children) + ")"
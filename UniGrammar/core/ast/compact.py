@@ -0,0 +1,458 @@
+"""A compact representation of a grammar: the nodes are rows of flat arrays instead of Python objects. It takes several times less memory than the AST and can be queried without walking the tree. Vectorised by NumPy, if it is installed."""
+
+import json
+import struct
+import sys
+import typing
+from array import array
+
+from ..testing import AggregateTestingSpec, TestingSpec, TestingSpecModel, testingSpecModelsSelector
+from . import Characters, Comment, Fragmented, Grammar, GrammarMeta, Keywords, MultiLineComment, Productions, Section, Spacer, Tokens
+from .base import Name, Node, Ref
+from .characters import CharClass, CharClassUnion, CharRange, UnicodeProperty, WellKnownChars
+from .prods import Cap, Prefer
+from .templates import TemplateInstantiation
+from .tokens import Alt, Iter, Lit, Opt, Seq
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+__all__ = ("CompactGrammar", "StringsTable")
+
+
+class StringsTable:
+	"""Interns strings into consecutive integer ids"""
+
+	__slots__ = ("strings", "ids")
+
+	def __init__(self) -> None:
+		self.strings = []
+		self.ids = {}
+
+	def __call__(self, s: str) -> int:
+		res = self.ids.get(s, None)
+		if res is None:
+			self.ids[s] = res = len(self.strings)
+			self.strings.append(s)
+		return res
+
+	def __getitem__(self, iD: int) -> str:
+		return self.strings[iD]
+
+	def __len__(self) -> int:
+		return len(self.strings)
+
+
+KINDS = (Grammar, Characters, Keywords, Tokens, Fragmented, Productions, Spacer, Comment, MultiLineComment, Name, Cap, Ref, Lit, Seq, Alt, Opt, Iter, Prefer, CharClass, CharClassUnion, CharRange, WellKnownChars, Node)
+KIND_IDS = {k: i for i, k in enumerate(KINDS)}
+GRAMMAR = KIND_IDS[Grammar]
+CHAR_RANGE = KIND_IDS[CharRange]
+OPAQUE = KIND_IDS[Node]  # the nodes of other types are stored as objects, with their subtrees
+SECTIONS_KINDS = frozenset(KIND_IDS[k] for k in KINDS if issubclass(k, Section))
+
+STR_VALUED = {
+	Comment: "value",
+	Name: "name",
+	Cap: "name",
+	Ref: "name",
+	Lit: "value",
+	Prefer: "preference",
+	CharClass: "chars",
+	WellKnownChars: "name",
+}
+INT_VALUED = {
+	Spacer: "count",
+	Iter: "minCount",
+}
+NEGATIVE_FLAG = 1
+
+SERIALIZATION_MAGIC = b"UGcg"
+SERIALIZATION_VERSION = 2
+_serializationHeader = struct.Struct("<4sBBBxIIIII")  # magic, version, whether it is little-endian, itemsize of `i` arrays, count of nodes, count of strings, count of `CharRange`s, size of strings in bytes, size of the objects JSON
+
+_testingSpecsModels = {v: k for k, v in testingSpecModelsSelector.items()}
+
+
+def _encodeObject(obj: typing.Any) -> typing.Any:
+	"""Encodes `meta`, `tests` and the opaque nodes into JSON-compatible values. JSON objects are used only for tagged values (`{tag: payload}`), so decoding creates only the types known here: templates are stored by their ids, the nodes within template params as nested compact grammars. Raises `TypeError` for anything else."""
+	if obj is None or isinstance(obj, (bool, int, float, str)):
+		return obj
+	if isinstance(obj, (list, tuple)):
+		return [_encodeObject(el) for el in obj]
+	if isinstance(obj, dict):
+		if not all(isinstance(k, str) for k in obj):
+			raise TypeError("Only dicts with `str` keys can be serialized", obj)
+		return {"dict": {k: _encodeObject(v) for k, v in obj.items()}}
+	if isinstance(obj, GrammarMeta):
+		return {"meta": [_encodeObject(getattr(obj, k)) for k in GrammarMeta.__slots__]}
+	if isinstance(obj, AggregateTestingSpec):
+		return {"tests": [_encodeObject(el) for el in obj.subspecs]}
+	if isinstance(obj, TestingSpec) and type(obj) in _testingSpecsModels:
+		return {"testingSpec": [_testingSpecsModels[type(obj)].name, _encodeObject(obj.files)]}
+	if isinstance(obj, TemplateInstantiation):
+		return {"template": [obj.template.id, _encodeObject(obj.params)]}
+	if isinstance(obj, UnicodeProperty):
+		return {"unicodeProperty": [obj.kind, obj.value, obj.negative]}
+	if type(obj) in KIND_IDS and type(obj) is not Node:
+		return {"node": CompactGrammar.fromGrammar(obj).toJSON()}
+	raise TypeError("Cannot serialize an object of type " + type(obj).__name__ + " into a compact grammar", obj)
+
+
+def _decodeObject(obj: typing.Any) -> typing.Any:
+	"""Decodes the values encoded by `_encodeObject`"""
+	if isinstance(obj, list):
+		return [_decodeObject(el) for el in obj]
+	if not isinstance(obj, dict):
+		return obj
+
+	((tag, payload),) = obj.items()
+	if tag == "dict":
+		return {k: _decodeObject(v) for k, v in payload.items()}
+	if tag == "meta":
+		return GrammarMeta(*_decodeObject(payload))
+	if tag == "tests":
+		return AggregateTestingSpec(_decodeObject(payload))
+	if tag == "testingSpec":
+		model, files = payload
+		return testingSpecModelsSelector[TestingSpecModel[model]](files)
+	if tag == "template":
+		from ..templater.defaultTemplates import defaultTemplatesRegistry  # pylint:disable=import-outside-toplevel
+
+		iD, params = payload
+		return TemplateInstantiation(defaultTemplatesRegistry[iD], _decodeObject(params))
+	if tag == "unicodeProperty":
+		return UnicodeProperty(*payload)
+	if tag == "node":
+		return CompactGrammar.fromJSON(payload).toGrammar()
+	raise ValueError("Unknown tag of a serialized object", tag)
+
+
+class CompactGrammar:
+	"""A grammar which nodes are stored in preorder in parallel arrays:
+	* `kinds` - index of the type of a node in `KINDS`;
+	* `parents` - index of the parent node, `-1` for the root;
+	* `sizes` - count of nodes in the subtree, so the children of the node `i` start at `i + 1` and the next sibling is at `i + sizes[i]`;
+	* `values` - an id of a string in `strings` (names, literals, chars), a `minCount` of `Iter`, a `count` of `Spacer`, a start of a `CharRange` or an index in `objects` for opaque nodes;
+	* `flags` - `NEGATIVE_FLAG` for the negative char classes.
+	The root (index 0) is the grammar, its children are sections."""
+
+	__slots__ = ("meta", "tests", "strings", "kinds", "parents", "sizes", "values", "flags", "rangesStops", "objects")
+
+	def __init__(self, meta, tests) -> None:
+		self.meta = meta
+		self.tests = tests
+		self.strings = StringsTable()
+		self.kinds = array("B")
+		self.parents = array("i")
+		self.sizes = array("i")
+		self.values = array("i")
+		self.flags = array("B")
+		self.rangesStops = {}  # index -> stop of a `CharRange`, they are rare, so are not worth an array
+		self.objects = []
+
+	def __len__(self) -> int:
+		return len(self.kinds)
+
+	@classmethod
+	def fromGrammar(cls, grammar: Grammar) -> "CompactGrammar":
+		"""Converts the AST of a grammar (or of any subtree, then it has no `meta` and `tests`) into the compact representation. Uses an explicit stack, so nesting is not limited."""
+		self = cls(getattr(grammar, "meta", None), getattr(grammar, "tests", None))
+		kinds, parents, sizes, values, flags = self.kinds, self.parents, self.sizes, self.values, self.flags
+
+		stack = [(grammar, -1)]
+		while stack:
+			node, parent = stack.pop()
+			if node is None:  # the end of the subtree of `parent`
+				sizes[parent] = len(kinds) - parent
+				continue
+
+			i = len(kinds)
+			nodeType = type(node)
+			kind = KIND_IDS.get(nodeType, OPAQUE)
+			kinds.append(kind)
+			parents.append(parent)
+			flags.append(NEGATIVE_FLAG if getattr(node, "negative", False) else 0)
+
+			children = ()
+			if kind == OPAQUE:
+				values.append(len(self.objects))
+				self.objects.append(node)
+			elif nodeType is MultiLineComment:
+				values.append(self.strings("\n".join(node.value)))
+			elif nodeType in STR_VALUED:
+				values.append(self.strings(getattr(node, STR_VALUED[nodeType])))
+				if nodeType in (Name, Cap, Prefer):  # the child of `WellKnownChars` is created by its constructor
+					children = (node.child,)
+			elif nodeType in INT_VALUED:
+				values.append(getattr(node, INT_VALUED[nodeType]))
+				if nodeType is Iter:
+					children = (node.child,)
+			elif nodeType is CharRange:
+				values.append(node.range.start)
+				self.rangesStops[i] = node.range.stop
+			else:
+				values.append(0)
+				if nodeType is Opt:
+					children = (node.child,)
+				else:
+					children = node  # Grammar, sections and containers are iterable
+
+			if children:
+				sizes.append(0)
+				stack.append((None, i))
+				stack.extend((c, i) for c in reversed(tuple(children)))
+			else:
+				sizes.append(1)
+
+		return self
+
+	def toGrammar(self, shareIdentical: bool = False) -> Grammar:
+		"""Converts the compact representation back into AST. The nodes are created from the last to the first, so the children are always created before their parents and no recursion is needed. If `shareIdentical`, structurally identical nodes within rules are created once and shared, as `interning` does while parsing."""
+		kinds, parents, values, flags, strings = self.kinds, self.parents, self.values, self.flags, self.strings
+		childrenOf = {}
+		shared = {}  # (kind, value, flags, ids of the (shared) children) -> node
+		res = None
+		for i in range(len(kinds) - 1, -1, -1):
+			kind = kinds[i]
+			parent = parents[i]
+			children = childrenOf.pop(i, [])
+			children.reverse()
+			v = values[i]
+
+			key = None
+			if shareIdentical and parent >= 0 and kinds[parent] not in SECTIONS_KINDS and kinds[parent] != GRAMMAR:
+				key = (kind, v, flags[i], self.rangesStops.get(i, None) if kind == CHAR_RANGE else None, *map(id, children))
+				node = shared.get(key, None)
+				if node is not None:
+					childrenOf.setdefault(parent, []).append(node)
+					continue
+
+			nodeType = KINDS[kind]
+			negative = bool(flags[i] & NEGATIVE_FLAG)
+
+			if nodeType is Grammar:
+				node = Grammar(meta=self.meta, tests=self.tests, **{k: s for (k, typ), s in zip(Grammar.sectionsDescriptors, children)})  # pylint:disable=unused-variable
+			elif kind in SECTIONS_KINDS:
+				node = nodeType(children)
+			elif kind == OPAQUE:
+				node = self.objects[v]
+			elif nodeType in (Name, Cap):
+				node = nodeType(strings[v], children[0])
+			elif nodeType in (Ref, Lit, Comment, MultiLineComment):
+				node = nodeType(strings[v])
+			elif nodeType in (Seq, Alt):
+				node = nodeType(*children)
+			elif nodeType is Opt:
+				node = Opt(children[0])
+			elif nodeType is Iter:
+				node = Iter(children[0], v)
+			elif nodeType is Prefer:
+				node = Prefer(children[0], strings[v])
+			elif nodeType is Spacer:
+				node = Spacer(v)
+			elif nodeType in (CharClass, WellKnownChars):
+				node = nodeType(strings[v], negative)
+			elif nodeType is CharRange:
+				node = CharRange(chr(v), chr(self.rangesStops[i] - 1), negative)
+			elif nodeType is CharClassUnion:
+				node = CharClassUnion(*children, negative=negative)
+			else:
+				raise ValueError("Unsupported kind of node", nodeType)
+
+			if parent < 0:
+				res = node
+			else:
+				if key is not None:
+					shared[key] = node
+				childrenOf.setdefault(parent, []).append(node)
+		return res
+
+	def toJSON(self) -> typing.Dict[str, typing.Any]:
+		"""Serializes the grammar (usually a subtree) into JSON-compatible values, see `_encodeObject`"""
+		return {
+			"meta": _encodeObject(self.meta),
+			"tests": _encodeObject(self.tests),
+			"strings": self.strings.strings,
+			"kinds": self.kinds.tolist(),
+			"flags": self.flags.tolist(),
+			"parents": self.parents.tolist(),
+			"sizes": self.sizes.tolist(),
+			"values": self.values.tolist(),
+			"ranges": list(self.rangesStops.items()),
+			"objects": _encodeObject(self.objects),
+		}
+
+	@classmethod
+	def fromJSON(cls, dic: typing.Mapping[str, typing.Any]) -> "CompactGrammar":
+		"""Deserializes a grammar serialized by `toJSON`"""
+		self = cls(_decodeObject(dic["meta"]), _decodeObject(dic["tests"]))
+		for s in dic["strings"]:
+			self.strings(s)
+		for k in ("kinds", "flags", "parents", "sizes", "values"):
+			getattr(self, k).extend(dic[k])
+		self.rangesStops = dict(dic["ranges"])
+		self.objects = _decodeObject(dic["objects"])
+		return self
+
+	def toBytes(self) -> bytes:
+		"""Serializes the grammar: the arrays are dumped as they are, so `fromBytes` just copies them. Opaque nodes, `meta` and `tests` are serialized into JSON, see `_encodeObject`. Raises `TypeError` if they contain objects which cannot be serialized."""
+		strings = self.strings.strings
+		stringsLengths = array("I", [len(s) for s in strings])
+		stringsBlob = "".join(strings).encode("utf-8", "surrogatepass")
+
+		ranges = array("i")
+		for i, stop in self.rangesStops.items():
+			ranges.append(i)
+			ranges.append(stop)
+
+		objects = json.dumps([_encodeObject(self.meta), _encodeObject(self.tests), _encodeObject(self.objects)], ensure_ascii=False, separators=(",", ":")).encode("utf-8", "surrogatepass")
+
+		header = _serializationHeader.pack(SERIALIZATION_MAGIC, SERIALIZATION_VERSION, sys.byteorder == "little", self.parents.itemsize, len(self.kinds), len(strings), len(self.rangesStops), len(stringsBlob), len(objects))
+		return b"".join((header, self.kinds, self.flags, self.parents, self.sizes, self.values, ranges, stringsLengths, stringsBlob, objects))
+
+	@classmethod
+	def fromBytes(cls, data: typing.Union[bytes, memoryview]) -> "CompactGrammar":
+		"""Deserializes a grammar serialized by `toBytes` on a machine of the same architecture. Raises `ValueError` if `data` is not such a serialization. Only the types of nodes and objects known to the serialization are created, so `data` cannot make it execute any code."""
+		data = memoryview(data)
+		try:
+			magic, version, isLittleEndian, itemSize, nodesCount, stringsCount, rangesCount, stringsSize, objectsSize = _serializationHeader.unpack_from(data)
+		except struct.error as ex:
+			raise ValueError("Truncated serialized grammar") from ex
+		if magic != SERIALIZATION_MAGIC or version != SERIALIZATION_VERSION:
+			raise ValueError("Not a serialized grammar of a supported version")
+		if bool(isLittleEndian) != (sys.byteorder == "little") or itemSize != array("i").itemsize:
+			raise ValueError("The grammar has been serialized on a machine of other architecture")
+
+		offset = _serializationHeader.size
+
+		def readArray(typeCode: str, count: int) -> array:
+			nonlocal offset
+			res = array(typeCode)
+			end = offset + count * res.itemsize
+			if end > len(data):
+				raise ValueError("Truncated serialized grammar")
+			res.frombytes(data[offset:end])
+			offset = end
+			return res
+
+		kinds = readArray("B", nodesCount)
+		flags = readArray("B", nodesCount)
+		parents = readArray("i", nodesCount)
+		sizes = readArray("i", nodesCount)
+		values = readArray("i", nodesCount)
+		ranges = readArray("i", 2 * rangesCount)
+		stringsLengths = readArray("I", stringsCount)
+
+		stringsEnd = offset + stringsSize
+		if stringsEnd + objectsSize != len(data):
+			raise ValueError("Size of the serialized grammar does not match its header")
+		stringsBlob = str(data[offset:stringsEnd], "utf-8", "surrogatepass")
+		try:
+			meta, tests, objects = map(_decodeObject, json.loads(str(data[stringsEnd:], "utf-8", "surrogatepass")))
+		except (ValueError, LookupError, TypeError) as ex:  # the errors of JSON and of unpacking and looking the payloads up
+			raise ValueError("Cannot decode the objects of the serialized grammar") from ex
+
+		self = cls(meta, tests)
+		self.kinds, self.flags, self.parents, self.sizes, self.values = kinds, flags, parents, sizes, values
+		self.rangesStops = dict(zip(ranges[::2], ranges[1::2]))
+		self.objects = objects
+
+		strings = self.strings
+		pos = 0
+		for length in stringsLengths:
+			s = stringsBlob[pos:pos + length]
+			strings.ids[s] = len(strings.strings)
+			strings.strings.append(s)
+			pos += length
+		return self
+
+	def getChildren(self, i: int) -> typing.Iterator[int]:
+		"""Indices of children of the node `i`"""
+		end = i + self.sizes[i]
+		i += 1
+		sizes = self.sizes
+		while i < end:
+			yield i
+			i += sizes[i]
+
+	def getKind(self, i: int) -> typing.Type[Node]:
+		return KINDS[self.kinds[i]]
+
+	def getValue(self, i: int) -> typing.Any:
+		"""The own property of the node `i` (a name, a literal, a count, an object for opaque nodes)"""
+		kind = self.kinds[i]
+		nodeType = KINDS[kind]
+		v = self.values[i]
+		if kind == OPAQUE:
+			return self.objects[v]
+		if nodeType in STR_VALUED or nodeType is MultiLineComment:
+			return self.strings[v]
+		if nodeType is CharRange:
+			return range(v, self.rangesStops[i])
+		return v
+
+	def indicesOf(self, *nodeTypes: typing.Type[Node], root: int = 0) -> typing.Sequence[int]:
+		"""Indices of the nodes of exactly the given types within the subtree of `root`, in preorder"""
+		kindIds = [KIND_IDS[t] for t in nodeTypes]
+		end = root + self.sizes[root]
+		if np is not None:
+			kinds = np.frombuffer(self.kinds, dtype=np.uint8)[root:end]
+			return np.flatnonzero(np.isin(kinds, kindIds)) + root
+
+		kindIds = frozenset(kindIds)
+		kinds = self.kinds
+		return [i for i in range(root, end) if kinds[i] in kindIds]
+
+	def walk(self, funcToCall: typing.Callable[[int, int], bool], root: int = 0) -> None:
+		"""The counterpart of `walkAST`: calls `funcToCall(index, parentIndex)` for the nodes of the subtree of `root` in preorder. If it returns `False`, the subtree of the node is skipped. The nodes cannot be replaced, but the values can be modified in place."""
+		sizes, parents = self.sizes, self.parents
+		i = root
+		end = root + sizes[root]
+		while i < end:
+			if funcToCall(i, parents[i]):
+				i += 1
+			else:
+				i += sizes[i]
+
+	def getReferenced(self, accumulator: typing.Optional[set] = None, root: int = 0) -> typing.Set[str]:
+		"""The counterpart of `getReferenced`"""
+		if accumulator is None:
+			accumulator = set()
+
+		refs = self.indicesOf(Ref, root=root)
+		if np is not None:
+			ids = np.unique(np.frombuffer(self.values, dtype=np.intc)[refs])
+		else:
+			values = self.values
+			ids = {values[i] for i in refs}
+
+		strings = self.strings
+		accumulator.update(strings[iD] for iD in ids)
+		return accumulator
+
+	def getNames(self, accumulator: typing.Optional[dict] = None) -> typing.Mapping[str, typing.Tuple[int, int]]:
+		"""The counterpart of `getNames`, returns the indices of the named nodes and of their sections"""
+		if accumulator is None:
+			accumulator = {}
+
+		parents, kinds, values, strings = self.parents, self.kinds, self.values, self.strings
+		for i in self.indicesOf(Name):
+			parent = parents[i]
+			if kinds[parent] in SECTIONS_KINDS:
+				accumulator[strings[values[i]]] = (i + 1, parent)
+		return accumulator
+
+	def rewriteReferences(self, nameRemap: typing.Mapping[str, str], root: int = 0) -> None:
+		"""The counterpart of `rewriteReferences`, modifies the grammar in place"""
+		remap = {}
+		for k, v in nameRemap.items():
+			iD = self.strings.ids.get(k, None)
+			if iD is not None:
+				remap[iD] = self.strings(v)
+
+		values = self.values
+		for i in self.indicesOf(Ref, root=root):
+			v = values[i]
+			values[i] = remap.get(v, v)
@@ -0,0 +1,267 @@
+"""The graph of references between the rules of a grammar and the analyses of it. It is maintained incrementally: only the rules rebound in the `SymbolTable` since the previous query are re-walked, and the analyses are cached until the graph changes."""
+
+import typing
+
+from .base import Name, Node, Ref, Wrapper
+from .tokens import Alt, Iter, Lit, Opt, Seq
+from .characters import CharClassUnion
+from .transformations import getReferenced
+from .traversal import traverse
+
+__all__ = ("DependencyGraph", "stronglyConnectedComponents", "getLeftCorner")
+
+GraphT = typing.Mapping[str, typing.Iterable[str]]
+
+
+def stronglyConnectedComponents(graph: GraphT) -> typing.List[typing.Tuple[str, ...]]:
+	"""Tarjan's algorithm with an explicit stack. The edges to the names not in `graph` are ignored. A component is returned after all the components reachable from it, so the result is in reverse topological order."""
+	indices = {}
+	lowLinks = {}
+	onStack = set()
+	stack = []
+	res = []
+
+	for root in graph:
+		if root in indices:
+			continue
+
+		callStack = [(root, iter(graph[root]))]
+		indices[root] = lowLinks[root] = len(indices)
+		stack.append(root)
+		onStack.add(root)
+
+		while callStack:
+			v, edges = callStack[-1]
+			for w in edges:
+				if w not in graph:
+					continue
+				if w not in indices:
+					indices[w] = lowLinks[w] = len(indices)
+					stack.append(w)
+					onStack.add(w)
+					callStack.append((w, iter(graph[w])))
+					break
+				if w in onStack:
+					lowLinks[v] = min(lowLinks[v], indices[w])
+			else:
+				callStack.pop()
+				if callStack:
+					parent = callStack[-1][0]
+					lowLinks[parent] = min(lowLinks[parent], lowLinks[v])
+
+				if lowLinks[v] == indices[v]:
+					component = []
+					while True:
+						w = stack.pop()
+						onStack.remove(w)
+						component.append(w)
+						if w == v:
+							break
+					res.append(tuple(reversed(component)))
+	return res
+
+
+def _getLeftCorner(node: Node, nullableNames: typing.Set[str]) -> typing.Generator[Node, typing.Tuple[typing.Set[str], bool], typing.Tuple[typing.Set[str], bool]]:
+	if isinstance(node, Ref):
+		return {node.name}, node.name in nullableNames
+
+	if isinstance(node, Seq):
+		res = set()
+		for c in node.children:
+			refs, nullable = yield c
+			res |= refs
+			if not nullable:
+				return res, False
+		return res, True
+
+	if isinstance(node, (Alt, CharClassUnion)):
+		res = set()
+		anyNullable = False
+		for c in node.children:
+			refs, nullable = yield c
+			res |= refs
+			anyNullable = anyNullable or nullable
+		return res, anyNullable and not isinstance(node, CharClassUnion)
+
+	if isinstance(node, Opt):
+		refs, _ = yield node.child
+		return refs, True
+
+	if isinstance(node, Iter):
+		refs, nullable = yield node.child
+		return refs, nullable or not node.minCount
+
+	if isinstance(node, Wrapper):
+		return (yield node.child)
+
+	if isinstance(node, Lit):
+		return set(), not node.value
+
+	return set(), False  # char classes and the nodes we know nothing about, i.e. unexpanded templates
+
+
+def getLeftCorner(node: Node, nullableNames: typing.Set[str] = frozenset()) -> typing.Tuple[typing.Set[str], bool]:
+	"""Returns the names which can be referenced at the leftmost position of the text matched by `node` and whether it can match an empty string. `nullableNames` are the names of the rules that can match an empty string."""
+	return traverse(node, _getLeftCorner, nullableNames)
+
+
+class DependencyGraph:
+	"""The references between the rules of a grammar. Get it from `Grammar.dependencies`. The rules are tracked through `Grammar.symbols`, so the graph is up to date as long as the rules are replaced through their sections (as `walkAST` and `Visitor`s in `copyOnWrite` mode do) or their in-place modifications are reported via `SymbolTable.touch` (as they do otherwise). If a rule is modified in place in other ways, call `invalidate` for it. The references within unexpanded template instantiations are not seen."""
+
+	__slots__ = ("grammar", "references", "dirty", "version", "analyses")
+
+	def __init__(self, grammar: "Grammar") -> None:
+		self.grammar = grammar
+		self.references = {}
+		self.dirty = set(grammar.symbols)
+		self.version = 0
+		self.analyses = {}
+		grammar.symbols.listeners.append(self.invalidate)
+
+	def invalidate(self, name: typing.Optional[str] = None) -> None:
+		"""Marks the rule (all the rules if `name` is `None`) as changed"""
+		if name is None:
+			self.dirty.update(self.references)
+			self.dirty.update(self.grammar.symbols)
+		else:
+			self.dirty.add(name)
+
+	def _update(self) -> None:
+		if not self.dirty:
+			return
+
+		oldReferences = self.references
+		self.references = {}  # rebuilt in the order of the symbol table, so the orders computed from it are deterministic
+		for name, sym in self.grammar.symbols.items():
+			if name in self.dirty or name not in oldReferences:
+				self.references[name] = frozenset(getReferenced(sym.node))
+			else:
+				self.references[name] = oldReferences[name]
+		self.dirty = set()
+		self.version += 1
+
+	def _cached(self, key: typing.Hashable, func: typing.Callable[[], typing.Any]) -> typing.Any:
+		self._update()
+		res = self.analyses.get(key, None)
+		if res is None or res[0] != self.version:
+			res = (self.version, func())
+			self.analyses[key] = res
+		return res[1]
+
+	@property
+	def graph(self) -> typing.Mapping[str, typing.FrozenSet[str]]:
+		"""Maps each rule to the names it references"""
+		self._update()
+		return self.references
+
+	def getReferences(self, name: str) -> typing.FrozenSet[str]:
+		return self.graph[name]
+
+	def getReferrers(self, name: str) -> typing.FrozenSet[str]:
+		"""The rules referencing `name`"""
+		return self._cached("referrers", self._computeReferrers).get(name, frozenset())
+
+	def _computeReferrers(self) -> typing.Mapping[str, typing.FrozenSet[str]]:
+		res = {}
+		for name, refs in self.references.items():
+			for r in refs:
+				res.setdefault(r, set()).add(name)
+		return {k: frozenset(v) for k, v in res.items()}
+
+	def getReferencedBySection(self, section: "Section") -> typing.Set[str]:
+		"""The names referenced by the rules of `section`, the counterpart of `getReferenced(section)`"""
+		graph = self.graph
+		res = set()
+		for item in section.children:
+			if isinstance(item, Name):
+				res |= graph.get(item.name, frozenset())
+		return res
+
+	def getStartRule(self) -> typing.Optional[str]:
+		first = self.grammar.prods.findFirstRule()
+		return first.name if first is not None else None
+
+	def getReachable(self, *roots: str) -> typing.FrozenSet[str]:
+		"""The names reachable from `roots`, by default from the start rule. Includes the roots and the referenced undefined names."""
+		if not roots:
+			start = self.getStartRule()
+			roots = (start,) if start is not None else ()
+		return self._cached(("reachable", roots), lambda: self._computeReachable(roots))
+
+	def _computeReachable(self, roots: typing.Iterable[str]) -> typing.FrozenSet[str]:
+		res = set(roots)
+		stack = list(res)
+		graph = self.references
+		while stack:
+			for r in graph.get(stack.pop(), ()):
+				if r not in res:
+					res.add(r)
+					stack.append(r)
+		return frozenset(res)
+
+	def getUnreachable(self, *roots: str) -> typing.List[str]:
+		"""The rules not reachable from `roots`, by default from the start rule"""
+		reachable = self.getReachable(*roots)
+		return [name for name in self.graph if name not in reachable]
+
+	def getUndefined(self) -> typing.FrozenSet[str]:
+		"""The referenced names that are not bound"""
+		return self._cached("undefined", lambda: frozenset(r for refs in self.references.values() for r in refs if r not in self.references))
+
+	def getSCCs(self) -> typing.Tuple[typing.Tuple[str, ...], ...]:
+		"""Strongly connected components of the graph, in reverse topological order"""
+		return self._cached("sccs", lambda: tuple(stronglyConnectedComponents(self.references)))
+
+	def getRecursive(self) -> typing.FrozenSet[str]:
+		"""The rules (directly or indirectly) referencing themselves"""
+		return self._cached("recursive", lambda: self._computeRecursive(self.references, self.getSCCs()))
+
+	@staticmethod
+	def _computeRecursive(graph: GraphT, sccs: typing.Iterable[typing.Tuple[str, ...]]) -> typing.FrozenSet[str]:
+		res = set()
+		for c in sccs:
+			if len(c) > 1 or c[0] in graph[c[0]]:
+				res.update(c)
+		return frozenset(res)
+
+	def getNullable(self) -> typing.FrozenSet[str]:
+		"""The rules that can match an empty string"""
+		return self._cached("nullable", self._computeNullable)
+
+	def _computeNullable(self) -> typing.FrozenSet[str]:
+		symbols = self.grammar.symbols
+		res = set()
+		changed = True
+		while changed:
+			changed = False
+			for name in self.references:
+				if name not in res and getLeftCorner(symbols[name].node, res)[1]:
+					res.add(name)
+					changed = True
+		return frozenset(res)
+
+	def getLeftReferences(self) -> typing.Mapping[str, typing.FrozenSet[str]]:
+		"""Maps each rule to the names that can be referenced at its leftmost position"""
+		return self._cached("leftReferences", self._computeLeftReferences)
+
+	def _computeLeftReferences(self) -> typing.Mapping[str, typing.FrozenSet[str]]:
+		symbols = self.grammar.symbols
+		nullable = self.getNullable()
+		return {name: frozenset(getLeftCorner(symbols[name].node, nullable)[0]) for name in self.references}
+
+	def getLeftRecursive(self) -> typing.FrozenSet[str]:
+		"""The rules that are (directly or indirectly) left-recursive. LL parser generators cannot handle them."""
+
+		def compute():
+			leftRefs = self.getLeftReferences()
+			return self._computeRecursive(leftRefs, stronglyConnectedComponents(leftRefs))
+
+		return self._cached("leftRecursive", compute)
+
+	def getReverseTopologicalOrder(self) -> typing.Tuple[str, ...]:
+		"""The rules ordered so that the referenced ones come before the referencing ones. The rules within a cycle are adjacent."""
+		return self._cached("reverseTopologicalOrder", lambda: tuple(name for c in self.getSCCs() for name in c))
+
+	def getTopologicalOrder(self) -> typing.Tuple[str, ...]:
+		"""The rules ordered so that the referencing ones come before the referenced ones. The rules within a cycle are adjacent."""
+		return self._cached("topologicalOrder", lambda: tuple(name for c in reversed(self.getSCCs()) for name in c))
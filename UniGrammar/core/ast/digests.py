@@ -0,0 +1,260 @@
+"""Merkle-style digests of AST subtrees: a digest of a node is computed from its type, its properties and the digests of its children. They are stable across processes, so they can be used as keys of persistent caches. Comments and spacers are ignored.
+A digest is cached within the node and is recomputed only if the node is modified, the unmodified children keep theirs. Nodes shared between forks of a grammar are modified in copy-on-write mode, so the copies have no digests. Nodes have no links to their parents, so a stale digest cannot be invalidated up the chain from a node: modify nodes in place only within the walkers (`walkAST`, `Visitor`s), they invalidate the digests of the modified nodes and of their ancestors."""
+
+import typing
+from collections.abc import Mapping
+from hashlib import blake2b
+from pathlib import PurePath
+
+from . import Comment, Grammar, Section, Spacer
+from .base import Node, Ref, _getAllSlots
+from .characters import CharClassUnion
+from .traversal import traverse
+
+__all__ = ("getDigest", "getGrammarDigest", "structurallyEquals", "DIGEST_SIZE")
+
+DIGEST_SIZE = 16
+MAX_RECURSION_DEPTH = 64  # nodes nested not deeper are processed recursively, it is faster
+
+_ignoredTypes = (Comment, Spacer)
+_compositeTypes = (list, tuple, Mapping)
+_noInlinedRefs = frozenset()
+
+DigestInfoT = typing.Tuple[bytes, typing.FrozenSet[str]]  # the digest and the names of char classes referenced from `CharClassUnion`s within the subtree
+
+
+def _encode(v: typing.Any, parts: typing.List[bytes], childrenInfos: typing.Optional[typing.Mapping[int, DigestInfoT]]) -> None:
+	"""Serializes a property of a node into `parts`. Every value is prefixed with a tag of its type, strings and collections are prefixed with their lengths, so different values cannot give the same bytes. `childrenInfos` maps `id`s of the nested nodes to their digests."""
+	t = type(v)
+	if t is str:
+		v = v.encode("utf-8")
+		parts.append(b"s%d:" % len(v))
+		parts.append(v)
+	elif t is bool:
+		parts.append(b"T" if v else b"F")
+	elif t is int:
+		parts.append(b"i%d;" % v)
+	elif v is None:
+		parts.append(b"N")
+	elif t is list or t is tuple:
+		v = [el for el in v if not isinstance(el, _ignoredTypes)]
+		parts.append(b"(%d:" % len(v))
+		for el in v:
+			_encode(el, parts, childrenInfos)
+	elif isinstance(v, Node):
+		parts.append(b"n")
+		parts.append(childrenInfos[id(v)][0])
+	elif isinstance(v, range):
+		parts.append(b"r%d,%d,%d;" % (v.start, v.stop, v.step))
+	elif isinstance(v, Mapping):
+		parts.append(b"{%d:" % len(v))
+		for k in sorted(v):
+			_encode(k, parts, childrenInfos)
+			_encode(v[k], parts, childrenInfos)
+	elif isinstance(v, PurePath):
+		parts.append(b"p")
+		_encode(v.as_posix(), parts, childrenInfos)
+	elif isinstance(getattr(v, "id", None), str):  # templates
+		parts.append(b"t")
+		_encode(v.id, parts, childrenInfos)
+	else:
+		parts.append(b"?")
+		_encode(type(v).__qualname__, parts, childrenInfos)
+		_encode(repr(v), parts, childrenInfos)
+
+
+class _Plan:
+	"""What to hash for the nodes of a type. `isinstance` with ABCs is slow, so it is computed once for a type."""
+
+	__slots__ = ("header", "slots", "isMutable", "isCharClassUnion")
+
+	def __init__(self, cls: type) -> None:
+		if issubclass(cls, Grammar):
+			self.slots = tuple(k for k, typ in cls.sectionsDescriptors)  # pylint:disable=unused-variable
+		elif issubclass(cls, Section):
+			self.slots = ("children",)  # `index` and `symbols` are derived from them
+		else:
+			self.slots = _getAllSlots(cls)
+
+		self.isMutable = issubclass(cls, (Section, Grammar))  # they are modified in place, so their digests are not cached, computing them from the cached digests of the rules is cheap
+		self.isCharClassUnion = issubclass(cls, CharClassUnion)
+
+		parts = []
+		_encode(cls.__name__, parts, None)
+		for k in self.slots:
+			_encode(k, parts, None)
+		self.header = b"".join(parts)
+
+
+_plans = {}
+
+
+def _getPlan(cls: type) -> _Plan:
+	try:
+		return _plans[cls]
+	except KeyError:
+		_plans[cls] = res = _Plan(cls)
+		return res
+
+
+def _iterNestedNodes(v: typing.Any) -> typing.Iterator[Node]:
+	t = type(v)
+	if t is list or t is tuple:
+		for el in v:
+			if isinstance(el, Node):
+				if not isinstance(el, _ignoredTypes):
+					yield el
+			else:
+				yield from _iterNestedNodes(el)
+	elif isinstance(v, Node):
+		yield v
+	elif isinstance(v, Mapping):
+		for el in v.values():
+			yield from _iterNestedNodes(el)
+
+
+def _storeDigest(node: Node, plan: _Plan, parts: typing.List[bytes], inlinedRefs: typing.FrozenSet[str]) -> DigestInfoT:
+	if plan.isCharClassUnion:
+		inlinedRefs = inlinedRefs | frozenset(c.name for c in node.children if isinstance(c, Ref))
+
+	info = (blake2b(b"".join(parts), digest_size=DIGEST_SIZE).digest(), inlinedRefs)
+	if not plan.isMutable:
+		node._digestCache = info  # pylint:disable=protected-access
+	return info
+
+
+def _digestNode(node: Node, plan: _Plan, values: typing.Tuple[typing.Any, ...], childrenInfos: typing.Mapping[int, DigestInfoT]) -> DigestInfoT:
+	"""Computes the digest of a node, which children digests are in `childrenInfos`, and caches it"""
+	inlinedRefs = _noInlinedRefs
+	for info in childrenInfos.values():
+		if info[1]:
+			inlinedRefs = inlinedRefs | info[1]
+
+	parts = [plan.header]
+	for v in values:
+		_encode(v, parts, childrenInfos)
+	return _storeDigest(node, plan, parts, inlinedRefs)
+
+
+def _getDigestInfo(node: Node, depth: int) -> DigestInfoT:
+	"""Computes the digest recursively, serializing the usual properties in place. Deeper than `MAX_RECURSION_DEPTH` switches to `_computeDigest`."""
+	info = getattr(node, "_digestCache", None)
+	if info is not None:
+		return info
+	if depth >= MAX_RECURSION_DEPTH:
+		return traverse(node, _computeDigest)
+
+	plan = _getPlan(type(node))
+	depth += 1
+	parts = [plan.header]
+	inlinedRefs = _noInlinedRefs
+	values = tuple(getattr(node, k, None) for k in plan.slots)
+	for v in values:
+		t = type(v)
+		if t is list or t is tuple:
+			countPos = len(parts)
+			parts.append(None)
+			count = 0
+			for el in v:
+				if isinstance(el, Node):
+					if isinstance(el, _ignoredTypes):
+						continue
+					info = _getDigestInfo(el, depth)
+					parts.append(b"n")
+					parts.append(info[0])
+					if info[1]:
+						inlinedRefs = inlinedRefs | info[1]
+				elif isinstance(el, _compositeTypes):
+					return _getDigestInfoGeneric(node, plan, values, depth)
+				else:
+					_encode(el, parts, None)
+				count += 1
+			parts[countPos] = b"(%d:" % count
+		elif isinstance(v, Node):
+			info = _getDigestInfo(v, depth)
+			parts.append(b"n")
+			parts.append(info[0])
+			if info[1]:
+				inlinedRefs = inlinedRefs | info[1]
+		elif isinstance(v, Mapping):
+			return _getDigestInfoGeneric(node, plan, values, depth)
+		else:
+			_encode(v, parts, None)
+
+	return _storeDigest(node, plan, parts, inlinedRefs)
+
+
+def _getDigestInfoGeneric(node: Node, plan: _Plan, values: typing.Tuple[typing.Any, ...], depth: int) -> DigestInfoT:
+	"""For the nodes having nodes nested into mappings or nested collections, i.e. `TemplateInstantiation`"""
+	childrenInfos = {}
+	for v in values:
+		for child in _iterNestedNodes(v):
+			childrenInfos[id(child)] = _getDigestInfo(child, depth)
+	return _digestNode(node, plan, values, childrenInfos)
+
+
+def _computeDigest(node: Node) -> typing.Generator[Node, DigestInfoT, DigestInfoT]:
+	"""The same as `_getDigestInfo`, but the children are yielded to `traverse` instead of recursion"""
+	info = getattr(node, "_digestCache", None)
+	if info is not None:
+		return info
+
+	plan = _getPlan(type(node))
+	values = tuple(getattr(node, k, None) for k in plan.slots)
+	childrenInfos = {}
+	for v in values:
+		for child in _iterNestedNodes(v):
+			info = getattr(child, "_digestCache", None)
+			if info is None:
+				info = yield child
+			childrenInfos[id(child)] = info
+	return _digestNode(node, plan, values, childrenInfos)
+
+
+def getDigest(node: Node, grammar: typing.Optional[Grammar] = None, _visiting: typing.Optional[set] = None, closures: typing.Optional[typing.Dict[str, bytes]] = None) -> bytes:
+	"""Returns the digest of a subtree. If `grammar` is given, the digests of the char classes referenced from `CharClassUnion`s are mixed in, since some backends inline them. `closures` memoizes the digests of the referenced char classes by their names, pass the same dict to the calls for the same unmodified grammar. For char classes referencing each other in cycles the memoized digests depend on the order of the calls, so use it only where such cycles are rejected anyway."""
+	digest, inlinedRefs = _getDigestInfo(node, 0)
+	if grammar is None or not inlinedRefs:
+		return digest
+
+	if _visiting is None:
+		_visiting = set()
+
+	index = grammar.chars.index
+	parts = [digest]
+	for name in sorted(inlinedRefs):
+		_encode(name, parts, None)
+		if closures is not None:
+			targetDigest = closures.get(name, None)
+			if targetDigest is not None:
+				parts.append(targetDigest)
+				continue
+		target = index.get(name, None) if index is not None else None
+		if target is None or name in _visiting:
+			_encode(None, parts, None)
+			continue
+		_visiting.add(name)
+		targetDigest = getDigest(target, grammar, _visiting, closures)
+		_visiting.remove(name)
+		if closures is not None:
+			closures[name] = targetDigest
+		parts.append(targetDigest)
+	return blake2b(b"".join(parts), digest_size=DIGEST_SIZE).digest()
+
+
+def getGrammarDigest(grammar: Grammar, withMeta: bool = True) -> bytes:
+	"""Returns the digest of a whole grammar. The metadata affects the output of backends, so it is mixed in, unless `withMeta` is `False`."""
+	digest = getDigest(grammar)
+	if not withMeta:
+		return digest
+
+	parts = [digest]
+	meta = grammar.meta
+	for k in ("id", "title", "license", "doc", "docRef", "filenameRegExp"):
+		_encode(getattr(meta, k, None), parts, None)
+	return blake2b(b"".join(parts), digest_size=DIGEST_SIZE).digest()
+
+
+def structurallyEquals(a: Node, b: Node, grammar: typing.Optional[Grammar] = None) -> bool:
+	"""Tells if the subtrees are structurally equal (comments and spacers are ignored), comparing their digests"""
+	return a is b or getDigest(a, grammar) == getDigest(b, grammar)
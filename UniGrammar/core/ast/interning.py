@@ -0,0 +1,85 @@
+"""Hash-consing of AST nodes: structurally identical subtrees are represented by a single shared object, so they are stored once and can be compared with `is`"""
+
+import typing
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .base import Node, _getAllSlots
+
+__all__ = ("NodesInterner", "interning", "internNode")
+
+
+_missing = object()
+
+
+class NodesInterner:
+	"""Returns the canonical instance of each structurally distinct node. Children are interned before their parent, so the key of a node contains the (canonical) children themselves, and computing it takes the time independent of the size of the subtree.
+	Interned nodes are shared, so they must never be modified in place, use `copyOnWrite` mode (the default) of `walkAST` and `Visitor`s for them. The nodes having unhashable properties (i.e. `TemplateInstantiation`) are not interned."""
+
+	__slots__ = ("nodes", "canonical")
+
+	def __init__(self) -> None:
+		self.nodes = {}
+		self.canonical = {}  # id -> node
+
+	def __call__(self, node: typing.Any) -> typing.Any:
+		if not isinstance(node, Node) or id(node) in self.canonical:
+			return node
+
+		key = self.getKey(node)
+		if key is None:
+			return node
+
+		res = self.nodes.get(key, None)
+		if res is None:
+			self.nodes[key] = res = node
+			self.canonical[id(node)] = node
+		return res
+
+	def getKey(self, node: Node) -> typing.Optional[typing.Hashable]:
+		"""Returns the key of a node or `None` if it cannot be interned. The children not interned yet (i.e. created by the constructor of the node) are interned and replaced in it, it is safe since the node itself is not shared yet."""
+		cls = type(node)
+		key = [cls]
+		for k in _getAllSlots(cls):
+			v = getattr(node, k, _missing)
+			if isinstance(v, Node):
+				canonicalV = self(v)
+				if canonicalV is not v:
+					setattr(node, k, canonicalV)
+					v = canonicalV
+			elif k == "children" and isinstance(v, (list, tuple)):
+				canonicalV = tuple(self(c) for c in v)
+				if any(a is not b for a, b in zip(canonicalV, v)):
+					setattr(node, k, type(v)(canonicalV))
+				v = canonicalV
+			key.append(v)
+
+		key = tuple(key)
+		try:
+			hash(key)
+		except TypeError:
+			return None
+		return key
+
+
+_currentInterner = ContextVar("currentInterner", default=None)
+
+
+@contextmanager
+def interning(interner: typing.Optional[NodesInterner] = None) -> typing.Iterator[NodesInterner]:
+	"""Within the block `internNode` interns the nodes using `interner` (a new one if not given)."""
+	if interner is None:
+		interner = NodesInterner()
+	token = _currentInterner.set(interner)
+	try:
+		yield interner
+	finally:
+		_currentInterner.reset(token)
+
+
+def internNode(node: typing.Any) -> typing.Any:
+	"""Returns the canonical instance of `node` from the interner of the current `interning` block. Outside of it returns `node` itself."""
+	interner = _currentInterner.get()
+	if interner is None:
+		return node
+	return interner(node)
@@ -0,0 +1,351 @@
+"""Analyses and transformations of a grammar as passes run by a `PassManager`. The passes declare the analyses they read and invalidate, so the manager runs the compatible ones within a single traversal and reuses the results of analyses until they are invalidated."""
+
+import typing
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from time import perf_counter
+
+from . import Grammar
+from .base import Node, Wrapper
+from .traversal import traverse
+from .visitors import MAX_RECURSION_DEPTH, Visitor, _iterChildren
+from .transformations import NamesCollector, ReferencesCollector, ReferencesRewriter
+
+__all__ = ("Pass", "Analysis", "Transformation", "PassManager", "PassStats", "FusedVisitor", "NamesAnalysis", "ReferencesAnalysis", "ReferencesRewriting", "ALL")
+
+ALL = "*"  # `INVALIDATES` of the passes invalidating all the analyses
+
+
+class Pass(ABC):
+	"""A pass over a whole grammar, done by a visitor. `READS` are the names of analyses which results it needs (they are computed before the traversal it is run within), `INVALIDATES` are the names of analyses it makes outdated (or `ALL`)."""
+
+	__slots__ = ()
+
+	READS = frozenset()
+	INVALIDATES = frozenset()
+	SHALLOW = False  # its visitor doesn't walk the most of the tree (i.e. stops at `Name`s), fusing it with the passes walking the whole tree makes it only slower
+
+	@property
+	def name(self) -> str:
+		return self.__class__.__name__
+
+	@abstractmethod
+	def createVisitor(self, manager: "PassManager") -> Visitor:
+		raise NotImplementedError
+
+	def invalidates(self, analysisName: str) -> bool:
+		return self.INVALIDATES is ALL or analysisName in self.INVALIDATES
+
+
+class Analysis(Pass):
+	"""A pass computing something without modifying the grammar. The result is available under `NAME` in the `PassManager`."""
+
+	__slots__ = ()
+
+	NAME = None
+
+	@property
+	def name(self) -> str:
+		return self.NAME
+
+	@abstractmethod
+	def getResult(self, visitor: Visitor) -> typing.Any:
+		"""Extracts the result from the visitor after the traversal"""
+		raise NotImplementedError
+
+
+class Transformation(Pass):
+	"""A pass modifying the grammar. By default it invalidates all the analyses."""
+
+	__slots__ = ()
+
+	INVALIDATES = ALL
+
+	def finish(self, visitor: Visitor, manager: "PassManager") -> None:
+		"""Called after the traversal"""
+
+
+class FusedVisitor(Visitor):
+	"""Runs multiple visitors within a single traversal. The hooks of the members are called in the order of the members. If `enter` of a member returns `False`, the member doesn't see the children of the node, but the others do. At most one member may replace nodes, the members before it see its replacements of the children of a node in their `leave` hooks."""
+
+	__slots__ = ("members", "fusedPlans")
+
+	def __init__(self, members: typing.Sequence[Visitor]) -> None:
+		super().__init__(any(m.copyOnWrite for m in members))
+		self.members = members
+		self.fusedPlans = {}
+
+	def getFusedPlan(self, nodeType: typing.Type[Node]) -> typing.Tuple[typing.Tuple[typing.Tuple[int, Visitor, typing.Callable], ...], typing.Tuple[typing.Tuple[int, Visitor, typing.Callable], ...], typing.Optional[type]]:
+		"""Returns the `enter` and `leave` hooks of the members for the nodes of `nodeType` as tuples `(bit of the member, member, hook)` and the kind of their children"""
+		enters = []
+		leaves = []
+		childrenKind = None
+		for i, m in enumerate(self.members):
+			enter, leave, childrenKind = m.getPlan(nodeType)
+			if enter is not None:
+				enters.append((1 << i, m, enter))
+			if leave is not None:
+				leaves.append((1 << i, m, leave))
+		self.fusedPlans[nodeType] = res = (tuple(enters), tuple(leaves), childrenKind)
+		return res
+
+	def walk(self, node: Node, parent: typing.Optional[Node] = None) -> typing.Optional[Node]:
+		return self._walkFused(node, parent, (1 << len(self.members)) - 1, 0)
+
+	__call__ = walk
+
+	def _walkFused(self, node: Node, parent: typing.Optional[Node], active: int, depth: int) -> typing.Optional[Node]:
+		if depth >= MAX_RECURSION_DEPTH:
+			return traverse((node, parent, active), self._walkFusedIteratively)
+
+		try:
+			enters, leaves, childrenKind = self.fusedPlans[type(node)]
+		except KeyError:
+			enters, leaves, childrenKind = self.getFusedPlan(type(node))
+
+		childrenActive = active
+		if enters:
+			for bit, member, enter in enters:
+				if active & bit and not enter(member, node, parent):
+					childrenActive &= ~bit
+
+		if childrenKind is not None and childrenActive:
+			depth += 1
+			if childrenKind is Wrapper:
+				child = node.child
+				node = self._replaceWrapped(node, child, self._walkFused(child, node, childrenActive, depth))
+			else:
+				changes = None
+				hasDigest = getattr(node, "_digestCache", None) is not None
+				for i, child in _iterChildren(node, childrenKind):
+					replacement = self._walkFused(child, node, childrenActive, depth)
+					if replacement is not child:
+						if changes is None:
+							changes = []
+						changes.append((i, replacement))
+					elif hasDigest and getattr(child, "_digestCache", None) is None:  # see `_invalidateDigestIfChildChanged`
+						node._digestCache = None  # pylint:disable=protected-access
+						hasDigest = False
+				node = self._replaceChildren(node, changes)
+			if node is None:
+				return None
+
+		if leaves:
+			for bit, member, leave in leaves:
+				if active & bit:
+					node = leave(member, node, parent)
+					if node is None:
+						return None
+		return node
+
+	def _walkFusedIteratively(self, nodeParentAndActive: typing.Tuple[Node, typing.Optional[Node], int]) -> typing.Generator[typing.Tuple[Node, Node, int], typing.Optional[Node], typing.Optional[Node]]:
+		"""The same as `_walkFused`, but the children are yielded to `traverse` instead of recursion"""
+		node, parent, active = nodeParentAndActive
+		try:
+			enters, leaves, childrenKind = self.fusedPlans[type(node)]
+		except KeyError:
+			enters, leaves, childrenKind = self.getFusedPlan(type(node))
+
+		childrenActive = active
+		if enters:
+			for bit, member, enter in enters:
+				if active & bit and not enter(member, node, parent):
+					childrenActive &= ~bit
+
+		if childrenKind is not None and childrenActive:
+			if childrenKind is Wrapper:
+				child = node.child
+				node = self._replaceWrapped(node, child, (yield child, node, childrenActive))
+			else:
+				changes = None
+				hasDigest = getattr(node, "_digestCache", None) is not None
+				for i, child in _iterChildren(node, childrenKind):
+					replacement = yield child, node, childrenActive
+					if replacement is not child:
+						if changes is None:
+							changes = []
+						changes.append((i, replacement))
+					elif hasDigest and getattr(child, "_digestCache", None) is None:  # see `_invalidateDigestIfChildChanged`
+						node._digestCache = None  # pylint:disable=protected-access
+						hasDigest = False
+				node = self._replaceChildren(node, changes)
+			if node is None:
+				return None
+
+		if leaves:
+			for bit, member, leave in leaves:
+				if active & bit:
+					node = leave(member, node, parent)
+					if node is None:
+						return None
+		return node
+
+
+class PassStats:  # pylint: disable=too-few-public-methods
+	"""`time` is the time of the traversals the pass has been run within (shared with the passes fused with it) and of extracting its results"""
+
+	__slots__ = ("name", "runs", "time", "cached")
+
+	def __init__(self, name: str) -> None:
+		self.name = name
+		self.runs = 0
+		self.time = 0.
+		self.cached = 0  # how many times the result of the analysis has been reused
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + ", ".join(k + "=" + repr(getattr(self, k)) for k in self.__class__.__slots__) + ")"
+
+
+class PassManager:
+	"""Runs passes over a grammar. The consecutive passes are fused into a single traversal if they are compatible: none of them reads a result of another one, at most one of them is a `Transformation`, it doesn't invalidate the analyses fused with it, and all of them are either `SHALLOW` or not. The results of the analyses are cached until a transformation invalidates them, call `invalidate` if you modify the grammar yourself."""
+
+	__slots__ = ("grammar", "results", "analyses", "traversals", "stats")
+
+	def __init__(self, grammar: Grammar) -> None:
+		self.grammar = grammar
+		self.results = {}
+		self.analyses = {}  # name -> the analysis computing it, to recompute the ones read by passes
+		self.traversals = 0
+		self.stats = {}
+
+	def _getStats(self, p: Pass) -> PassStats:
+		res = self.stats.get(p.name, None)
+		if res is None:
+			self.stats[p.name] = res = PassStats(p.name)
+		return res
+
+	def get(self, name: str) -> typing.Any:
+		"""Returns the result of an analysis, computing it if it is not cached"""
+		if name not in self.results:
+			self.run((self.analyses[name],))
+		else:
+			self._getStats(self.analyses[name]).cached += 1
+		return self.results[name]
+
+	def invalidate(self, names: typing.Union[str, typing.Iterable[str]] = ALL) -> None:
+		if names is ALL:
+			self.results.clear()
+		else:
+			for n in names:
+				self.results.pop(n, None)
+
+	def schedule(self, passes: typing.Iterable[Pass]) -> typing.List[typing.List[Pass]]:
+		"""Splits passes into groups run within single traversals. The analyses which results are cached are dropped."""
+		groups = []
+		group = []
+		groupTransformation = None
+		groupProvides = set()
+		available = set(self.results)
+
+		for p in passes:
+			if isinstance(p, Analysis):
+				self.analyses[p.NAME] = p
+				if p.NAME in available:
+					self._getStats(p).cached += 1
+					continue
+
+			compatible = bool(group) and not p.READS & groupProvides and p.SHALLOW == group[0].SHALLOW
+			if compatible and groupTransformation is not None:
+				compatible = not any(groupTransformation.invalidates(r) for r in p.READS) and not (isinstance(p, Analysis) and groupTransformation.invalidates(p.NAME))
+			if compatible and isinstance(p, Transformation):
+				compatible = groupTransformation is None and not any(p.invalidates(n) for n in groupProvides)
+
+			if not compatible and group:
+				groups.append(group)
+				group = []
+				groupTransformation = None
+				groupProvides = set()
+
+			group.append(p)
+			if isinstance(p, Transformation):
+				groupTransformation = p
+				if p.INVALIDATES is ALL:
+					available = set()
+				else:
+					available -= p.INVALIDATES
+			else:
+				groupProvides.add(p.NAME)
+				available.add(p.NAME)
+
+		if group:
+			groups.append(group)
+		return groups
+
+	def run(self, passes: typing.Iterable[Pass]) -> None:
+		for group in self.schedule(passes):
+			self._runGroup(group)
+
+	def _runGroup(self, group: typing.Sequence[Pass]) -> None:
+		for p in group:
+			for r in p.READS:
+				if r not in self.results:
+					self.get(r)
+
+		t = perf_counter()
+		visitors = [p.createVisitor(self) for p in group]
+		visitor = visitors[0] if len(visitors) == 1 else FusedVisitor(visitors)
+		visitor.walk(self.grammar)
+		self.traversals += 1
+		traversalTime = perf_counter() - t
+
+		for p, v in zip(group, visitors):
+			t = perf_counter()
+			if isinstance(p, Analysis):
+				self.results[p.NAME] = p.getResult(v)
+			else:
+				p.finish(v, self)
+				self.invalidate(p.INVALIDATES)
+			stats = self._getStats(p)
+			stats.runs += 1
+			stats.time += traversalTime + perf_counter() - t
+
+	def getReport(self) -> typing.Iterator[str]:
+		"""Lines describing the count of traversals and the time taken by each pass"""
+		yield "traversals: " + str(self.traversals)
+		for s in self.stats.values():
+			yield s.name + ": runs " + str(s.runs) + ", reused " + str(s.cached) + ", " + format(s.time * 1000, ".3f") + " ms"
+
+
+class NamesAnalysis(Analysis):
+	"""The counterpart of `getNames`"""
+
+	__slots__ = ()
+
+	NAME = "names"
+	SHALLOW = True
+
+	def createVisitor(self, manager: PassManager) -> NamesCollector:
+		return NamesCollector({})
+
+	def getResult(self, visitor: NamesCollector) -> typing.Mapping[str, typing.Tuple[Node, Node]]:
+		return visitor.accumulator
+
+
+class ReferencesAnalysis(Analysis):
+	"""The counterpart of `getReferenced`"""
+
+	__slots__ = ()
+
+	NAME = "references"
+
+	def createVisitor(self, manager: PassManager) -> ReferencesCollector:
+		return ReferencesCollector(set())
+
+	def getResult(self, visitor: ReferencesCollector) -> typing.Set[str]:
+		return visitor.accumulator
+
+
+class ReferencesRewriting(Transformation):
+	"""The counterpart of `rewriteReferences` in `copyOnWrite` mode. Names are not bound or unbound, so only `ReferencesAnalysis` is invalidated."""
+
+	__slots__ = ("nameRemap",)
+
+	INVALIDATES = frozenset((ReferencesAnalysis.NAME,))
+
+	def __init__(self, nameRemap: typing.Union[typing.Callable, typing.Mapping[str, str]]) -> None:
+		if isinstance(nameRemap, Mapping):
+			nameRemap = nameRemap.get
+		self.nameRemap = nameRemap
+
+	def createVisitor(self, manager: PassManager) -> ReferencesRewriter:
+		return ReferencesRewriter(self.nameRemap, copyOnWrite=True)
@@ -0,0 +1,144 @@
+"""The table of names bound within a grammar, updated incrementally when sections are modified, so looking a name up never needs walking the grammar"""
+
+import typing
+from collections.abc import Mapping
+
+from .base import Name, Node
+
+__all__ = ("Symbol", "SymbolTable", "SectionIndex")
+
+
+class Symbol:
+	"""A binding of a name: a `Name` node (`parent`), the named subtree (`node`) and the section containing it. Unpacks as `(section, node, parent)`."""
+
+	__slots__ = ("section", "parent")
+
+	def __init__(self, section: "Section", parent: Name) -> None:
+		self.section = section
+		self.parent = parent
+
+	@property
+	def name(self) -> str:
+		return self.parent.name
+
+	@property
+	def node(self) -> Node:
+		return self.parent.child  # not stored, since the `Name` can be rewritten in place
+
+	def __iter__(self) -> typing.Iterator[typing.Any]:
+		yield self.section
+		yield self.node
+		yield self.parent
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + repr(self.name) + ", " + type(self.section).__name__ + ")"
+
+
+class SymbolTable(Mapping):
+	"""Maps names to `Symbol`s. If a name is bound in multiple sections, the binding in the section attached later (in `Grammar` they are attached in the order of `sectionsDescriptors`) shadows the others, as in `getNames`, but the others are still available via the `index` of their sections."""
+
+	__slots__ = ("bindings", "positions", "listeners")
+
+	def __init__(self) -> None:
+		self.bindings = {}  # name -> list of `Symbol`s sorted by position of their sections
+		self.positions = {}  # id(section) -> position
+		self.listeners = []  # called with a name when it is bound or unbound
+
+	def attach(self, section: "Section", position: typing.Optional[int] = None) -> None:
+		"""Binds the names of the section and makes it update the table on modification. `position` determines shadowing, by default the section is the last one."""
+		if position is None:
+			position = max(self.positions.values(), default=-1) + 1
+		self.positions[id(section)] = position
+		section.symbols = self
+		section.index = SectionIndex(self, section)
+		for item in section.children:
+			self.bind(section, item)
+
+	def detach(self, section: "Section") -> None:
+		for item in section.children:
+			self.unbind(section, item)
+		del self.positions[id(section)]
+		section.symbols = None
+		section.recomputeIndex()
+
+	def bind(self, section: "Section", item: Node) -> None:
+		if not isinstance(item, Name):
+			return
+
+		for listener in self.listeners:
+			listener(item.name)
+
+		sym = Symbol(section, item)
+		syms = self.bindings.get(item.name, None)
+		if syms is None:
+			self.bindings[item.name] = [sym]
+			return
+
+		pos = self.positions[id(section)]
+		i = len(syms)
+		while i and self.positions[id(syms[i - 1].section)] > pos:
+			i -= 1
+		syms.insert(i, sym)
+
+	def unbind(self, section: "Section", item: Node) -> None:
+		if not isinstance(item, Name):
+			return
+
+		for listener in self.listeners:
+			listener(item.name)
+
+		syms = self.bindings.get(item.name, ())
+		for i, sym in enumerate(syms):
+			if sym.parent is item and sym.section is section:
+				del syms[i]
+				if not syms:
+					del self.bindings[item.name]
+				return
+
+	def touch(self, item: Node) -> None:
+		"""Tells the listeners that the subtree named by `item` has been modified in place, without rebinding"""
+		if not isinstance(item, Name):
+			return
+
+		for listener in self.listeners:
+			listener(item.name)
+
+	def lookup(self, name: str, section: "Section") -> Symbol:
+		"""Returns the binding of `name` within `section`"""
+		for sym in reversed(self.bindings.get(name, ())):
+			if sym.section is section:
+				return sym
+		raise KeyError(name)
+
+	def __getitem__(self, name: str) -> Symbol:
+		return self.bindings[name][-1]
+
+	def __contains__(self, name: str) -> bool:
+		return name in self.bindings
+
+	def __iter__(self) -> typing.Iterator[str]:
+		return iter(self.bindings)
+
+	def __len__(self) -> int:
+		return len(self.bindings)
+
+
+class SectionIndex(Mapping):
+	"""`Section.index` of a section attached to a `SymbolTable`: a view mapping the names bound in the section to the named subtrees"""
+
+	__slots__ = ("symbols", "section")
+
+	def __init__(self, symbols: SymbolTable, section: "Section") -> None:
+		self.symbols = symbols
+		self.section = section
+
+	def __getitem__(self, name: str) -> Node:
+		return self.symbols.lookup(name, self.section).node
+
+	def __iter__(self) -> typing.Iterator[str]:
+		for item in self.section.children:
+			if isinstance(item, Name):
+				yield item.name
+
+	def __len__(self) -> int:
+		return sum(1 for _ in self)
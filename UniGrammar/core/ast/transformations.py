@@ -1,12 +1,17 @@
 import typing
-from collections.abc import Iterable, Mapping
+from collections.abc import Mapping
+from operator import itemgetter
 from warnings import warn
 
 from . import Grammar
-from .base import Name, Node, Ref, Wrapper
+from .base import Name, Node, Ref, Wrapper, _getAllSlots
+from .characters import CharClassUnion
+from .compact import CompactGrammar
+from .traversal import traverse
+from .visitors import MAX_RECURSION_DEPTH, Visitor, _applyChildrenChanges, _getChildrenKind, _invalidateDigestIfChildChanged
 
 
-def walkAST(node: Node, funcToCall: typing.Callable, parent: typing.Optional[Node] = None, shouldTrace: typing.Callable = False) -> None:
+def walkAST(node: Node, funcToCall: typing.Callable, parent: typing.Optional[Node] = None, shouldTrace: typing.Callable = False, copyOnWrite: bool = True) -> None:
 	"""Walks AST leaves, calling funcToCall on all of them.
 	`funcToCall` must return a tuple
 	1. a `bool`, telling if we should deepen into `Container`s and `Wrapper`s
@@ -14,8 +19,22 @@ def walkAST(node: Node, funcToCall: typing.Callable, parent: typing.Optional[Nod
 	3. a `bool` telling if we should crawl the replacement.
 
 	Usually you need return True, node, False
+
+	If `copyOnWrite` is set (the default), the nodes having `COPY_ON_WRITE` set are never modified, instead they are copied (with all their ancestors up to the nearest node not having `COPY_ON_WRITE`), and the copies are modified. So the subtrees shared between forks of a grammar and between the rules of a parsed grammar (see `interning`) stay intact. The caller must use the returned node. Unset it only for trees having no shared subtrees. When it is unset, the kept rules of the sections attached to a `SymbolTable` are reported to it as modified (see `SymbolTable.touch`), since in-place modifications cannot be detected.
+
+	The AST is walked using an explicit stack, so it can be nested arbitrarily deep. The children of a node are replaced and deleted after all of them are walked.
+
+	New transformations should be written as `visitors.Visitor`s instead, they are faster. For a `CompactGrammar` use its `walk` method.
 	"""
 
+	node, shouldDeepen, _shouldTrace = _visitNode(node, parent, funcToCall, shouldTrace, copyOnWrite)
+	if not shouldDeepen:
+		return node
+	return _walkChildren(node, parent, _shouldTrace, funcToCall, shouldTrace, copyOnWrite, 0)
+
+
+def _visitNode(node: Node, parent: typing.Optional[Node], funcToCall: typing.Callable, shouldTrace: typing.Callable, copyOnWrite: bool) -> typing.Tuple[typing.Optional[Node], bool, bool]:
+	"""Calls `funcToCall` for a node. Returns the replacement of the node, if its children must be walked, and if it is traced."""
 	if callable(shouldTrace):
 		_shouldTrace = shouldTrace(node, parent)
 	else:
@@ -25,6 +44,8 @@ def walkAST(node: Node, funcToCall: typing.Callable, parent: typing.Optional[Nod
 		print("walkAST", node, parent)
 
 	shouldDeepen, replacement, shouldWalkReplacement = funcToCall(node, parent)
+	if replacement is node and not (copyOnWrite and node.COPY_ON_WRITE):  # `funcToCall` may have modified it in place, we cannot tell. The ancestors are invalidated by `_invalidateDigestIfChildChanged`.
+		node._digestCache = None  # pylint:disable=protected-access
 
 	if _shouldTrace and node is not replacement:
 		print("Node replaced", node, "->", replacement)
@@ -32,97 +53,252 @@ def walkAST(node: Node, funcToCall: typing.Callable, parent: typing.Optional[Nod
 
 	if shouldWalkReplacement:
 		if node is not None:
-			replacement = walkAST(node, funcToCall, parent, shouldTrace)
+			replacement = walkAST(node, funcToCall, parent, shouldTrace, copyOnWrite)
 			if _shouldTrace and node is not replacement:
 				print("Node replaced again", node, "->", replacement)
 			node = replacement
 		else:
 			warn("When deleting a node, `shouldWalkReplacement` must be `False`: " + repr(node))
 
-	if shouldDeepen:
-		if isinstance(node, Iterable):
-			if _shouldTrace:
-				print("Processing children of ", node)
-			for i in range(len(node)):
-				v = node[i]
-				childReplacement = walkAST(v, funcToCall, node, shouldTrace)
-				if childReplacement is not None:
-					if childReplacement is not v:
-						if _shouldTrace:
-							print(str(i) + "th child replaced", v, "->", childReplacement, node, parent)
-						node[i] = childReplacement
-				else:
-					if _shouldTrace:
-						print(str(i) + "th child deleted", v, node, parent)
-					del node[i]
-			if not len(node) and not node.EMPTY_MAKES_SENSE:
-				if _shouldTrace:
-					print("Empty collection deleted", node)
-				return None
-		elif isinstance(node, Wrapper):
-			if _shouldTrace:
-				print("Processing child of ", node)
-			childReplacement = walkAST(node.child, funcToCall, node, shouldTrace)
-			if childReplacement is not None:
-				if childReplacement is not node.child:
-					if _shouldTrace:
-						print("Wrapped child replaced", node.child, "->", childReplacement, node, parent)
-					node.child = childReplacement
+	if _getChildrenKind(type(node)) is not None:
+		if shouldDeepen:
+			return node, True, _shouldTrace
+		if _shouldTrace:
+			print("NOT Processing children of ", node, "since `shouldDeepen` is ", shouldDeepen)
+	return node, False, _shouldTrace
+
+
+def _traceItemReplacement(i: int, v: Node, childReplacement: typing.Optional[Node], node: Node, parent: typing.Optional[Node], _shouldTrace: bool) -> None:
+	if _shouldTrace:
+		if childReplacement is not None:
+			print(str(i) + "th child replaced", v, "->", childReplacement, node, parent)
+		else:
+			print(str(i) + "th child deleted", v, node, parent)
+
+
+def _dropEmptyCollection(node: Node, _shouldTrace: bool) -> typing.Optional[Node]:
+	if not len(node) and not node.EMPTY_MAKES_SENSE:
+		if _shouldTrace:
+			print("Empty collection deleted", node)
+		return None
+	return node
+
+
+def _replaceWrapped(node: Wrapper, childReplacement: typing.Optional[Node], parent: typing.Optional[Node], _shouldTrace: bool, copyOnWrite: bool) -> typing.Optional[Node]:
+	"""Replaces or deletes the child of a wrapper, the child is known to be replaced"""
+	if childReplacement is not None:
+		if _shouldTrace:
+			print("Wrapped child replaced", node.child, "->", childReplacement, node, parent)
+		if copyOnWrite and node.COPY_ON_WRITE:
+			node = node.shallowCopy()
+		node._digestCache = None  # pylint:disable=protected-access
+		node.child = childReplacement
+		return node
+
+	if _shouldTrace:
+		print("Empty wrapper deleted", node, parent)
+	return None
+
+
+def _walkChildren(node: Node, parent: typing.Optional[Node], _shouldTrace: bool, funcToCall: typing.Callable, shouldTrace: typing.Callable, copyOnWrite: bool, depth: int) -> typing.Optional[Node]:
+	"""Walks the children of a node recursively and returns the node with the children replaced. Deeper than `MAX_RECURSION_DEPTH` switches to `_walkChildrenIteratively`."""
+	if depth >= MAX_RECURSION_DEPTH:
+		return traverse((node, parent, _shouldTrace), _walkChildrenIteratively, funcToCall, shouldTrace, copyOnWrite)
+
+	if _getChildrenKind(type(node)) is not Wrapper:
+		if _shouldTrace:
+			print("Processing children of ", node)
+		changes = []
+		symbols = None if copyOnWrite else getattr(node, "symbols", None)
+		for i, v in enumerate(tuple(node)):
+			childReplacement, shouldDeepenChild, childTrace = _visitNode(v, node, funcToCall, shouldTrace, copyOnWrite)
+			if shouldDeepenChild:
+				childReplacement = _walkChildren(childReplacement, node, childTrace, funcToCall, shouldTrace, copyOnWrite, depth + 1)
+			if childReplacement is not v:
+				_traceItemReplacement(i, v, childReplacement, node, parent, _shouldTrace)
+				changes.append((i, childReplacement))
 			else:
-				if _shouldTrace:
-					print("Empty wrapper deleted", node, parent)
-				return None
-	else:
-		if isinstance(node, (Wrapper, Iterable)):
-			if _shouldTrace:
-				print("NOT Processing children of ", node, "since `shouldDeepen` is ", shouldDeepen)
+				_invalidateDigestIfChildChanged(node, v)
+				if symbols is not None:  # `funcToCall` may have modified the rule in place, we cannot tell
+					symbols.touch(v)
+		if changes:
+			node = _applyChildrenChanges(node, changes, copyOnWrite and node.COPY_ON_WRITE)
+		return _dropEmptyCollection(node, _shouldTrace)
+
+	if _shouldTrace:
+		print("Processing child of ", node)
+	childReplacement, shouldDeepenChild, childTrace = _visitNode(node.child, node, funcToCall, shouldTrace, copyOnWrite)
+	if shouldDeepenChild:
+		childReplacement = _walkChildren(childReplacement, node, childTrace, funcToCall, shouldTrace, copyOnWrite, depth + 1)
+	if childReplacement is not node.child:
+		return _replaceWrapped(node, childReplacement, parent, _shouldTrace, copyOnWrite)
+	_invalidateDigestIfChildChanged(node, childReplacement)
+	return node
+
+
+def _walkChildrenIteratively(nodeParentAndTrace: typing.Tuple[Node, typing.Optional[Node], bool], funcToCall: typing.Callable, shouldTrace: typing.Callable, copyOnWrite: bool) -> typing.Generator[typing.Tuple[Node, Node, bool], typing.Optional[Node], typing.Optional[Node]]:
+	"""The same as `_walkChildren`, but the children having own children to be walked are yielded to `traverse` instead of recursion."""
+	node, parent, _shouldTrace = nodeParentAndTrace
+
+	if _getChildrenKind(type(node)) is not Wrapper:
+		if _shouldTrace:
+			print("Processing children of ", node)
+		changes = []
+		symbols = None if copyOnWrite else getattr(node, "symbols", None)
+		for i, v in enumerate(tuple(node)):
+			childReplacement, shouldDeepenChild, childTrace = _visitNode(v, node, funcToCall, shouldTrace, copyOnWrite)
+			if shouldDeepenChild:
+				childReplacement = yield childReplacement, node, childTrace
+			if childReplacement is not v:
+				_traceItemReplacement(i, v, childReplacement, node, parent, _shouldTrace)
+				changes.append((i, childReplacement))
+			else:
+				_invalidateDigestIfChildChanged(node, v)
+				if symbols is not None:  # `funcToCall` may have modified the rule in place, we cannot tell
+					symbols.touch(v)
+		if changes:
+			node = _applyChildrenChanges(node, changes, copyOnWrite and node.COPY_ON_WRITE)
+		return _dropEmptyCollection(node, _shouldTrace)
+
+	if _shouldTrace:
+		print("Processing child of ", node)
+	childReplacement, shouldDeepenChild, childTrace = _visitNode(node.child, node, funcToCall, shouldTrace, copyOnWrite)
+	if shouldDeepenChild:
+		childReplacement = yield childReplacement, node, childTrace
+	if childReplacement is not node.child:
+		return _replaceWrapped(node, childReplacement, parent, _shouldTrace, copyOnWrite)
+	_invalidateDigestIfChildChanged(node, childReplacement)
 	return node
 
 
-def rewriteReferences(node: Node, nameRemap: typing.Union[typing.Callable, typing.Mapping[str, str]]) -> None:
-	"""Replaces references to a (non-)terminal with references to another (non-)terminal according to `nameRemap`"""
+class ReferencesRewriter(Visitor):
+	"""Replaces references to a (non-)terminal with references to another (non-)terminal according to `nameRemap`, returning `None` for the names to keep"""
+
+	__slots__ = ("nameRemap",)
+
+	def __init__(self, nameRemap: typing.Callable[[str], typing.Optional[str]], copyOnWrite: bool = True) -> None:
+		super().__init__(copyOnWrite)
+		self.nameRemap = nameRemap
+
+	def leaveRef(self, node: Ref, parent: typing.Optional[Node]) -> Ref:  # pylint:disable=unused-argument
+		newName = self.nameRemap(node.name)
+		if newName is not None:
+			node = self.getMutable(node)
+			node.name = newName
+		return node
+
+
+def rewriteReferences(node: Node, nameRemap: typing.Union[typing.Callable, typing.Mapping[str, str]], copyOnWrite: bool = True) -> Node:
+	"""Replaces references to a (non-)terminal with references to another (non-)terminal according to `nameRemap`. Returns the node, which may differ from `node` in `copyOnWrite` mode (a grammar and its sections are modified in place in any mode). `copyOnWrite` must not be unset for parsed grammars, their structurally identical subtrees are shared, so a shared subtree would be rewritten once per rule referencing it."""
 	if isinstance(nameRemap, Mapping):
+		nameRemap = nameRemap.get
 
-		def nameRemap1(nodeName):
-			return nameRemap.get(nodeName, None)
+	return ReferencesRewriter(nameRemap, copyOnWrite).walk(node)
 
-	else:
-		nameRemap1 = nameRemap
 
-	def cb(node: Node, parent: typing.Optional[Node]) -> bool:
-		if isinstance(node, Ref):
-			newName = nameRemap1(node.name)
-			if newName is not None:
-				node.name = newName
-		return True, node, False
+class ReferencesCollector(Visitor):
+	"""Collects the referenced names into `accumulator`"""
+
+	__slots__ = ("accumulator",)
+
+	def __init__(self, accumulator: typing.Set[str]) -> None:
+		super().__init__()
+		self.accumulator = accumulator
 
-	walkAST(node, cb)
+	def enterRef(self, node: Ref, parent: typing.Optional[Node]) -> bool:  # pylint:disable=unused-argument
+		self.accumulator.add(node.name)
+		return False
 
 
 def getReferenced(node: Node, accumulator: set = None) -> typing.Set[str]:
 	"""Get all the referenced names"""
+	if isinstance(node, CompactGrammar):
+		return node.getReferenced(accumulator)
+
 	if accumulator is None:
 		accumulator = set()
 
-	def cb(node: Node, parent: typing.Optional[Node]) -> bool:
-		if isinstance(node, Ref):
-			accumulator.add(node.name)
-		return True, node, False
-
-	walkAST(node, cb)
+	ReferencesCollector(accumulator).walk(node)
 	return accumulator
 
 
+class NamesCollector(Visitor):
+	"""Collects `Name` nodes children and parents into `accumulator`, not walking the named subtrees"""
+
+	__slots__ = ("accumulator",)
+
+	def __init__(self, accumulator: typing.Dict[str, typing.Tuple[Node, Node]]) -> None:
+		super().__init__()
+		self.accumulator = accumulator
+
+	def enterName(self, node: Name, parent: typing.Optional[Node]) -> bool:
+		self.accumulator[node.name] = (node.child, parent)
+		return False
+
+
 def getNames(node: Grammar, accumulator: dict = None) -> typing.Mapping[str, typing.Tuple[Node, Node]]:
-	"""Return `Name` nodes children and parents, that must be sections in a valid UniGrammar file"""
+	"""Return `Name` nodes children and parents, that must be sections in a valid UniGrammar file. For a `CompactGrammar` they are indices."""
+	if isinstance(node, CompactGrammar):
+		return node.getNames(accumulator)
+
 	if accumulator is None:
 		accumulator = {}
 
-	def cb(node: Node, parent: typing.Optional[Node]) -> bool:
-		if isinstance(node, Name):
-			accumulator[node.name] = (node.child, parent)
-			return False, node, False
-		return True, node, False
-
-	walkAST(node, cb)
+	NamesCollector(accumulator).walk(node)
 	return accumulator
+
+
+def getStructuralKey(node: typing.Any, grammar: typing.Optional[Grammar] = None, _visiting: typing.Optional[set] = None) -> typing.Hashable:
+	"""Returns a hashable value equal for structurally equal subtrees. If `grammar` is given, the char classes referenced from `CharClassUnion`s are included into the key, since they are inlined by some backends.
+	The key is a flat tuple (the subtree serialized in preorder, every composite value is preceded by its type and count of items), since hashing and comparing deeply nested tuples is recursive."""
+	res = []
+	traverse(node, _getStructuralKey, grammar, _visiting, res)
+	return tuple(res)
+
+
+_compositeTypes = (Node, list, tuple, Mapping)
+
+
+def _getStructuralKey(node: typing.Any, grammar: typing.Optional[Grammar], _visiting: typing.Optional[set], res: list) -> typing.Generator[typing.Any, None, None]:
+	if isinstance(node, Node):
+		slots = _getAllSlots(type(node))
+		res.append((type(node).__name__, len(slots)))
+		for k in slots:
+			try:
+				v = getattr(node, k)
+			except AttributeError:
+				v = None
+			if isinstance(v, _compositeTypes):
+				yield v
+			else:
+				res.append(v)
+
+		if grammar is not None and isinstance(node, CharClassUnion):
+			if _visiting is None:
+				_visiting = set()
+			for c in node.children:
+				if isinstance(c, Ref) and c.name not in _visiting:
+					_visiting.add(c.name)
+					index = grammar.chars.index
+					res.append(getStructuralKey(index.get(c.name, None) if index is not None else None, grammar, _visiting))
+					_visiting.remove(c.name)
+		return
+
+	if isinstance(node, (list, tuple)):
+		res.append(("[]", len(node)))
+		items = node
+	elif isinstance(node, Mapping):
+		res.append(("{}", len(node)))
+		items = []
+		for k, v in sorted(node.items(), key=itemgetter(0)):
+			res.append(k)
+			items.append(v)
+	else:
+		res.append(node)
+		return
+
+	for v in items:
+		if isinstance(v, _compositeTypes):
+			yield v
+		else:
+			res.append(v)
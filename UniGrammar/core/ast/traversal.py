@@ -0,0 +1,47 @@
+"""Traversal of AST using an explicit stack instead of Python frames, so the depth of nesting is limited only by memory"""
+
+import typing
+
+from .base import Collection, Node, Wrapper
+
+__all__ = ("traverse", "getChildren")
+
+NodeProcessorT = typing.Callable[..., typing.Generator[typing.Any, typing.Any, typing.Any]]
+
+
+def getChildren(node: Node) -> typing.Sequence[Node]:
+	if isinstance(node, Wrapper):
+		return (node.child,)
+	if isinstance(node, Collection):
+		return node.children
+	return ()
+
+
+def traverse(root: typing.Any, process: NodeProcessorT, *args) -> typing.Any:
+	"""Processes `root` with `process` and returns the result. `process(item, *args)` must return a generator, which is the non-recursive counterpart of a recursive function: instead of calling itself for a child it must `yield` the item to process, the result is sent back into it. The value returned by the generator is the result of processing. Exceptions propagate into the generators of ancestors, the same way as they propagate through calls."""
+	stack = [process(root, *args)]
+	value = None
+	exc = None
+	while True:
+		gen = stack[-1]
+		try:
+			if exc is None:
+				item = gen.send(value)
+			else:
+				item = gen.throw(exc)
+				exc = None
+		except StopIteration as ex:
+			stack.pop()
+			if not stack:
+				return ex.value
+			value = ex.value
+			continue
+		except BaseException as ex:  # pylint:disable=broad-except
+			stack.pop()
+			if not stack:
+				raise
+			exc = ex
+			continue
+
+		stack.append(process(item, *args))
+		value = None
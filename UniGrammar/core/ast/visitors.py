@@ -0,0 +1,276 @@
+"""Transformations of AST as visitors: classes having hooks for the types of nodes. The hooks for a type of nodes are looked up once, the nodes having no hooks and no children cost nearly nothing, and tracing costs nothing when it is disabled."""
+
+import typing
+from collections.abc import Iterable
+from itertools import islice
+
+from .base import Collection, Node, Wrapper
+from .traversal import traverse
+
+__all__ = ("Visitor",)
+
+MAX_RECURSION_DEPTH = 64  # nodes nested not deeper are walked recursively, it is faster
+
+TraceT = typing.Union[bool, typing.Callable[[Node, typing.Optional[Node]], bool]]
+EnterHookT = typing.Callable[["Visitor", Node, typing.Optional[Node]], bool]
+LeaveHookT = typing.Callable[["Visitor", Node, typing.Optional[Node]], typing.Optional[Node]]
+
+
+_childrenKindsCache = {}
+
+
+def _getChildrenKind(cls: type) -> typing.Optional[type]:
+	"""Returns `Collection`, `Iterable` (for other iterable nodes, i.e. `Grammar`) or `Wrapper` if nodes of `cls` have children, and `None` otherwise. `isinstance` with ABCs is slow, so it is cached for types of nodes"""
+	try:
+		return _childrenKindsCache[cls]
+	except KeyError:
+		pass
+
+	if issubclass(cls, Collection):
+		res = Collection
+	elif issubclass(cls, Iterable):
+		res = Iterable
+	elif issubclass(cls, Wrapper):
+		res = Wrapper
+	else:
+		res = None
+	_childrenKindsCache[cls] = res
+	return res
+
+
+def _iterChildren(node: Node, childrenKind: type) -> typing.Iterator[typing.Tuple[int, Node]]:
+	"""Enumerates the children the node has before walking, the ones added by hooks (i.e. the rules embedded into sections) are not walked"""
+	if childrenKind is Collection:
+		children = node.children
+		return enumerate(islice(children, len(children)))
+	return enumerate(tuple(node))
+
+
+def _invalidateDigestIfChildChanged(node: Node, child: Node) -> None:
+	"""A node having a digest cached has the digests of all its children cached too (see `digests`), so if the child has no digest, it has been modified in place, and so is the node"""
+	if getattr(node, "_digestCache", None) is not None and getattr(child, "_digestCache", None) is None:
+		node._digestCache = None  # pylint:disable=protected-access
+
+
+def _applyChildrenChanges(node: Node, changes: typing.Iterable[typing.Tuple[int, typing.Optional[Node]]], mustCopy: bool) -> Node:
+	"""Applies the replacements (`None` means deletion) of the children of an iterable node, given in the order of indices. The deletions are applied after all the replacements, from the last index, so they don't shift the indices of the rest. The items are set and deleted via the node, so sections keep their symbols tables up to date."""
+	if mustCopy:
+		node = node.shallowCopy()
+	elif isinstance(getattr(node, "children", None), tuple):
+		node.children = list(node.children)
+	node._digestCache = None  # pylint:disable=protected-access
+
+	deleted = []
+	for i, replacement in changes:
+		if replacement is None:
+			deleted.append(i)
+		else:
+			node[i] = replacement
+	for i in reversed(deleted):
+		del node[i]
+	return node
+
+
+class Visitor:
+	"""A base class of transformations of AST. For each node two hooks are called (if defined), the names of them are derived from the name of the type of the node or, if not defined, of the nearest base class of it (`Node` is the last one):
+	* `enter<Type>(node, parent) -> bool` is called before the children of the node, it tells if they must be walked;
+	* `leave<Type>(node, parent) -> Optional[Node]` is called after the children of the node are walked and replaced, it returns the replacement of the node: the node itself to keep it, `None` to delete it. The replacement is not walked.
+
+	The empty collections for which emptiness doesn't make sense are deleted.
+	In `copyOnWrite` mode (the default) the nodes having `COPY_ON_WRITE` set are copied before their children are replaced, hooks must use `getMutable` before modifying a node. The caller must use the node returned by `walk`. The mode must be unset only for trees having no shared subtrees: parsed grammars share structurally identical ones (see `interning`), and forks share rules. When it is unset, the in-place modifications (counted in `inPlaceChanges` by `getMutable`) of the rules of a section attached to a `SymbolTable` are reported to it via `touch`, so `Grammar.dependencies` stays up to date.
+	`trace` (a `bool` or a predicate `(node, parent) -> bool`) prints the nodes visited and replaced."""
+
+	__slots__ = ("copyOnWrite", "plans", "inPlaceChanges")
+
+	_plansCache = {}
+
+	def __init_subclass__(cls, **kwargs) -> None:
+		super().__init_subclass__(**kwargs)
+		cls._plansCache = {}
+
+	def __init__(self, copyOnWrite: bool = True, trace: TraceT = False) -> None:
+		self.copyOnWrite = copyOnWrite
+		self.inPlaceChanges = 0
+		if trace:
+			self.plans = _TracingPlans(self.__class__, trace)
+		else:
+			self.plans = self.__class__._plansCache
+
+	@classmethod
+	def _resolveHooks(cls, nodeType: typing.Type[Node]) -> typing.Tuple[typing.Optional[EnterHookT], typing.Optional[LeaveHookT], typing.Optional[type]]:
+		enter = None
+		leave = None
+		for t in nodeType.__mro__:
+			if not issubclass(t, Node):
+				continue
+			if enter is None:
+				enter = getattr(cls, "enter" + t.__name__, None)
+			if leave is None:
+				leave = getattr(cls, "leave" + t.__name__, None)
+		return enter, leave, _getChildrenKind(nodeType)
+
+	def getPlan(self, nodeType: typing.Type[Node]) -> typing.Tuple[typing.Optional[EnterHookT], typing.Optional[LeaveHookT], typing.Optional[type]]:
+		"""Returns the hooks for nodes of `nodeType` and the kind of their children"""
+		plans = self.plans
+		try:
+			return plans[nodeType]
+		except KeyError:
+			plans[nodeType] = res = self._resolveHooks(nodeType)
+			return res
+
+	def getMutable(self, node: Node) -> Node:
+		"""Returns the node which can be modified in place: the node itself or, in `copyOnWrite` mode, a copy of it"""
+		if self.copyOnWrite and node.COPY_ON_WRITE:
+			node = node.shallowCopy()
+		else:
+			self.inPlaceChanges += 1
+		node._digestCache = None  # pylint:disable=protected-access
+		return node
+
+	def walk(self, node: Node, parent: typing.Optional[Node] = None) -> typing.Optional[Node]:
+		"""Walks the subtree and returns its replacement"""
+		return self._walk(node, parent, 0)
+
+	__call__ = walk
+
+	def _walk(self, node: Node, parent: typing.Optional[Node], depth: int) -> typing.Optional[Node]:
+		if depth >= MAX_RECURSION_DEPTH:
+			return traverse((node, parent), self._walkIteratively)
+
+		try:
+			enter, leave, childrenKind = self.plans[type(node)]
+		except KeyError:
+			enter, leave, childrenKind = self.getPlan(type(node))
+		if childrenKind is not None and (enter is None or enter(self, node, parent)):
+			depth += 1
+			if childrenKind is Wrapper:
+				child = node.child
+				replacement = self._walk(child, node, depth)
+				node = self._replaceWrapped(node, child, replacement)
+			else:
+				changes = None
+				hasDigest = getattr(node, "_digestCache", None) is not None
+				symbols = None if self.copyOnWrite else getattr(node, "symbols", None)
+				for i, child in _iterChildren(node, childrenKind):
+					if symbols is not None:
+						changesBefore = self.inPlaceChanges
+					replacement = self._walk(child, node, depth)
+					if replacement is not child:
+						if changes is None:
+							changes = []
+						changes.append((i, replacement))
+					else:
+						if hasDigest and getattr(child, "_digestCache", None) is None:  # see `_invalidateDigestIfChildChanged`
+							node._digestCache = None  # pylint:disable=protected-access
+							hasDigest = False
+						if symbols is not None and self.inPlaceChanges != changesBefore:
+							symbols.touch(child)
+				node = self._replaceChildren(node, changes)
+
+			if node is None:
+				return None
+		elif enter is not None and childrenKind is None:
+			enter(self, node, parent)
+
+		if leave is not None:
+			return leave(self, node, parent)
+		return node
+
+	def _walkIteratively(self, nodeAndParent: typing.Tuple[Node, typing.Optional[Node]]) -> typing.Generator[typing.Tuple[Node, Node], typing.Optional[Node], typing.Optional[Node]]:
+		"""The same as `_walk`, but the children are yielded to `traverse` instead of recursion"""
+		node, parent = nodeAndParent
+		try:
+			enter, leave, childrenKind = self.plans[type(node)]
+		except KeyError:
+			enter, leave, childrenKind = self.getPlan(type(node))
+		if childrenKind is not None and (enter is None or enter(self, node, parent)):
+			if childrenKind is Wrapper:
+				child = node.child
+				replacement = yield child, node
+				node = self._replaceWrapped(node, child, replacement)
+			else:
+				changes = None
+				hasDigest = getattr(node, "_digestCache", None) is not None
+				symbols = None if self.copyOnWrite else getattr(node, "symbols", None)
+				for i, child in _iterChildren(node, childrenKind):
+					if symbols is not None:
+						changesBefore = self.inPlaceChanges
+					replacement = yield child, node
+					if replacement is not child:
+						if changes is None:
+							changes = []
+						changes.append((i, replacement))
+					else:
+						if hasDigest and getattr(child, "_digestCache", None) is None:  # see `_invalidateDigestIfChildChanged`
+							node._digestCache = None  # pylint:disable=protected-access
+							hasDigest = False
+						if symbols is not None and self.inPlaceChanges != changesBefore:
+							symbols.touch(child)
+				node = self._replaceChildren(node, changes)
+
+			if node is None:
+				return None
+		elif enter is not None and childrenKind is None:
+			enter(self, node, parent)
+
+		if leave is not None:
+			return leave(self, node, parent)
+		return node
+
+	def _replaceWrapped(self, node: Wrapper, child: Node, replacement: typing.Optional[Node]) -> typing.Optional[Node]:
+		"""Returns the wrapper with the child replaced, or `None` if the child is deleted"""
+		if replacement is child:
+			_invalidateDigestIfChildChanged(node, child)
+			return node
+		if replacement is None:
+			return None
+		node = self.getMutable(node)
+		node.child = replacement
+		return node
+
+	def _replaceChildren(self, node: Node, changes: typing.Optional[typing.List[typing.Tuple[int, typing.Optional[Node]]]]) -> typing.Optional[Node]:
+		"""Returns the node with the children replaced, or `None` if it has become empty while emptiness makes no sense for it"""
+		if changes:
+			mustCopy = self.copyOnWrite and node.COPY_ON_WRITE
+			if not mustCopy:
+				self.inPlaceChanges += 1
+			node = _applyChildrenChanges(node, changes, mustCopy)
+		if not len(node) and not node.EMPTY_MAKES_SENSE:
+			return None
+		return node
+
+
+class _TracingPlans(dict):
+	"""The plans of a visitor with tracing enabled: the hooks are wrapped into the ones printing the nodes"""
+
+	__slots__ = ("visitorType", "trace")
+
+	def __init__(self, visitorType: typing.Type[Visitor], trace: TraceT) -> None:
+		super().__init__()
+		self.visitorType = visitorType
+		self.trace = trace
+
+	def __missing__(self, nodeType: typing.Type[Node]) -> typing.Tuple[EnterHookT, LeaveHookT, typing.Optional[type]]:
+		enter, leave, childrenKind = self.visitorType._resolveHooks(nodeType)  # pylint:disable=protected-access
+		trace = self.trace
+		if not callable(trace):
+
+			def trace(node, parent):  # pylint:disable=unused-argument
+				return True
+
+		def tracingEnter(visitor: Visitor, node: Node, parent: typing.Optional[Node]) -> bool:
+			res = enter is None or enter(visitor, node, parent)
+			if trace(node, parent):
+				print(visitor.__class__.__name__, "entering", node, parent)
+				if not res and childrenKind is not None:
+					print("NOT Processing children of ", node)
+			return res
+
+		def tracingLeave(visitor: Visitor, node: Node, parent: typing.Optional[Node]) -> typing.Optional[Node]:
+			res = leave(visitor, node, parent) if leave is not None else node
+			if trace(node, parent) and res is not node:
+				print("Node replaced", node, "->", res)
+			return res
+
+		self[nodeType] = res = (tracingEnter, tracingLeave, childrenKind)
+		return res
@@ -5,13 +5,17 @@ from collections import deque
 from ...utils.escapelib import defaultCharClassEscaper, defaultStringEscaper
 from ..ast import Characters, Comment, Embed, Fragmented, Grammar, Import, Keywords, MultiLineComment, Productions, Spacer, Tokens
 from ..ast.base import Node
-from ..ast.characters import CharClass, CharClassUnion, CharRange, WellKnownChars
+from ..ast.characters import CharClass, CharClassUnion, CharRange, UnicodeProperty, WellKnownChars
 from ..ast.prods import Cap, Prefer
 from ..ast.templates import TemplateInstantiation
+from ..ast.digests import getDigest
+from ..ast.traversal import getChildren, traverse
 from ..ast.tokens import Alt, Iter, Lit, Opt, Seq
-from ..CodeGen import CodeGen, CodeGenContext
+from ..CodeGen import CodeGen, CodeGenContext, passThrough
 from ..defaults import ourProjectLink
-from ..templater import expandTemplates
+from ..ast.passes import Pass, PassManager
+from ..templater import TemplatesExpansion
+from .RulesRenderingCache import rulesRenderingCache
 
 
 class TranspiledResult:
@@ -28,21 +32,43 @@ class TranspiledResult:
 		return self.__class__.__name__ + "(" + repr(self.id) + ", " + repr(self.text) + ")"
 
 
+_notResolved = object()
+
+
+class _ResolutionFailure:  # pylint: disable=too-few-public-methods
+	"""Stored into `ctx.resolved` in place of the result of a child which processing has raised. The exception is reraised when the processor of the parent asks for the result, so the child is not processed again."""
+
+	__slots__ = ("exception",)
+
+	def __init__(self, exception: Exception) -> None:
+		self.exception = exception
+
+
 class GeneratorContext(CodeGenContext):
-	__slots__ = ("stack", "section")
+	__slots__ = ("stack", "section", "resolved")
 
 	def __init__(self, currentProdName: typing.Optional[str]) -> None:
 		self.stack = deque(())
 		self.section = None
+		self.resolved = {}  # `id`s of the children of the node being processed to their results, resolved in advance
 		super().__init__(currentProdName)
 
 
 class Generator(CodeGen):
 	__slots__ = ()
+
+	PRECOMPUTED_CHILDREN_TYPES = frozenset((Seq, Alt, Iter, Opt, Cap, Prefer))  # processors of these nodes resolve all their children within the same context
+	MAX_RECURSION_DEPTH = 64  # nodes nested not deeper are resolved recursively, it is faster
 	META = None
 	charClassEscaper = defaultCharClassEscaper
 	stringEscaper = defaultStringEscaper
 	CONTEXT_CLASS = GeneratorContext
+	CACHE_RULES = True  # rendered rules are memoized in `rulesRenderingCache`. Set to `False` if rendering of a rule depends on anything except the rule, its section, the char classes it references and `getRenderingConfigKey`
+
+	@classmethod
+	def getRenderingConfigKey(cls) -> typing.Tuple[typing.Hashable, ...]:
+		"""The values of the class-level switches affecting rendering of rules. They are a part of the keys of `rulesRenderingCache`, so switching them in a long-lived process (i.e. the daemon) doesn't give the rules rendered before. Redefine it in the backends having such switches."""
+		return ()
 
 	@classmethod
 	def getGreeting(cls, obj: Grammar) -> typing.Iterable[str]:
@@ -95,28 +121,69 @@ class Generator(CodeGen):
 		nm = obj.name
 		expr = obj.child
 		section = ctx.section
+
+		if cls.CACHE_RULES:
+			cacheKey = (cls, type(section), cls.getRenderingConfigKey(), getDigest(obj, grammar))
+			res = rulesRenderingCache.get(cacheKey)
+			if res is not None:
+				return res
+
 		ctx = ctx.spawn()
 		ctx.currentProdName = nm
 		ctx.section = section
-		return cls._Name(nm, cls.resolve(expr, grammar, ctx), ctx)
+		res = cls._Name(nm, cls.resolve(expr, grammar, ctx), ctx)
+
+		if cls.CACHE_RULES:
+			rulesRenderingCache[cacheKey] = res
+		return res
 
 	@classmethod
 	def resolve(cls, obj: typing.Any, grammar: typing.Optional["Grammar"], ctx: typing.Any = None) -> str:
-		if isinstance(obj, str):
-			return obj
-
-		if not isinstance(obj, Node):
-			raise ValueError("This stuff must be a Node", obj)
-
-		clsNm = type(obj).__name__
-		processor = getattr(cls, clsNm)
-		# ToDo: split into a separate methods, one having nothing to do with ctx and another one using it
-		if ctx:
-			ctx.stack.append(obj)
-		res = processor(obj, grammar, ctx)
-		if ctx:
+		"""Processes a node. Deeper than `MAX_RECURSION_DEPTH` the nodes of `PRECOMPUTED_CHILDREN_TYPES` are processed in postorder using an explicit stack, so their processors get the results of their children without recursion, and nesting is not limited by the recursion limit."""
+		nodeType = type(obj)
+		try:
+			processor = cls.DISPATCH[nodeType]
+		except KeyError:
+			processor = cls.getProcessor(nodeType)
+
+		if not ctx or processor is passThrough:
+			return processor(obj, grammar, ctx)
+
+		if nodeType in cls.PRECOMPUTED_CHILDREN_TYPES and (ctx.resolved or len(ctx.stack) >= cls.MAX_RECURSION_DEPTH):  # non-empty `resolved` means we are within `traverse`
+			res = ctx.resolved.pop(id(obj), _notResolved)  # popped, since results can be mutated by the processors of the parents
+			if res is not _notResolved:
+				if res.__class__ is _ResolutionFailure:
+					raise res.exception
+				return res
+
+			savedResolved = ctx.resolved
+			try:
+				return traverse(obj, cls._resolve, grammar, ctx)
+			finally:
+				ctx.resolved = savedResolved
+
+		ctx.stack.append(obj)
+		try:
+			return processor(obj, grammar, ctx)
+		finally:
+			ctx.stack.pop()
+
+	@classmethod
+	def _resolve(cls, obj: typing.Any, grammar: typing.Optional["Grammar"], ctx: typing.Any) -> typing.Generator[Node, typing.Any, typing.Any]:
+		ctx.stack.append(obj)
+		try:
+			childrenResults = {}
+			for child in getChildren(obj):
+				if type(child) in cls.PRECOMPUTED_CHILDREN_TYPES:
+					try:
+						childrenResults[id(child)] = yield child
+					except Exception as ex:  # pylint:disable=broad-except
+						childrenResults[id(child)] = _ResolutionFailure(ex)  # the processor of `obj` may not need the child at all, so it gets the exception only when it asks for the child
+
+			ctx.resolved = childrenResults
+			return cls.DISPATCH[type(obj)](obj, grammar, ctx)
+		finally:
 			ctx.stack.pop()
-		return res 
 
 	@classmethod
 	def Characters(cls, obj: Characters, grammar: Grammar, ctx: typing.Any = None) -> typing.Iterator[str]:
@@ -152,7 +219,7 @@ class Generator(CodeGen):
 
 	@classmethod
 	def wrapLiteralString(cls, s: str) -> str:
-		return '"' + cls.stringEscaper(s) + '"'
+		return '"' + cls.stringEscaper.escapeString(s) + '"'
 
 	@classmethod
 	def wrapLiteralChar(cls, s: str) -> str:
@@ -191,7 +258,7 @@ class Generator(CodeGen):
 
 	@classmethod
 	def Opt(cls, obj: Opt, grammar: Grammar, ctx: typing.Any = None) -> str:
-		return cls.wrapZeroOrOne(cls.resolve(obj.child, None, ctx), grammar, ctx)
+		return cls.wrapZeroOrOne(cls.resolve(obj.child, grammar, ctx), grammar, ctx)
 
 	@classmethod
 	@abstractmethod
@@ -239,6 +306,11 @@ class Generator(CodeGen):
 	def WellKnownChars(cls, obj: WellKnownChars, grammar: Grammar, ctx: typing.Any = None) -> str:
 		raise NotImplementedError
 
+	@classmethod
+	@abstractmethod
+	def UnicodeProperty(cls, obj: UnicodeProperty, grammar: Grammar, ctx: typing.Any = None) -> str:
+		raise NotImplementedError
+
 	@classmethod
 	@abstractmethod
 	def CharClassUnion(cls, obj: CharClassUnion, grammar: Grammar, ctx: typing.Any = None) -> str:
@@ -259,8 +331,20 @@ class Generator(CodeGen):
 		raise NotImplementedError()
 
 	@classmethod
-	def preprocessGrammar(cls, grammar: Grammar, ctx: typing.Any = None) -> None:
-		expandTemplates(grammar, cls, ctx, grammar)
+	def getPreprocessingPasses(cls, grammar: Grammar, ctx: typing.Any = None) -> typing.Iterable[Pass]:
+		"""The passes run over the grammar before transpilation. Redefine it in subclasses to add own ones, the compatible passes are run within a single traversal. The templates not depending on backend are expanded only if the grammar is not a fork of a grammar returned by `preexpandTemplates`."""
+		if grammar.backendTemplatesLeft is None:
+			return (TemplatesExpansion(cls, ctx),)
+		if grammar.backendTemplatesLeft:
+			return (TemplatesExpansion(cls, ctx, True),)
+		return ()
+
+	@classmethod
+	def preprocessGrammar(cls, grammar: Grammar, ctx: typing.Any = None) -> PassManager:
+		"""Runs the preprocessing passes. Returns the `PassManager`, containing the results of the analyses and the stats."""
+		passes = PassManager(grammar)
+		passes.run(cls.getPreprocessingPasses(grammar, ctx))
+		return passes
 
 	@classmethod
 	def TemplateInstantiation(cls, obj: TemplateInstantiation, grammar: Grammar, ctx: typing.Any = None) -> typing.Any:
@@ -0,0 +1,56 @@
+"""Pools of runners, compilers and parsers factories shared within a process"""
+
+import typing
+from threading import RLock
+
+from UniGrammarRuntimeCore.PoolManager import PoolManager
+
+from .Generator import TranspiledResult
+from .Runner import Runner
+
+__all__ = ("LockedPoolManager", "runnersPool", "parsersFactoriesAndCompilersPool", "compileGrammar", "instantiateParser", "compileParser")
+
+
+class LockedPoolManager(PoolManager):
+	"""A `PoolManager` usable from multiple threads (`serve` and `build` use them concurrently). Objects in the pool are shared, so use `getObjectLock` to serialize using them."""
+
+	__slots__ = ("lock", "objectsLocks")
+
+	def __init__(self) -> None:
+		super().__init__()
+		self.lock = RLock()
+		self.objectsLocks = {}
+
+	def __call__(self, cls):
+		with self.lock:
+			return super().__call__(cls)
+
+	def getObjectLock(self, cls) -> RLock:
+		with self.lock:
+			res = self.objectsLocks.get(cls, None)
+			if res is None:
+				self.objectsLocks[cls] = res = RLock()
+			return res
+
+
+runnersPool = LockedPoolManager()
+parsersFactoriesAndCompilersPool = LockedPoolManager()
+
+
+def compileGrammar(runner: Runner, text: str, target: str = "python") -> typing.Any:
+	"""Compiles a transpiled grammar into the internal representation of a backend"""
+	compiler = parsersFactoriesAndCompilersPool(runner.COMPILER)
+	with parsersFactoriesAndCompilersPool.getObjectLock(runner.COMPILER):
+		return compiler.compileStr(text, target)
+
+
+def instantiateParser(runner: Runner, compiled: typing.Any) -> typing.Any:
+	"""Creates a parser from the internal representation of a backend"""
+	parserFactory = parsersFactoriesAndCompilersPool(runner.PARSER)
+	with parsersFactoriesAndCompilersPool.getObjectLock(runner.PARSER):
+		return parserFactory.fromInternal(compiled)
+
+
+def compileParser(runner: Runner, transpilationResult: TranspiledResult) -> typing.Any:
+	"""Compiles a transpiled grammar into a parser using a specific runner (usually associated to a backend)."""
+	return instantiateParser(runner, compileGrammar(runner, transpilationResult.text))
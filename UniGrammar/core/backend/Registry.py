@@ -0,0 +1,162 @@
+"""A lazy registry of backends (`Tool`s). Tools modules import heavy parser generators libraries, so they are imported only when selected. Metadata needed to select the built-in ones is declared statically in `BUILTIN_BACKENDS`."""
+
+import typing
+import warnings
+from importlib import import_module
+
+from UniGrammarRuntime.grammarClasses import GLR, LL, LR, PEG
+
+from .Tool import Tool
+
+__all__ = ("BackendDescriptor", "BackendsRegistry", "backendsRegistry", "ENTRY_POINTS_GROUP", "BUILTIN_BACKENDS")
+
+ENTRY_POINTS_GROUP = "UniGrammar.backends"
+
+
+class BackendDescriptor:  # pylint: disable=too-few-public-methods
+	"""The metadata of a backend needed to select it, available without importing it. `langs` and `grammarClasses` are `None` if they are unknown until the backend is imported."""
+
+	__slots__ = ("spec", "name", "langs", "grammarClasses")
+
+	def __init__(self, spec: str, name: str, langs: typing.Optional[typing.Tuple[str, ...]], grammarClasses: typing.Optional[typing.Tuple[typing.Any, ...]]) -> None:
+		self.spec = spec
+		self.name = name
+		self.langs = langs
+		self.grammarClasses = grammarClasses
+
+	@classmethod
+	def fromTool(cls, spec: str, tool: typing.Type[Tool]) -> "BackendDescriptor":
+		meta = getattr(tool, "META", None)
+		if meta is None:
+			meta = tool.RUNNER.PARSER.META
+		return cls(spec, tool.RUNNER.PARSER.META.product.name, tuple(getattr(meta, "runtimeLib", None) or ()), tuple(getattr(meta, "grammarClasses", None) or ()))
+
+	@property
+	def isComplete(self) -> bool:
+		return self.langs is not None and self.grammarClasses is not None
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + ", ".join(repr(getattr(self, k)) for k in self.__class__.__slots__) + ")"
+
+
+BUILTIN_BACKENDS = tuple(BackendDescriptor(*el) for el in (
+	("UniGrammar.tools.python.parglare:Parglare", "parglare", ("python",), (LR, GLR)),
+	("UniGrammar.tools.multilanguage.antlr4:ANTLR", "antlr4", ("python", "java", "js", "cpp", "cs", "go", "swift"), (LL,)),
+	("UniGrammar.tools.multilanguage.waxeye:Waxeye", "waxeye", ("python", "js", "java", "c", "racket"), (PEG,)),
+	("UniGrammar.tools.python.TatSu:TatSu", "TatSu", ("python",), (PEG,)),
+	("UniGrammar.tools.python.parsimonious:Parsimonious", "parsimonious", ("python",), (PEG,)),
+	("UniGrammar.tools.python.arpeggio:Arpeggio", "arpeggio", ("python",), (PEG,)),
+	("UniGrammar.tools.multilanguage.CoCoR:CoCoR", "CoCo/R", ("python", "java", "cs", "cpp"), (LL,)),
+	("UniGrammar.tools.python.lark:Lark", "lark", ("python",), (LR,)),
+))
+
+
+def loadSpec(spec: str) -> typing.Type[Tool]:
+	"""Imports a tool by a spec in the format of entry points: `module.name:ClassName`"""
+	moduleName, attrName = spec.split(":")
+	return getattr(import_module(moduleName), attrName)
+
+
+def getEntryPointsDescriptors() -> typing.Tuple[BackendDescriptor, ...]:
+	"""Backends registered by other packages. Only their names are known from the entry points (they are the names of the entry points), the rest of the metadata is taken from the backends themselves when needed."""
+	try:
+		from importlib.metadata import entry_points  # pylint:disable=import-outside-toplevel
+	except ImportError:
+		return ()
+
+	eps = entry_points()
+	if hasattr(eps, "select"):
+		eps = eps.select(group=ENTRY_POINTS_GROUP)
+	else:
+		eps = eps.get(ENTRY_POINTS_GROUP, ())
+	return tuple(BackendDescriptor(ep.value, ep.name, None, None) for ep in sorted(eps, key=lambda ep: ep.value))
+
+
+class BackendsRegistry:
+	"""Backends are registered by their descriptors: the built-in ones plus the ones registered by other packages via `UniGrammar.backends` entry points group. A backend is imported only when it is selected, a backend failing to import is skipped with a warning when selected by criteria and raises when selected by name."""
+
+	__slots__ = ("_descriptors", "_byName", "_loaded", "_unavailable", "_corrected")
+
+	def __init__(self) -> None:
+		self._descriptors = None
+		self._byName = None
+		self._loaded = {}
+		self._unavailable = {}
+		self._corrected = {}
+
+	@property
+	def descriptors(self) -> typing.Tuple[BackendDescriptor, ...]:
+		if self._descriptors is None:
+			builtinSpecs = {d.spec for d in BUILTIN_BACKENDS}
+			self._descriptors = BUILTIN_BACKENDS + tuple(d for d in getEntryPointsDescriptors() if d.spec not in builtinSpecs)
+		return self._descriptors
+
+	@property
+	def byName(self) -> typing.Mapping[str, BackendDescriptor]:
+		if self._byName is None:
+			self._byName = {d.name: d for d in self.descriptors}
+		return self._byName
+
+	def load(self, specOrDescriptor: typing.Union[str, BackendDescriptor]) -> typing.Type[Tool]:
+		"""Imports a backend"""
+		spec = specOrDescriptor.spec if isinstance(specOrDescriptor, BackendDescriptor) else specOrDescriptor
+		res = self._loaded.get(spec, None)
+		if res is None:
+			self._loaded[spec] = res = loadSpec(spec)
+			if isinstance(specOrDescriptor, BackendDescriptor) and specOrDescriptor.isComplete:
+				self._checkDescriptor(specOrDescriptor, res)
+		return res
+
+	def _checkDescriptor(self, declared: BackendDescriptor, tool: typing.Type[Tool]) -> None:
+		"""Compares a declared descriptor to the metadata of the imported backend. A stale one is warned about and replaced with the actual metadata, so the backend is not misrouted."""
+		actual = BackendDescriptor.fromTool(declared.spec, tool)
+		mismatches = []
+		if declared.name != actual.name:
+			mismatches.append("name: " + repr(declared.name) + " != " + repr(actual.name))
+		for k in ("langs", "grammarClasses"):
+			if set(getattr(declared, k)) != set(getattr(actual, k)):
+				mismatches.append(k + ": " + repr(getattr(declared, k)) + " != " + repr(getattr(actual, k)))
+		if mismatches:
+			self._corrected[declared.spec] = actual
+			warnings.warn("The declared metadata of backend " + declared.spec + " differs from its actual metadata (" + "; ".join(mismatches) + "), update `BUILTIN_BACKENDS`")
+
+	def tryLoad(self, d: BackendDescriptor) -> typing.Optional[typing.Type[Tool]]:
+		"""Imports a backend, returns `None` and warns once if it cannot be imported for any reason"""
+		if d.spec in self._unavailable:
+			return None
+
+		try:
+			return self.load(d)
+		except Exception as ex:  # pylint:disable=broad-except
+			self._unavailable[d.spec] = ex
+			warnings.warn("Backend " + d.name + " (" + d.spec + ") is unavailable: " + repr(ex))
+			return None
+
+	def describe(self, d: BackendDescriptor) -> typing.Optional[BackendDescriptor]:
+		"""Returns the descriptor with all the metadata. Backends with incomplete descriptors are imported for that, `None` is returned if they cannot be."""
+		if d.isComplete:
+			return self._corrected.get(d.spec, d)
+
+		tool = self.tryLoad(d)
+		if tool is None:
+			return None
+		return BackendDescriptor.fromTool(d.spec, tool)
+
+	def iterDescribed(self) -> typing.Iterator[BackendDescriptor]:
+		for d in self.descriptors:
+			d = self.describe(d)
+			if d is not None:
+				yield d
+
+	def __getitem__(self, name: str) -> typing.Type[Tool]:
+		return self.load(self.byName[name])
+
+	def __iter__(self) -> typing.Iterator[typing.Type[Tool]]:
+		"""Imports all the available backends"""
+		for d in self.descriptors:
+			tool = self.tryLoad(d)
+			if tool is not None:
+				yield tool
+
+
+backendsRegistry = BackendsRegistry()
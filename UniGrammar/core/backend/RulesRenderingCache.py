@@ -0,0 +1,47 @@
+import typing
+from collections import OrderedDict
+from threading import Lock
+
+__all__ = ("RulesRenderingCache", "rulesRenderingCache")
+
+
+class RulesRenderingCache:
+	"""A bounded LRU cache of rendered rules shared by all the generators within a process. Keys are built by `Generator.Name` from the generator class and the digest of a rule."""
+
+	__slots__ = ("maxSize", "storage", "lock", "hits", "misses")
+
+	def __init__(self, maxSize: int = 4096) -> None:
+		self.maxSize = maxSize
+		self.storage = OrderedDict()
+		self.lock = Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key: typing.Hashable) -> typing.Optional[str]:
+		with self.lock:
+			res = self.storage.get(key, None)
+			if res is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+				self.storage.move_to_end(key)
+			return res
+
+	def __setitem__(self, key: typing.Hashable, res: str) -> None:
+		with self.lock:
+			self.storage[key] = res
+			self.storage.move_to_end(key)
+			while len(self.storage) > self.maxSize:
+				self.storage.popitem(last=False)
+
+	def __len__(self) -> int:
+		return len(self.storage)
+
+	def clear(self) -> None:
+		with self.lock:
+			self.storage.clear()
+			self.hits = 0
+			self.misses = 0
+
+
+rulesRenderingCache = RulesRenderingCache()
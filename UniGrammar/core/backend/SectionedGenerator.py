@@ -90,20 +90,20 @@ class SectionedGenerator(UsualGenerator):
 		return SectionedGeneratorContext(None)
 
 	@classmethod
-	def _transpile(cls, grammar: Grammar, ctx: typing.Any = None) -> typing.Iterable[str]:
-		t = list(cls.SECTIONER.START(cls, grammar))
+	def _transpile(cls, grammar: Grammar, ctx: typing.Any = None) -> typing.Iterator[str]:
+		yield from cls.SECTIONER.START(cls, grammar)
 
 		cls.embedGrammar(grammar, ctx)
 
 		for secName in cls.getOrder(grammar):
 			sectionDumper = getattr(cls.SECTIONER, secName)
 			if doesDumperSupportContent(sectionDumper):
-				t.extend(sectionDumper.dumpSection(cls, grammar, ctx.sections[secName], ctx))
+				yield from sectionDumper.dumpSection(cls, grammar, ctx.sections[secName], ctx)
+				del ctx.sections[secName]  # already dumped, no need to keep it in memory
 			else:
-				t.extend(sectionDumper(cls, grammar, ctx))
+				yield from sectionDumper(cls, grammar, ctx)
 
-		t.extend(cls.SECTIONER.END(cls, grammar))
-		return t
+		yield from cls.SECTIONER.END(cls, grammar)
 
 	@classmethod
 	def embedGrammar(cls, obj: Grammar, ctx: typing.Any = None) -> None:
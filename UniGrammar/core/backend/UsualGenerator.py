@@ -1,8 +1,10 @@
 import typing
 
 from ..ast import Grammar, MultiLineComment
-from ..ast.characters import CharClass, CharClassUnion, WellKnownChars
+from ..ast.characters import CharClass, CharClassUnion, UnicodeProperty, WellKnownChars
+from ..ast.passes import Pass
 from ..CharClassProcessor import CharClassMergeProcessor
+from ..CharClassesCanonicalization import CharClassesCanonicalization
 from .Generator import Generator
 
 
@@ -16,6 +18,15 @@ class UsualGenerator(Generator):
 	multiLineCommentEnd = None
 	alternativesSeparator = " | "
 	CHAR_CLASS_PROCESSOR = CharClassMergeProcessor  # : CharClassProcessor
+	CANONICALIZE_CHAR_CLASSES = True  # char classes are rewritten into the cheapest encodings by `CharClassesCanonicalization` before transpilation
+	CANONICALIZE_INTO_NEGATED_CHAR_CLASSES = True  # the negated classes are among the encodings offered, unset it if `CHAR_CLASS_PROCESSOR` renders them incorrectly
+
+	@classmethod
+	def getPreprocessingPasses(cls, grammar: Grammar, ctx: typing.Any = None) -> typing.Iterable[Pass]:
+		passes = tuple(super().getPreprocessingPasses(grammar, ctx))
+		if cls.CANONICALIZE_CHAR_CLASSES:
+			passes += (CharClassesCanonicalization(cls),)
+		return passes
 
 	@classmethod
 	def _wrapAlts(cls, alts: typing.Iterable[str], grammar: Grammar, ctx: typing.Any = None) -> str:
@@ -53,18 +64,13 @@ class UsualGenerator(Generator):
 			return cls.multiLineCommentStart + "\n" + "\n".join(line for line in obj.value) + "\n" + cls.multiLineCommentEnd
 		return super(__class__, cls).MultiLineComment(obj, grammar)  # pylint:disable=undefined-variable
 
-	@classmethod
-	def _escapeCharClassString(cls, s: str) -> typing.Iterable[str]:
-		for c in s:
-			yield cls.charClassEscaper(c)
-
 	@classmethod
 	def escapeCharClassString(cls, s: str) -> str:
-		return "".join(cls._escapeCharClassString(s))
+		return cls.charClassEscaper.escapeString(s)
 
 	@classmethod
 	def CharClass(cls, obj: CharClass, grammar: Grammar, ctx: typing.Any = None) -> str:
-		if len(obj.chars) == 1:
+		if len(obj.chars) == 1 and not obj.negative:
 			return cls.wrapLiteralChar(obj.chars)
 		return cls.CHAR_CLASS_PROCESSOR.wrapCharClass(cls, cls.escapeCharClassString(obj.chars), obj, grammar)
 
@@ -72,6 +78,11 @@ class UsualGenerator(Generator):
 	def WellKnownChars(cls, obj: WellKnownChars, grammar: Grammar, ctx: typing.Any = None) -> str:
 		return cls.resolve(obj.child, grammar)
 
+	@classmethod
+	def UnicodeProperty(cls, obj: UnicodeProperty, grammar: Grammar, ctx: typing.Any = None) -> str:
+		"""Falls back to the ranges of the chars of the property. Redefine it in the backends having a syntax for Unicode properties."""
+		return cls.resolve(CharClassUnion.fromCharSet(obj.getPositiveCharSet(), negative=obj.negative), grammar, ctx)
+
 	@classmethod
 	def CharClassUnion(cls, obj: CharClassUnion, grammar: Grammar, ctx: typing.Any = None) -> str:
 		return cls.CHAR_CLASS_PROCESSOR.union(cls, obj, grammar)
@@ -9,7 +9,10 @@ from ..ast.base import Node, Name, Ref
 from ..ast.prods import Cap
 from ..ast.tokens import Seq, Iter
 from ..ast.templates import TemplateInstantiation
-from ..ast.transformations import walkAST
+from ..ast.digests import getDigest
+from ..ast.passes import PassManager, Transformation
+from ..ast.visitors import Visitor
+from ..backend.RulesRenderingCache import RulesRenderingCache
 
 from ..WrapperGen.primitiveBlocks import ASTSelf
 
@@ -20,6 +23,8 @@ typingTypeMatchingMayBeBroken = typing.Type["str"] != typing.Type[str]
 class _Template(ABC):
 	__slots__ = ("id",)
 
+	DEPENDS_ON_BACKEND = False  # set it if `transformAST` uses `backend`, `ctx` or `grammar`. Otherwise the result must depend only on the params and the name of the parent, then the expansions are shared between backends and memoized
+
 	def __init__(self, iD: str, templatesRegistry: typing.Mapping[str, "_Template"]) -> None:
 		self.id = iD
 		templatesRegistry[iD] = self
@@ -121,14 +126,100 @@ class UserTemplate(_Template):  # pylint:disable=abstract-method
 		self.paramsSchema = paramsSchema
 
 
-def expandTemplates(grammar: Grammar, backend: "Backend", ctx: "GeneratorContext", node: Node) -> None:
-	def cb(node: Node, parent: typing.Optional[Node]) -> bool:
-		if isinstance(node, TemplateInstantiation):
-			mainNode, newG = node.template.transformAST(grammar, backend, ctx, parent, **node.params)
-			expandTemplates(newG, backend, ctx, newG)
-			expandTemplates(grammar, backend, ctx, mainNode)
-			grammar.embed(newG)
-			return False, mainNode, False
-		return True, node, False
+templatesExpansionsCache = RulesRenderingCache(1024)  # expansions of templates not depending on backend, see `TemplatesExpander._getMemoKey`
+
+
+class TemplatesExpander(Visitor):
+	"""Replaces template instantiations with their expansions, embedding the rules they generate into `grammar`. If `dependingOnBackend` is not `None`, only the templates having `DEPENDS_ON_BACKEND` equal to it are expanded, the others are counted in `templatesLeft`."""
+
+	__slots__ = ("grammar", "backend", "ctx", "dependingOnBackend", "templatesLeft")
+
+	def __init__(self, grammar: Grammar, backend: "Backend", ctx: "GeneratorContext", dependingOnBackend: typing.Optional[bool] = None) -> None:
+		super().__init__(copyOnWrite=True)
+		self.grammar = grammar
+		self.backend = backend
+		self.ctx = ctx
+		self.dependingOnBackend = dependingOnBackend
+		self.templatesLeft = 0
+
+	def leaveTemplateInstantiation(self, node: TemplateInstantiation, parent: typing.Optional[Node]) -> Node:
+		template = node.template
+		if self.dependingOnBackend is not None and template.DEPENDS_ON_BACKEND != self.dependingOnBackend:
+			self.templatesLeft += 1
+			return node
+
+		if template.DEPENDS_ON_BACKEND:
+			mainNode, newG, templatesLeft = self._expand(node, parent, None)
+		else:
+			key = self._getMemoKey(node, parent)
+			res = templatesExpansionsCache.get(key) if key is not None else None
+			if res is None:
+				res = self._expand(node, parent, False)
+				if key is not None:
+					templatesExpansionsCache[key] = res
+			mainNode, newG, templatesLeft = res
+
+			if templatesLeft and self.dependingOnBackend is not False:
+				newG = newG.fork()  # the memoized expansion must be kept intact
+				mainNode, newG, templatesLeft = self._expandNested(mainNode, newG, True)
+
+		self.templatesLeft += templatesLeft
+		self.grammar.embed(newG)
+		return mainNode
+
+	@staticmethod
+	def _getMemoKey(node: TemplateInstantiation, parent: typing.Optional[Node]) -> typing.Optional[typing.Hashable]:
+		"""Returns `None` if the expansion cannot be memoized"""
+		if parent is None:
+			return (getDigest(node), None)
+		if isinstance(parent, Name):
+			return (getDigest(node), type(parent), parent.name)
+		return None
+
+	def _expand(self, node: TemplateInstantiation, parent: typing.Optional[Node], dependingOnBackend: typing.Optional[bool]) -> typing.Tuple[Node, Grammar, int]:
+		"""Expands a template, the templates within the expansion are expanded too (the ones allowed by `dependingOnBackend`). The generated rules are not embedded into `grammar`, they are returned with the count of the templates left unexpanded."""
+		mainNode, newG = node.template.transformAST(self.grammar, self.backend, self.ctx, parent, **node.params)
+		return self._expandNested(mainNode, newG, dependingOnBackend)
+
+	def _expandNested(self, mainNode: Node, newG: Grammar, dependingOnBackend: typing.Optional[bool]) -> typing.Tuple[Node, Grammar, int]:
+		nested = TemplatesExpander(newG, self.backend, self.ctx, dependingOnBackend)
+		nested.walk(newG)
+		mainNode = nested.walk(mainNode)
+		return mainNode, newG, nested.templatesLeft
+
+
+def expandTemplates(grammar: Grammar, backend: "Backend", ctx: "GeneratorContext", node: Node) -> Node:
+	"""Replaces template instantiations within `node` with their expansions, embedding the rules they generate into `grammar`. The rules can be shared with other forks of the grammar, so they are never modified in place: use the returned node instead of `node`."""
+	return TemplatesExpander(grammar, backend, ctx).walk(node)
+
+
+def preexpandTemplates(grammar: Grammar) -> Grammar:
+	"""Returns a fork of `grammar` with the templates not depending on backend expanded. Transpile forks of it instead of forks of `grammar`: the expansion is done once for all the backends, `Generator.preprocessGrammar` expands only the templates depending on backend, if any are left."""
+	if grammar.backendTemplatesLeft is not None:
+		return grammar
+
+	res = grammar.fork()
+	expander = TemplatesExpander(res, None, None, False)
+	expander.walk(res)
+	res.backendTemplatesLeft = expander.templatesLeft
+	return res
+
+
+class TemplatesExpansion(Transformation):
+	"""Expands the templates of the whole grammar as a pass, see `expandTemplates`. If `dependingOnBackend` is not `None`, only the templates having `DEPENDS_ON_BACKEND` equal to it are expanded."""
+
+	__slots__ = ("backend", "ctx", "dependingOnBackend")
+
+	def __init__(self, backend: "Backend", ctx: "GeneratorContext", dependingOnBackend: typing.Optional[bool] = None) -> None:
+		self.backend = backend
+		self.ctx = ctx
+		self.dependingOnBackend = dependingOnBackend
+
+	def createVisitor(self, manager: PassManager) -> TemplatesExpander:
+		return TemplatesExpander(manager.grammar, self.backend, self.ctx, self.dependingOnBackend)
 
-	walkAST(node, cb)
+	def finish(self, visitor: TemplatesExpander, manager: PassManager) -> None:
+		if self.dependingOnBackend is False:
+			manager.grammar.backendTemplatesLeft = visitor.templatesLeft
+		else:
+			manager.grammar.backendTemplatesLeft = None if visitor.templatesLeft else 0
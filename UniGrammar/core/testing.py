@@ -16,6 +16,10 @@ class ITestingSpec(ABC):
 	def getTests(self, baseDir: Path):
 		raise NotImplementedError()
 
+	@abstractmethod
+	def getTestFiles(self, baseDir: Path) -> typing.Iterator[Path]:
+		raise NotImplementedError()
+
 
 class TestingSpec(ITestingSpec):  # pylint.disable=abstract-method
 	__slots__ = ("files",)
@@ -41,6 +45,10 @@ class AggregateTestingSpec(ITestingSpec):
 		for subSpec in self.subspecs:
 			yield from subSpec.getTests(baseDir)
 
+	def getTestFiles(self, baseDir: Path) -> typing.Iterator[Path]:
+		for subSpec in self.subspecs:
+			yield from subSpec.getTestFiles(baseDir)
+
 
 class TestingSpecFiles(TestingSpec):
 	__slots__ = ()
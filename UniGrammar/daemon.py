@@ -0,0 +1,170 @@
+"""A daemon keeping UniGrammar warm (imported backends, compilers and parsers pools) between invocations, and a client for it.
+The protocol is trivial: every message is a JSON object prefixed with its length as a 4-byte big-endian unsigned int. A client sends a request `{"op": <name>, "args": {...}}` and gets a response `{"ok": true, "result": ...}` or `{"ok": false, "error": <str>}`."""
+
+import typing
+import os
+import json
+import socket
+import signal
+import struct
+import threading
+import traceback
+from pathlib import Path
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+
+__all__ = ("getDefaultSocketPath", "DaemonClient", "DaemonError", "serve")
+
+lengthStruct = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 1 << 30
+
+
+class DaemonError(Exception):
+	"""An error having happened within the daemon while processing a request"""
+
+
+def getDefaultSocketPath() -> Path:
+	res = os.environ.get("UNIGRAMMAR_DAEMON_SOCKET", None)
+	if res:
+		return Path(res)
+
+	runtimeDir = os.environ.get("XDG_RUNTIME_DIR", None)
+	if runtimeDir:
+		return Path(runtimeDir) / "UniGrammar.sock"
+
+	from .cache import getDefaultCacheDir  # pylint:disable=import-outside-toplevel
+
+	return getDefaultCacheDir() / "daemon.sock"
+
+
+def _recvExactly(stream: typing.BinaryIO, size: int) -> bytes:
+	res = stream.read(size)
+	if len(res) != size:
+		raise EOFError()
+	return res
+
+
+def sendMessage(stream: typing.BinaryIO, msg: typing.Any) -> None:
+	data = json.dumps(msg).encode("utf-8")
+	stream.write(lengthStruct.pack(len(data)))
+	stream.write(data)
+	stream.flush()
+
+
+def recvMessage(stream: typing.BinaryIO) -> typing.Any:
+	size, = lengthStruct.unpack(_recvExactly(stream, lengthStruct.size))
+	if size > MAX_MESSAGE_SIZE:
+		raise ValueError("Message is too large", size)
+	return json.loads(_recvExactly(stream, size).decode("utf-8"))
+
+
+class DaemonClient:
+	"""Connects to a running daemon. Use `DaemonClient.connect` to get `None` instead of an exception if there is no daemon."""
+
+	__slots__ = ("sock", "stream")
+
+	def __init__(self, socketPath: typing.Optional[Path] = None) -> None:
+		if socketPath is None:
+			socketPath = getDefaultSocketPath()
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			self.sock.connect(str(socketPath))
+		except BaseException:
+			self.sock.close()
+			raise
+		self.stream = self.sock.makefile("rwb")
+
+	@classmethod
+	def connect(cls, socketPath: typing.Optional[Path] = None) -> typing.Optional["DaemonClient"]:
+		if socketPath is None:
+			socketPath = getDefaultSocketPath()
+		if not socketPath.is_socket():
+			return None
+		try:
+			return cls(socketPath)
+		except OSError:  # a stale socket file, the daemon is not running
+			return None
+
+	def __call__(self, op: str, **args) -> typing.Any:
+		sendMessage(self.stream, {"op": op, "args": args})
+		res = recvMessage(self.stream)
+		if not res["ok"]:
+			raise DaemonError(res["error"])
+		return res["result"]
+
+	def close(self) -> None:
+		self.stream.close()
+		self.sock.close()
+
+	def __enter__(self) -> "DaemonClient":
+		return self
+
+	def __exit__(self, *args, **kwargs) -> None:
+		self.close()
+
+
+class DaemonRequestHandler(StreamRequestHandler):
+	"""Processes requests of a single client sequentially. Clients are processed concurrently, each one in an own thread."""
+
+	def handle(self) -> None:
+		while True:
+			try:
+				req = recvMessage(self.rfile)
+			except (EOFError, ConnectionError):
+				return
+
+			handler = self.server.handlers.get(req.get("op", None), None)
+			if handler is None:
+				res = {"ok": False, "error": "Unknown op: " + repr(req.get("op", None))}
+			else:
+				try:
+					res = {"ok": True, "result": handler(**req.get("args", {}))}
+				except Exception:  # pylint:disable=broad-except
+					res = {"ok": False, "error": traceback.format_exc()}
+
+			try:
+				sendMessage(self.wfile, res)
+			except (BrokenPipeError, ConnectionError):
+				return
+
+
+class DaemonServer(ThreadingUnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, socketPath: Path, handlers: typing.Mapping[str, typing.Callable]) -> None:
+		self.handlers = dict(handlers)
+		self.handlers.setdefault("ping", lambda: "pong")
+		super().__init__(str(socketPath), DaemonRequestHandler)
+
+
+def _interruptOnSignal(signum, frame) -> None:  # pylint:disable=unused-argument
+	raise KeyboardInterrupt()
+
+
+def serve(handlers: typing.Mapping[str, typing.Callable], socketPath: typing.Optional[Path] = None) -> None:
+	"""Serves requests until interrupted. `handlers` maps names of ops to functions processing them, their arguments are passed as keyword arguments and the results must be serializable into JSON."""
+	if socketPath is None:
+		socketPath = getDefaultSocketPath()
+
+	client = DaemonClient.connect(socketPath)
+	if client is not None:
+		client.close()
+		raise DaemonError("A daemon is already listening on " + str(socketPath))
+	if socketPath.exists():
+		socketPath.unlink()  # a stale one
+	socketPath.parent.mkdir(parents=True, exist_ok=True)
+
+	prevUmask = os.umask(0o177)  # the socket must be accessible only by the owner from the very moment it is bound
+	try:
+		server = DaemonServer(socketPath, handlers)
+	finally:
+		os.umask(prevUmask)
+
+	with server:
+		if threading.current_thread() is threading.main_thread():
+			signal.signal(signal.SIGTERM, _interruptOnSignal)
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			socketPath.unlink()
@@ -11,7 +11,7 @@ from ..core.ast.base import Node, Ref
 from ..core.ast.tokens import Lit, Iter, Seq, Alt, Opt
 from ..core.ast.prods import Cap, Prefer
 from ..core.ast.templates import TemplateInstantiation
-from ..core.ast.characters import CharClass, CharClassUnion, WellKnownChars, _CharClass, CharRange
+from ..core.ast.characters import CharClass, CharClassUnion, UnicodeProperty, WellKnownChars, _CharClass, CharRange
 from ..core.ast import Comment, Grammar, Spacer, MultiLineComment, Embed, Import
 from ..core.backend.Generator import Generator, GeneratorContext, TranspiledResult
 from ..core.CharClassProcessor import CharClassMergeProcessor
@@ -86,7 +86,7 @@ class UniGrammarDictGenerator(Generator):
 
 	@classmethod
 	def Opt(cls, obj: Opt, grammar: Grammar, ctx: typing.Any = None) -> str:
-		return {"opt": cls.resolve(obj.child, None, ctx)}
+		return {"opt": cls.resolve(obj.child, grammar, ctx)}
 
 	@classmethod
 	def Cap(cls, obj: Cap, grammar: typing.Optional[Grammar], ctx: typing.Any = None) -> str:
@@ -124,6 +124,10 @@ class UniGrammarDictGenerator(Generator):
 	def WellKnownChars(cls, obj: WellKnownChars, grammar: Grammar, ctx: typing.Any = None) -> str:
 		return {"well-known": obj.name}
 
+	@classmethod
+	def UnicodeProperty(cls, obj: UnicodeProperty, grammar: Grammar, ctx: typing.Any = None) -> str:
+		return {"unicode-" + obj.kind: obj.value}
+
 	@classmethod
 	def CharClassUnion(cls, obj: CharClassUnion, grammar: Grammar, ctx: typing.Any = None) -> str:
 		return cls.Alt(obj, grammar, ctx=ctx)
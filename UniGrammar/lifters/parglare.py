@@ -89,7 +89,7 @@ def convert():
 			raise ValueError("Unknown parglare AST node", s)
 
 		if res:
-			sect.children.append(res)
+			sect.append(res)
 
 	meta = GrammarMeta("str")
 	gr = Grammar(meta, None, characters=characters, prods=prods)
@@ -16,13 +16,13 @@ from .. import transpile
 from transformerz.serialization.yaml import yamlSerializer
 
 
-wellKnownRegExpRemap = {
-	"CATEGORY_WORD": CharClassUnion(WellKnownChars("ascii_letters"), WellKnownChars("digits"), CharClass("_")),
-	"CATEGORY_DIGIT": WellKnownChars("digits"),
-	"CATEGORY_NOT_WORD": CharClassUnion(WellKnownChars("ascii_letters"), WellKnownChars("digits"), CharClass("_"), negative=True),
-	"CATEGORY_NOT_DIGIT": WellKnownChars("digits", negative=True),
-	"CATEGORY_SPACE": WellKnownChars("whitespace"),
-	"CATEGORY_NOT_SPACE": WellKnownChars("whitespace", negative=True),
+wellKnownRegExpRemap = {  # `str` patterns match Unicode unless `re.ASCII` is used
+	"CATEGORY_WORD": CharClassUnion(UnicodeProperty("category", "L"), UnicodeProperty("category", "N"), CharClass("_")),
+	"CATEGORY_DIGIT": UnicodeProperty("category", "Nd"),
+	"CATEGORY_NOT_WORD": CharClassUnion(UnicodeProperty("category", "L"), UnicodeProperty("category", "N"), CharClass("_"), negative=True),
+	"CATEGORY_NOT_DIGIT": UnicodeProperty("category", "Nd", negative=True),
+	"CATEGORY_SPACE": CharClassUnion(WellKnownChars("whitespace"), UnicodeProperty("category", "Z"), CharClass("\x1c\x1d\x1e\x1f\x85")),
+	"CATEGORY_NOT_SPACE": CharClassUnion(WellKnownChars("whitespace"), UnicodeProperty("category", "Z"), CharClass("\x1c\x1d\x1e\x1f\x85"), negative=True),
 }
 
 anyChar = CharClass("", negative=True)
@@ -199,7 +199,7 @@ class RELifter(Lifter):
 		REVisitor.SUBPATTERN("main", parsedRe, ctx)
 
 		for el in ctx.insertionOrder:
-			getattr(grammar, el.sect.name).children.append(Name(el.key, el.element))
+			getattr(grammar, el.sect.name).append(Name(el.key, el.element))
 
 
 def convertToGrammar(reText: str):
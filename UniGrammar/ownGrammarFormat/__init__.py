@@ -12,11 +12,13 @@ from ..core.ast.base import Node, Ref, Name
 from ..core.ast.prods import Prefer, Cap
 from ..core.ast.tokens import Alt, Opt, Lit, Iter, Seq
 from ..core.ast.characters import CharClassUnion, CharClass, CharRange, WellKnownChars
+from ..core.ast.interning import interning
 from ..core.testing import TestingSpec, TestingSpecLines, TestingSpecModel, testingSpecModelsSelector, AggregateTestingSpec
 
 from .sections import *
 
 from .decodeExtension import detectFormatFromFileExtension
+from .binaryCache import GrammarBinaryCache, isBinaryCacheEnabled
 
 # the code is mostly self-documented here
 # pylint: disable=missing-function-docstring
@@ -32,7 +34,8 @@ def deriveGrammarIdFromFilesNames(fileName: Path) -> str:
 	return s
 
 
-def parseUniGrammarFile(fileName: Path, grammarDefaultId: str = None) -> Grammar:
+def parseUniGrammarFile(fileName: Path, grammarDefaultId: str = None, useCache: typing.Optional[bool] = None) -> Grammar:
+	"""Parses a grammar file. If `useCache` (by default see `isBinaryCacheEnabled`), the parsed grammar is stored into the cache and is loaded from it next time, see `binaryCache`."""
 	underlyingParser, isBinary, isTest = detectFormatFromFileExtension(fileName.suffix)
 	if isBinary:
 		data = fileName.read_bytes()
@@ -43,7 +46,19 @@ def parseUniGrammarFile(fileName: Path, grammarDefaultId: str = None) -> Grammar
 	if not isTest:
 		if grammarDefaultId is None:
 			grammarDefaultId = deriveGrammarIdFromFilesNames(fileName)
-		return parseUniGrammarData(data, underlyingParser, grammarDefaultId)
+
+		if useCache is None:
+			useCache = isBinaryCacheEnabled()
+		if not useCache:
+			return parseUniGrammarData(data, underlyingParser, grammarDefaultId)
+
+		cache = GrammarBinaryCache(fileName)
+		key = cache.computeKey(data, grammarDefaultId)
+		res = cache.get(key)
+		if res is None:
+			res = parseUniGrammarData(data, underlyingParser, grammarDefaultId)
+			cache[key] = res
+		return res
 	else:
 		return parseUniGrammarTestData(data, underlyingParser)
 
@@ -57,13 +72,15 @@ def parseUniGrammarTestData(data: [bytes, str], underlyingParser: typing.Callabl
 
 
 def parseUniGrammar(dic: typing.Mapping[str, typing.Any], grammarDefaultId: str = None) -> Grammar:
+	"""Structurally identical items are parsed into shared nodes, see `interning`"""
 	meta = parseGrammarMeta(dic, grammarDefaultId)
 	tests = parseGrammarTestsingSpecs(dic.get("tests", ()))
-	chars = parseChars.parseSection(dic)
-	keywords = parseKeywords.parseSection(dic)
-	tokens = parseTokens.parseSection(dic)
-	fragmented = parseFragmented.parseSection(dic)
-	prods = parseProductions.parseSection(dic)
+	with interning():
+		chars = parseChars.parseSection(dic)
+		keywords = parseKeywords.parseSection(dic)
+		tokens = parseTokens.parseSection(dic)
+		fragmented = parseFragmented.parseSection(dic)
+		prods = parseProductions.parseSection(dic)
 	return Grammar(meta=meta, tests=tests, chars=chars, keywords=keywords, tokens=tokens, fragmented=fragmented, prods=prods)
 
 
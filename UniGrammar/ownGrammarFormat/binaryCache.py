@@ -0,0 +1,103 @@
+"""Caches of parsed grammars: `grammar.yug` is parsed once, then its AST is loaded from `<cache dir>/grammars/grammar.yug.<hash of its path>.<hash>.bin` in its `CompactGrammar` serialization, skipping the deserialization of the underlying format and the records parsers. A cache file is valid only for the same source, grammar id and version of UniGrammar. The cache dir is the user's one (see `getDefaultCacheDir`), not the dir of the sources, which may be writable by others, and the serialization creates no objects other than the nodes and the metadata, so a crafted cache file can at worst give a wrong grammar."""
+
+import typing
+import os
+from hashlib import sha256
+from pathlib import Path
+
+from ..core.ast import Grammar
+from ..core.ast.compact import CompactGrammar
+from ..utils.tempFiles import getTempPath
+from ..utils.version import getUniGrammarVersion
+
+__all__ = ("GrammarBinaryCache", "isBinaryCacheEnabled")
+
+CACHE_DIR_NAME = "grammars"
+CACHE_FILE_EXTENSION = ".bin"
+KEY_LENGTH = 16  # in hex digits, used in the file name
+PATH_KEY_LENGTH = 16  # in hex digits, distinguishes the files of the same name in different dirs
+MAGIC = b"UGsc"
+
+
+def isBinaryCacheEnabled() -> bool:
+	"""The cache can be disabled by setting `UNIGRAMMAR_BINARY_CACHE` env var to `0`"""
+	return os.environ.get("UNIGRAMMAR_BINARY_CACHE", "1") != "0"
+
+
+class GrammarBinaryCache:
+	"""The cache of a single grammar file. The file itself: `MAGIC`, the length and the bytes of the version of UniGrammar, the key (sha256 of the source and the parameters of parsing) and the serialized `CompactGrammar`."""
+
+	__slots__ = ("sourceFile", "dir", "namePrefix")
+
+	def __init__(self, sourceFile: Path, dir: typing.Optional[Path] = None) -> None:  # pylint:disable=redefined-builtin
+		self.sourceFile = sourceFile
+		if dir is None:
+			from ..cache import getDefaultCacheDir  # pylint:disable=import-outside-toplevel
+
+			dir = getDefaultCacheDir() / CACHE_DIR_NAME
+		self.dir = dir
+		self.namePrefix = sourceFile.name + "." + sha256(os.fsencode(sourceFile.absolute())).hexdigest()[:PATH_KEY_LENGTH] + "."
+
+	@staticmethod
+	def computeKey(source: typing.Union[bytes, str], grammarDefaultId: str) -> bytes:
+		if isinstance(source, str):
+			source = source.encode("utf-8")
+		h = sha256()
+		h.update(getUniGrammarVersion().encode("utf-8"))
+		h.update(b"\0")
+		h.update(grammarDefaultId.encode("utf-8"))
+		h.update(b"\0")
+		h.update(source)
+		return h.digest()
+
+	def getPath(self, key: bytes) -> Path:
+		return self.dir / (self.namePrefix + key.hex()[:KEY_LENGTH] + CACHE_FILE_EXTENSION)
+
+	@staticmethod
+	def _getPrefix(key: bytes) -> bytes:
+		version = getUniGrammarVersion().encode("utf-8")
+		return MAGIC + len(version).to_bytes(2, "little") + version + key
+
+	def get(self, key: bytes) -> typing.Optional[Grammar]:
+		"""Returns the cached grammar or `None` if there is no valid cache for `key`. A cache file failing to be decoded for any reason is a miss, it will be overwritten."""
+		try:
+			data = self.getPath(key).read_bytes()
+		except OSError:
+			return None
+
+		prefix = self._getPrefix(key)
+		if data[:len(prefix)] != prefix:
+			return None
+
+		try:
+			return CompactGrammar.fromBytes(memoryview(data)[len(prefix):]).toGrammar(shareIdentical=True)
+		except Exception:  # pylint:disable=broad-except
+			return None
+
+	def __setitem__(self, key: bytes, grammar: Grammar) -> None:
+		"""Stores the grammar and removes the stale caches of the same file. Failures (i.e. a read-only dir) are ignored, the cache is just an optimization."""
+		path = self.getPath(key)
+		try:
+			data = CompactGrammar.fromGrammar(grammar).toBytes()
+			self.dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+			tmp = getTempPath(path)
+			with tmp.open("wb") as f:
+				f.write(self._getPrefix(key))
+				f.write(data)
+			os.replace(tmp, path)
+		except (OSError, TypeError):  # the last one is raised for the grammars containing objects which cannot be serialized
+			return
+
+		self.removeStale(path)
+
+	def removeStale(self, current: typing.Optional[Path] = None) -> None:
+		"""Removes the caches of the other versions of the file"""
+		prefix = self.namePrefix
+		try:
+			with os.scandir(self.dir) as it:
+				for e in it:
+					n = e.name
+					if n.startswith(prefix) and n.endswith(CACHE_FILE_EXTENSION) and len(n) == len(prefix) + KEY_LENGTH + len(CACHE_FILE_EXTENSION) and (current is None or n != current.name):
+						os.unlink(e.path)
+		except OSError:
+			pass
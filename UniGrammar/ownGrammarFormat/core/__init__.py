@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod
 
 from ...core.ast import Comment, Spacer, Section
 from ...core.ast.base import Node, Ref, Name
+from ...core.ast.interning import internNode
 
 
 class SectionRecordParsingShit(ABC):  # pylint: disable=too-few-public-methods
@@ -93,7 +94,7 @@ class IShittyParser(SectionRecordParsingShit):
 		raise ValueError("You must choose something.", len(results), results)
 
 	def __call__(self, rec: typing.Mapping[str, typing.Any]) -> Node:
-		"""Parses an item in a section"""
+		"""Parses an item in a section. Within an `interning` block the result is interned, the sub-items are parsed by recursive calls, so they are interned before it."""
 		if not isinstance(rec, dict):
 			raise ValueError("A record " + repr(rec) + " must be a dict specifying its properties")
 		results = self.tryParseDistinctiveSet(rec)
@@ -101,11 +102,11 @@ class IShittyParser(SectionRecordParsingShit):
 		if len(results) == 1:
 			res = results[0]
 			if res:
-				return self.wrapResult(rec, res)
+				return internNode(self.wrapResult(rec, res))
 			else:
 				raise ValueError("the result is None")
 		elif len(results) > 1:
-			return self.wrapResults(rec, results)
+			return internNode(self.wrapResults(rec, results))
 		else:
 			raise ValueError("Nothing has parsed from a record in `" + self.__class__.SEC_NAME + "` section", rec)
 
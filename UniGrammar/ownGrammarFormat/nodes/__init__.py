@@ -1,6 +1,6 @@
 __all__ = (
-	"RefParser", "AltCharClassParser", "RangeCharClassParser", "LitCharClassParser", "WellKnownCharClassParser", "AltParser", "LitKeywordsParser", "SeqParser", "OptParser", "TemplateParser",
-	"parseRef", "parseAltCharClass", "parseRangeCharClass", "parseLitCharClass", "parseWellKnownCharClass", "parseAlt", "parseLitKeywords", "parseSeq", "parseOpt", "parseTemplateInstantiation",
+	"RefParser", "AltCharClassParser", "RangeCharClassParser", "LitCharClassParser", "WellKnownCharClassParser", "UnicodeCategoryCharClassParser", "UnicodeScriptCharClassParser", "AltParser", "LitKeywordsParser", "SeqParser", "OptParser", "TemplateParser",
+	"parseRef", "parseAltCharClass", "parseRangeCharClass", "parseLitCharClass", "parseWellKnownCharClass", "parseUnicodeCategoryCharClass", "parseUnicodeScriptCharClass", "parseAlt", "parseLitKeywords", "parseSeq", "parseOpt", "parseTemplateInstantiation",
 )
 
 import typing
@@ -14,7 +14,7 @@ from ...core.ast import Grammar, GrammarMeta, Spacer, Comment, Characters, Keywo
 from ...core.ast.base import Node, Ref, Name
 from ...core.ast.prods import Prefer, Cap
 from ...core.ast.tokens import Alt, Opt, Lit, Iter, Seq
-from ...core.ast.characters import CharClassUnion, CharClass, CharRange, WellKnownChars
+from ...core.ast.characters import CharClassUnion, CharClass, CharRange, UnicodeProperty, WellKnownChars
 from ...core.ast.templates import TemplateInstantiation
 from ...core.templater.defaultTemplates import defaultTemplatesRegistry
 
@@ -95,6 +95,35 @@ class WellKnownCharClassParser(SectionSubRecordSingleParamParser):
 parseWellKnownCharClass = WellKnownCharClassParser()
 
 
+class UnicodePropertyCharClassParser(SectionSubRecordSingleParamParser):
+	__slots__ = ()
+	NODES = (UnicodeProperty,)
+	KIND = None
+
+	def apply(self, param, rec: typing.Mapping[str, typing.Any], recordParser: IShittyParser) -> UnicodeProperty:
+		if not isinstance(param, str) or not param:
+			raise ValueError("`" + self.__class__.ATTR_NAME + "` must be a name of a Unicode " + self.__class__.KIND, param)
+		return self.NODE(self.__class__.KIND, param, False)
+
+
+class UnicodeCategoryCharClassParser(UnicodePropertyCharClassParser):
+	__slots__ = ()
+	ATTR_NAME = "unicode-category"
+	KIND = "category"
+
+
+parseUnicodeCategoryCharClass = UnicodeCategoryCharClassParser()
+
+
+class UnicodeScriptCharClassParser(UnicodePropertyCharClassParser):
+	__slots__ = ()
+	ATTR_NAME = "unicode-script"
+	KIND = "script"
+
+
+parseUnicodeScriptCharClass = UnicodeScriptCharClassParser()
+
+
 class AltParser(SectionSubRecordSingleParamParser):
 	__slots__ = ()
 	NODES = (Alt,)
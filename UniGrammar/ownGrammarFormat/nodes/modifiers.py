@@ -6,7 +6,7 @@ __all__ = (
 import typing
 
 from ...core.ast.base import Node, Ref
-from ...core.ast.characters import CharClass, CharClassUnion, WellKnownChars, _CharClass
+from ...core.ast.characters import CharClass, CharClassUnion, UnicodeProperty, WellKnownChars, _CharClass
 from ...core.ast.prods import Cap, Prefer
 from ...core.ast.tokens import Iter, Seq, Opt
 from ..core import SectionRecordModifier, SectionRecordSingleParamModifier
@@ -14,7 +14,7 @@ from ..core import SectionRecordModifier, SectionRecordSingleParamModifier
 
 class NegativeCharClassModifier(SectionRecordModifier):
 	__slots__ = ()
-	NODES = CharClassUnion, WellKnownChars, CharClass
+	NODES = CharClassUnion, WellKnownChars, CharClass, UnicodeProperty
 
 	def __call__(self, rec: typing.Mapping[str, typing.Any], res: typing.Union[_CharClass, Ref]) -> _CharClass:
 		neg = rec.get("negative", False)
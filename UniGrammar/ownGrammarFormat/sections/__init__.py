@@ -24,6 +24,8 @@ class CharacterClassParser(IShittyParser):
 	DISTINCTIVE_SET = (
 		parseRangeCharClass,
 		parseWellKnownCharClass,
+		parseUnicodeCategoryCharClass,
+		parseUnicodeScriptCharClass,
 		parseLitCharClass,
 		parseAltCharClass,
 		parseRef
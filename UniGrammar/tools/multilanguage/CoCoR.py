@@ -9,7 +9,7 @@ from UniGrammarRuntime.ToolMetadata import Product, ToolMetadata
 from ...core.ast import Comment, Grammar, Spacer
 from ...core.ast.base import Name, Ref
 from ...core.ast.characters import CharClass, CharClassUnion
-from ...core.ast.transformations import getReferenced, rewriteReferences
+from ...core.ast.transformations import rewriteReferences
 from ...core.backend.SectionedGenerator import SectionDumper, SectionedGenerator, SectionedGeneratorContext, Sectioner
 from ...core.CharClassProcessor import CharClassKeepProcessor
 from UniGrammarRuntime.DSLMetadata import DSLMetadata
@@ -78,15 +78,17 @@ class CoCoR(Tool):
 
 				@classmethod
 				def dumpContent(cls, backend: SectionedGenerator, gr: Grammar, ctx: typing.Any = None) -> typing.Iterable[str]:
-					charsReferencedInTokens = getReferenced(gr.tokens)
+					charsReferencedInTokens = gr.dependencies.getReferencedBySection(gr.tokens)
 
-					for charSymbol in gr.chars.children:
+					for i, charSymbol in enumerate(gr.chars.children):
 						if isinstance(charSymbol, Name):
 							tokenName = charSymbol.name
 							if tokenName not in charsReferencedInTokens:
+								charSymbol = charSymbol.shallowCopy()  # rules are shared between forks of the grammar
 								ctx.charClassesToTokensNameRemap[tokenName] = charSymbol.name = charSymbol.name + "C"
+								gr.chars[i] = charSymbol
 
-					rewriteReferences(gr.chars, ctx.charClassesToTokensNameRemap)
+					rewriteReferences(gr.chars, ctx.charClassesToTokensNameRemap, copyOnWrite=True)
 					yield from Sectioner.chars.dumpContent(backend, gr, ctx)
 
 			class keywordsAndCharsTokens(SectionDumper):
@@ -126,7 +128,7 @@ class CoCoR(Tool):
 
 			@classmethod
 			def wrapNegativeOuter(cls, obj: typing.Union[CharClassUnion, CharClass], s) -> str:
-				return "ANY" + cls.charClassNegativeJoiner if obj.negative else "" + s
+				return ("ANY" + cls.charClassNegativeJoiner if obj.negative else "") + s
 
 			@classmethod
 			def wrapNegativeInner(cls, obj: typing.Union[CharClassUnion, CharClass], s) -> str:
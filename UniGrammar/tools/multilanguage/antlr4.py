@@ -7,19 +7,29 @@ from UniGrammarRuntime.backends.multilanguage.antlr4 import ANTLRParser, ANTLRPa
 from UniGrammarRuntime.ParserBundle import InMemoryGrammarResources
 
 from ...core.ast import Grammar, Spacer
-from ...core.ast.characters import CharClass, CharClassUnion
+from ...core.ast.base import Node
+from ...core.ast.characters import CharClass, CharClassUnion, UnicodeProperty
 from ...core.backend.Generator import TranspiledResult
 from ...core.backend.Runner import Runner
 from ...core.backend.SectionedGenerator import SectionedGenerator, Sectioner
+from ...core.CharClassProcessor import CharClassMergeProcessor
 from UniGrammarRuntime.ToolMetadata import Product, ToolMetadata
 from UniGrammarRuntime.DSLMetadata import DSLMetadata
 from ...core.backend.Tool import Tool
+from ...utils.charRanges import ranges2CharClassRangedString
+from ...utils.charSet import CharSet
 from ...utils.escapelib import CompositeEscaper, closingSquareBracketEscaper, commonEscaper, singleTickEscaper
+from ...utils.unicodeProperties import SCRIPT
 
 ourCharClassEscaper = CompositeEscaper(commonEscaper, closingSquareBracketEscaper)
 ourStringEscaper = CompositeEscaper(commonEscaper, singleTickEscaper)
 
 
+def unicodePropertyToANTLR(obj: UnicodeProperty) -> str:
+	"""The escape of a Unicode property, valid only within a char class"""
+	return "\\p{" + ("Script=" if obj.kind == SCRIPT else "") + obj.value + "}"
+
+
 class ANTLR(ANTLRCompileANTLR):
 	__slots__ = ()
 
@@ -43,6 +53,18 @@ class ANTLRGenerator(SectionedGenerator):
 	singleLineCommentStart = "//"
 
 	DEFAULT_ORDER = ("prods", "fragmented", "keywords", "tokens", "chars")
+	CANONICALIZE_INTO_NEGATED_CHAR_CLASSES = False  # `CHAR_CLASS_PROCESSOR` renders them as `[^...]`, ANTLR needs `~[...]`
+
+	class CHAR_CLASS_PROCESSOR(CharClassMergeProcessor):
+		@classmethod
+		def renderNativeMember(cls, backend: typing.Type[SectionedGenerator], obj: Node, grammar: Grammar) -> typing.Optional[str]:
+			if isinstance(obj, UnicodeProperty) and not obj.negative:
+				return unicodePropertyToANTLR(obj)
+			return None
+
+		@classmethod
+		def unionWithNativeMembers(cls, backend: typing.Type[SectionedGenerator], charSet: CharSet, natives: typing.Sequence[str], grammar: Grammar) -> str:
+			return "[" + ranges2CharClassRangedString(charSet, escaper=backend.charClassEscaper) + "".join(natives) + "]"
 
 	class SECTIONER(Sectioner):
 		@classmethod
@@ -53,7 +75,7 @@ class ANTLRGenerator(SectionedGenerator):
 
 	@classmethod
 	def wrapLiteralString(cls, s: str) -> str:
-		return "'" + cls.stringEscaper(s) + "'"
+		return "'" + cls.stringEscaper.escapeString(s) + "'"
 
 	#@classmethod
 	#def wrapLiteralChar(cls, s: str) -> str:
@@ -66,6 +88,10 @@ class ANTLRGenerator(SectionedGenerator):
 			res = "~" + res
 		return res
 
+	@classmethod
+	def UnicodeProperty(cls, obj: UnicodeProperty, grammar: Grammar, ctx: typing.Any = None) -> str:
+		return cls.wrapCharClass(unicodePropertyToANTLR(obj), obj, grammar)
+
 class ANTLRRunner(Runner):
 	__slots__ = ()
 
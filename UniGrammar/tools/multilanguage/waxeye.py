@@ -68,6 +68,7 @@ class WaxeyeGenerator(SectionedGenerator):
 	singleLineCommentStart = "#"
 
 	DEFAULT_ORDER = ("prods", "fragmented", "keywords", "chars", "tokens")
+	CANONICALIZE_INTO_NEGATED_CHAR_CLASSES = False  # `CHAR_CLASS_PROCESSOR` renders them as `![...]`, which is a predicate consuming nothing
 
 	class CHAR_CLASS_PROCESSOR(CharClassMergeProcessor):
 		charClassSetStart = "["
@@ -8,7 +8,7 @@ from UniGrammarRuntimeCore.ICompiler import DummyCompiler
 
 from ...core.ast import Grammar, Productions
 from ...core.ast.base import Name
-from ...core.ast.characters import CharClass, CharClassUnion
+from ...core.ast.characters import CharClass, CharClassUnion, UnicodeProperty
 from ...core.backend.Generator import TranspiledResult
 from ...core.backend.Runner import Runner, NotYetImplementedRunner
 from ...core.backend.SectionedGenerator import SectionedGenerator
@@ -19,6 +19,7 @@ from UniGrammarRuntime.DSLMetadata import DSLMetadata
 from ...core.backend.Tool import Tool
 from ...utils.escapelib import CompositeEscaper, backslashUHexEscaper, closingSquareBracketEscaper, commonCharsEscaper, doubleTickEscaper
 from ...generators.pythonicGenerator import PythonicGenerator
+from ...utils.unicodeProperties import SCRIPT
 
 charClassEscaper = CompositeEscaper(commonCharsEscaper, closingSquareBracketEscaper, backslashUHexEscaper)
 
@@ -60,6 +61,7 @@ class Lark(Tool):
 		assignmentOperator = ": "
 		endStatementOperator = ""
 		singleLineCommentStart = "//"
+		USES_REGEX_MODULE = False  # set it if the grammars are loaded with `Lark(..., regex=True)`: only the `regex` module has the syntax for Unicode properties, `re` raises on `\p{...}`
 
 		DEFAULT_ORDER = ("firstRule", "prods", "fragmented", "keywords", "chars", "tokens")
 
@@ -69,6 +71,10 @@ class Lark(Tool):
 				if gr.meta:
 					yield backend.resolve(Name("start", gr.prods.findFirstRule().name), gr, ctx)
 
+		@classmethod
+		def getRenderingConfigKey(cls) -> typing.Tuple[bool]:
+			return (cls.USES_REGEX_MODULE,)
+
 		@classmethod
 		def wrapLiteralString(cls, s: str) -> str:
 			return '"' + doubleTickEscaper(s) + '"'
@@ -77,6 +83,13 @@ class Lark(Tool):
 		def Ref(cls, obj, grammar: typing.Optional[Grammar], ctx: typing.Any = None) -> str:
 			return transformNameForLark(obj.name)
 
+		@classmethod
+		def UnicodeProperty(cls, obj: UnicodeProperty, grammar: Grammar, ctx: typing.Any = None) -> str:
+			"""The ranges of the chars of the property, unless `USES_REGEX_MODULE` is set"""
+			if not cls.USES_REGEX_MODULE:
+				return super().UnicodeProperty(obj, grammar, ctx)
+			return "/\\" + ("P" if obj.negative else "p") + "{" + ("Script=" if obj.kind == SCRIPT else "") + obj.value + "}/"
+
 		@classmethod
 		def _Name(cls, k: str, v: str, ctx: typing.Any = None) -> str:
 			return super()._Name(transformNameForLark(k), v, ctx)
@@ -7,8 +7,8 @@ from UniGrammarRuntime.ParserBundle import InMemoryGrammarResources
 from UniGrammarRuntimeCore.ICompiler import DummyCompiler
 
 from ...core.ast import Grammar, Productions
-from ...core.ast.base import Name
-from ...core.ast.characters import CharClass, CharClassUnion
+from ...core.ast.base import Name, Node
+from ...core.ast.characters import CharClass, CharClassUnion, UnicodeProperty, _CharClass
 from ...core.backend.Generator import TranspiledResult
 from ...core.backend.Runner import Runner, NotYetImplementedRunner
 from ...core.backend.SectionedGenerator import SectionedGenerator
@@ -17,11 +17,24 @@ from UniGrammarRuntime.grammarClasses import PEG
 from UniGrammarRuntime.ToolMetadata import ToolMetadata, Product
 from UniGrammarRuntime.DSLMetadata import DSLMetadata
 from ...core.backend.Tool import Tool
-from ...utils.escapelib import CompositeEscaper, backslashUHexEscaper, closingSquareBracketEscaper, commonCharsEscaper, doubleTickEscaper
+from ...utils.charRanges import ranges2CharClassRangedString
+from ...utils.charSet import CharSet
+from ...utils.escapelib import CompositeEscaper, backslashUHexEscaper, closingSquareBracketEscaper, commonCharsEscaper, doubleTickEscaper, pythonRegexEscaper
 from ...generators.pythonicGenerator import PythonicGenerator
+from ...utils.unicodeProperties import CATEGORY
 
 charClassEscaper = CompositeEscaper(commonCharsEscaper, closingSquareBracketEscaper, backslashUHexEscaper)
 
+pestCategoriesNames = {
+	"L": "LETTER", "LC": "CASED_LETTER", "Lu": "UPPERCASE_LETTER", "Ll": "LOWERCASE_LETTER", "Lt": "TITLECASE_LETTER", "Lm": "MODIFIER_LETTER", "Lo": "OTHER_LETTER",
+	"M": "MARK", "Mn": "NONSPACING_MARK", "Mc": "SPACING_MARK", "Me": "ENCLOSING_MARK",
+	"N": "NUMBER", "Nd": "DECIMAL_NUMBER", "Nl": "LETTER_NUMBER", "No": "OTHER_NUMBER",
+	"P": "PUNCTUATION", "Pc": "CONNECTOR_PUNCTUATION", "Pd": "DASH_PUNCTUATION", "Ps": "OPEN_PUNCTUATION", "Pe": "CLOSE_PUNCTUATION", "Pi": "INITIAL_PUNCTUATION", "Pf": "FINAL_PUNCTUATION", "Po": "OTHER_PUNCTUATION",
+	"S": "SYMBOL", "Sm": "MATH_SYMBOL", "Sc": "CURRENCY_SYMBOL", "Sk": "MODIFIER_SYMBOL", "So": "OTHER_SYMBOL",
+	"Z": "SEPARATOR", "Zs": "SPACE_SEPARATOR", "Zl": "LINE_SEPARATOR", "Zp": "PARAGRAPH_SEPARATOR",
+	"C": "OTHER", "Cc": "CONTROL", "Cf": "FORMAT", "Cs": "SURROGATE", "Co": "PRIVATE_USE", "Cn": "UNASSIGNED",
+}  # built-in rules of pest matching the general categories, the ones matching scripts are named as the scripts, in upper case
+
 
 class PestRunner(NotYetImplementedRunner):
 	__slots__ = ()
@@ -77,6 +90,21 @@ class Pest(Tool):
 			def encloseCharClass(cls, s: str, obj: _CharClass, grammar: Grammar) -> str:
 				return "/" + cls.charClassSetStart + s.replace("/", r"\/") + cls.charClassSetEnd + "/"
 
+			@classmethod
+			def renderNativeMember(cls, backend: typing.Type[SectionedGenerator], obj: Node, grammar: Grammar) -> typing.Optional[str]:
+				if isinstance(obj, UnicodeProperty):
+					return backend.resolve(obj, grammar)
+				return None
+
+			@classmethod
+			def unionWithNativeMembers(cls, backend: typing.Type[SectionedGenerator], charSet: CharSet, natives: typing.Sequence[str], grammar: Grammar) -> str:
+				alts = list(natives)
+				if charSet:
+					alts.insert(0, cls.wrapCharClass(backend, ranges2CharClassRangedString(charSet, escaper=backend.charClassEscaper), CharClassUnion(), grammar))
+				if len(alts) == 1:
+					return alts[0]
+				return "(" + " | ".join(alts) + ")"
+
 
 		class SECTIONER(SectionedGenerator.SECTIONER):
 			@classmethod
@@ -92,6 +120,18 @@ class Pest(Tool):
 		def Ref(cls, obj, grammar: typing.Optional[Grammar], ctx: typing.Any = None) -> str:
 			return transformNameForPest(obj.name)
 
+		@classmethod
+		def UnicodeProperty(cls, obj: UnicodeProperty, grammar: Grammar, ctx: typing.Any = None) -> str:
+			if obj.kind == CATEGORY:
+				res = pestCategoriesNames.get(obj.value, None)
+				if res is None:
+					return super().UnicodeProperty(obj, grammar, ctx)
+			else:
+				res = obj.value.upper()
+			if obj.negative:
+				res = "(!" + res + " ~ ANY)"
+			return res
+
 		@classmethod
 		def _Name(cls, k: str, v: str, ctx: typing.Any = None) -> str:
 			return super()._Name(transformNameForPest(k), v, ctx)
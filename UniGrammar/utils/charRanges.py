@@ -1,6 +1,6 @@
 import typing
 
-from rangeslicetools import sjoin, ssub_
+from .charSet import CODE_POINTS_COUNT, CharSet
 
 __all__ = ("stringToRanges", "ranges2CharClassRangedString", "multiRSub")
 
@@ -38,32 +38,26 @@ def stringToRanges(s: str) -> typing.Iterable[range]:
 			o = ord(c)
 			r = range(o, o + 1)
 			ranges.append(r)
-	ranges = sjoin(sorted(ranges, key=lambda r: r.start))
-	return ranges
+	return list(CharSet.fromRanges(ranges))
 
 
 def sortRanges(ranges: typing.Iterator[range]) -> typing.List[range]:
 	return sorted(ranges, key=lambda r: r.start)
 
 
-def multiRSub(ranges: typing.Iterable[range], base: range = range(32, 256)) -> typing.Iterator[range]:
-	"""Subtracts multiple ranges taken from the SORTED iterable `ranges` from a `base` range."""
-	ranges = sortRanges(ranges)
-	r1 = base
-	for r in ranges:
-		r2 = tuple(ssub_(r1, r))
-		yield from r2[:-1]
-		r1 = r2[-1]
-	yield r1
+def multiRSub(ranges: typing.Iterable[range], base: range = range(CODE_POINTS_COUNT)) -> typing.Iterator[range]:
+	"""Subtracts multiple ranges taken from the iterable `ranges` from a `base` range, by default from all the code points."""
+	return iter(CharSet.fromRange(base.start, base.stop) - CharSet.fromRanges(ranges))
 
 
 def joinRanges(ranges: typing.Iterator[range]) -> typing.List[range]:
-	return sjoin(sortRanges(ranges))
+	return list(CharSet.fromRanges(ranges))
 
 
-def ranges2CharClassRangedString(ranges: typing.Iterator[range], escaper: ".escapelib.CompositeEscaper") -> str:
-	"""Converts a sequence of integer ranges enclosing allowed characters into a POSITIVE char class specifier as in PCRE []. Inverts `stringToRanges`."""
-	ranges = joinRanges(ranges)
+def ranges2CharClassRangedString(ranges: typing.Union[CharSet, typing.Iterable[range]], escaper: ".escapelib.CompositeEscaper") -> str:
+	"""Converts a `CharSet` (or a sequence of integer ranges) enclosing allowed characters into a POSITIVE char class specifier as in PCRE []. Inverts `stringToRanges`."""
+	if not isinstance(ranges, CharSet):
+		ranges = CharSet.fromRanges(ranges)
 	res = []
 	insertDash = False
 	for r in ranges:
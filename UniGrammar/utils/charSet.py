@@ -0,0 +1,173 @@
+"""Sets of characters covering the whole Unicode, stored as sorted arrays of bounds of ranges, so the operations on them take time linear in the count of the ranges, not of the characters"""
+
+import typing
+from array import array
+from bisect import bisect_right
+
+__all__ = ("CharSet", "CODE_POINTS_COUNT")
+
+CODE_POINTS_COUNT = 0x110000  # code points are `range(CODE_POINTS_COUNT)`
+BOUNDS_TYPE_CODE = "I" if array("I").itemsize >= 4 else "L"
+
+RangeLikeT = typing.Union[range, typing.Tuple[int, int]]
+
+
+def _normalizeBounds(ranges: typing.Iterable[typing.Tuple[int, int]]) -> array:
+	"""`ranges` are `(start, stop)` sorted by `start`, they are clipped to the code points, the overlapping and adjacent ones are merged"""
+	bounds = array(BOUNDS_TYPE_CODE)
+	for start, stop in ranges:
+		if start < 0:
+			start = 0
+		if stop > CODE_POINTS_COUNT:
+			stop = CODE_POINTS_COUNT
+		if start >= stop:
+			continue
+		if bounds and start <= bounds[-1]:
+			if stop > bounds[-1]:
+				bounds[-1] = stop
+		else:
+			bounds.append(start)
+			bounds.append(stop)
+	return bounds
+
+
+def _combine(a: array, b: array, op: typing.Callable[[bool, bool], bool]) -> array:
+	"""Sweeps the bounds of both sets at once. Being in a set toggles at each its bound, so at each bound we know if the point is in each set and `op` tells if it is in the result."""
+	res = array(BOUNDS_TYPE_CODE)
+	i = j = 0
+	la = len(a)
+	lb = len(b)
+	isIn = False
+	while i < la or j < lb:
+		if j == lb or (i < la and a[i] < b[j]):
+			x = a[i]
+		else:
+			x = b[j]
+		if i < la and a[i] == x:
+			i += 1
+		if j < lb and b[j] == x:
+			j += 1
+		isInRes = op(i & 1 == 1, j & 1 == 1)
+		if isInRes != isIn:
+			res.append(x)
+			isIn = isInRes
+	return res
+
+
+class CharSet:
+	"""An immutable set of code points. `bounds` is an array `start0, stop0, start1, stop1, ...` of the ranges (`stop`s are exclusive) sorted, not overlapping and not adjacent, so equal sets have equal bounds. Iterating yields the ranges as `range`s. Complement is taken relative to all the code points."""
+
+	__slots__ = ("bounds",)
+
+	EMPTY = None
+	FULL = None
+
+	def __init__(self, bounds: typing.Optional[array] = None) -> None:
+		"""`bounds` must be normalized, use the `from*` methods to create sets from anything else"""
+		if bounds is None:
+			bounds = array(BOUNDS_TYPE_CODE)
+		self.bounds = bounds
+
+	@classmethod
+	def fromRanges(cls, ranges: typing.Iterable[RangeLikeT]) -> "CharSet":
+		"""`ranges` are `range`s (with step 1) or `(start, stop)` tuples, in any order, they can overlap"""
+		pairs = []
+		for r in ranges:
+			if isinstance(r, range):
+				r = (r.start, r.stop)
+			pairs.append(r)
+		pairs.sort()
+		return cls(_normalizeBounds(pairs))
+
+	@classmethod
+	def fromRange(cls, start: int, stop: int) -> "CharSet":
+		return cls(_normalizeBounds(((start, stop),)))
+
+	@classmethod
+	def fromString(cls, s: str) -> "CharSet":
+		"""The set of the chars of `s`"""
+		return cls(_normalizeBounds((c, c + 1) for c in sorted(set(map(ord, s)))))
+
+	@classmethod
+	def unite(cls, sets: typing.Iterable["CharSet"]) -> "CharSet":
+		"""The union of multiple sets, faster than uniting them pairwise"""
+		pairs = []
+		for s in sets:
+			b = s.bounds
+			pairs.extend(zip(b[::2], b[1::2]))
+		pairs.sort()
+		return cls(_normalizeBounds(pairs))
+
+	def __iter__(self) -> typing.Iterator[range]:
+		b = self.bounds
+		for i in range(0, len(b), 2):
+			yield range(b[i], b[i + 1])
+
+	@property
+	def rangesCount(self) -> int:
+		return len(self.bounds) >> 1
+
+	def __len__(self) -> int:
+		"""The count of code points"""
+		b = self.bounds
+		return sum(b[1::2]) - sum(b[::2])
+
+	def __bool__(self) -> bool:
+		return bool(self.bounds)
+
+	def __contains__(self, c: typing.Union[int, str]) -> bool:
+		if isinstance(c, str):
+			c = ord(c)
+		return bisect_right(self.bounds, c) & 1 == 1
+
+	def __eq__(self, other: typing.Any) -> bool:
+		if not isinstance(other, CharSet):
+			return NotImplemented
+		return self.bounds == other.bounds
+
+	def __hash__(self) -> int:
+		return hash(self.bounds.tobytes())
+
+	def __invert__(self) -> "CharSet":
+		b = self.bounds
+		if b and b[0] == 0:
+			res = b[1:]
+		else:
+			res = array(BOUNDS_TYPE_CODE, (0,))
+			res.extend(b)
+		if res and res[-1] == CODE_POINTS_COUNT:
+			del res[-1]
+		else:
+			res.append(CODE_POINTS_COUNT)
+		return self.__class__(res)
+
+	def __or__(self, other: "CharSet") -> "CharSet":
+		return self.__class__(_combine(self.bounds, other.bounds, lambda a, b: a or b))
+
+	def __and__(self, other: "CharSet") -> "CharSet":
+		return self.__class__(_combine(self.bounds, other.bounds, lambda a, b: a and b))
+
+	def __sub__(self, other: "CharSet") -> "CharSet":
+		return self.__class__(_combine(self.bounds, other.bounds, lambda a, b: a and not b))
+
+	def __xor__(self, other: "CharSet") -> "CharSet":
+		return self.__class__(_combine(self.bounds, other.bounds, lambda a, b: a != b))
+
+	def __le__(self, other: "CharSet") -> bool:
+		return not (self - other)
+
+	def __ge__(self, other: "CharSet") -> bool:
+		return other <= self
+
+	union = __or__
+	intersection = __and__
+	difference = __sub__
+	symmetricDifference = __xor__
+	complement = __invert__
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + ", ".join(hex(r.start) + ".." + hex(r.stop - 1) for r in self) + ")"
+
+
+CharSet.EMPTY = CharSet()
+CharSet.FULL = CharSet.fromRange(0, CODE_POINTS_COUNT)
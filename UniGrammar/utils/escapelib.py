@@ -4,9 +4,11 @@ import string
 from abc import ABC, abstractmethod
 from ast import literal_eval
 
-from rangeslicetools.tree import RangesTree
-
 from .charRanges import multiRSub, stringToRanges
+from .charSet import CharSet
+
+MAX_TABLE_RANGE_LENGTH = 256  # longer ranges of the chars affected by an escaper (i.e. astral ones) are not put into its translation table, they are escaped when they are met first
+MAX_REGEXP_RANGES = 32  # if chars affected by an escaper are in more ranges, the strings are translated without checking if they need it
 
 
 def generateEscapeMapForRegExpCharClass() -> typing.Dict[int, str]:
@@ -56,15 +58,83 @@ stringizers = {
 
 
 class CharEscaper(ABC):
+	__slots__ = ("_compiled",)
+
 	@abstractmethod
 	def __call__(self, c: str) -> str:
+		"""Escapes a single char"""
 		raise NotImplementedError()
 
+	def getAffectedChars(self) -> typing.Optional[CharSet]:
+		"""The chars `__call__` may change, `None` if unknown"""
+		return None
+
+	def escapeString(self, s: str) -> str:
+		"""Escapes a whole string, the result is the same as of escaping it char by char. The escaper is compiled on the first use."""
+		try:
+			compiled = self._compiled
+		except AttributeError:
+			self._compiled = compiled = CompiledEscaper(self)
+		return compiled(s)
+
+
+class EscapingTable(dict):
+	"""A `str.translate` table of an escaper. The chars missing in it are escaped by the escaper when they are met first, so it is complete for any string."""
+
+	__slots__ = ("escaper",)
+
+	def __init__(self, escaper: CharEscaper) -> None:
+		super().__init__()
+		self.escaper = escaper
+
+	def __missing__(self, cc: int) -> str:
+		self[cc] = res = self.escaper(chr(cc))
+		return res
+
+
+class CompiledEscaper:
+	"""An escaper compiled for whole strings: a `str.translate` table, filled in advance with the chars affected by the escaper, except the ones in the ranges longer than `MAX_TABLE_RANGE_LENGTH` (i.e. astral ones). If the affected chars are known and are in a few ranges, a regexp finding the first of them is used to skip the strings needing no escaping and their prefixes."""
+
+	__slots__ = ("table", "affectedRegExp")
+
+	def __init__(self, escaper: CharEscaper) -> None:
+		self.table = EscapingTable(escaper)
+		affected = escaper.getAffectedChars()
+		if affected is None:
+			self.affectedRegExp = False
+			return
 
-def createDefaultCharsToEscape() -> RangesTree:
+		for r in affected:
+			if len(r) <= MAX_TABLE_RANGE_LENGTH:
+				for cc in r:
+					self.table[cc] = escaper(chr(cc))
+
+		if affected.rangesCount <= MAX_REGEXP_RANGES:
+			self.affectedRegExp = re.compile(_genRegExpCharClass(affected)) if affected else None
+		else:
+			self.affectedRegExp = False  # matching against lots of ranges is slower than translation
+
+	def __call__(self, s: str) -> str:
+		r = self.affectedRegExp
+		if r is False:
+			return s.translate(self.table)
+		if r is None:
+			return s
+
+		m = r.search(s)
+		if m is None:
+			return s
+		start = m.start()
+		return s[:start] + s[start:].translate(self.table)
+
+
+def _genRegExpCharClass(ranges: typing.Iterable[range]) -> str:
+	return "[" + "".join("\\U{:08x}-\\U{:08x}".format(r.start, r.stop - 1) for r in ranges) + "]"
+
+
+def createDefaultCharsToEscape() -> CharSet:
 	visible = stringToRanges("".join(sorted(set(string.printable) - set(string.whitespace) | {" "})))
-	invisible = tuple(multiRSub(visible, base=range(0, 0xFF)))
-	return RangesTree.build(invisible)
+	return CharSet.fromRanges(multiRSub(visible, base=range(0, 0xFF)))
 
 
 defaultCharsToEscape = createDefaultCharsToEscape()
@@ -73,11 +143,13 @@ defaultCharsToEscape = createDefaultCharsToEscape()
 class UnicodeEscaper(CharEscaper):
 	__slots__ = ("range", "template", "stringizer")
 
-	def __init__(self, template: str, ranges: RangesTree = None, stringizer: str = "hex") -> None:
+	def __init__(self, template: str, ranges: typing.Optional[typing.Union[CharSet, typing.Iterable[range]]] = None, stringizer: str = "hex") -> None:
 		self.template = template
 
 		if ranges is None:
 			ranges = defaultCharsToEscape
+		elif not isinstance(ranges, CharSet):
+			ranges = CharSet.fromRanges(ranges)
 
 		self.range = ranges
 		if isinstance(stringizer, str):
@@ -86,11 +158,13 @@ class UnicodeEscaper(CharEscaper):
 
 	def __call__(self, c: str) -> str:
 		cc = ord(c)
-		res = tuple(self.range[cc])
-		if res:
+		if cc in self.range:
 			return self.template.format(self.stringizer(cc))
 		return c
 
+	def getAffectedChars(self) -> CharSet:
+		return self.range
+
 
 class CompositeEscaper(CharEscaper):
 	__slots__ = ("children",)
@@ -105,6 +179,15 @@ class CompositeEscaper(CharEscaper):
 				return c
 		return c
 
+	def getAffectedChars(self) -> typing.Optional[CharSet]:
+		res = []
+		for e in self.children:
+			affected = e.getAffectedChars()
+			if affected is None:
+				return None
+			res.append(affected)
+		return CharSet.unite(res)
+
 
 def genRemappingEscapeCharsLiterally(s: str) -> typing.Dict[int, str]:
 	return {ord(c): ("\\" + c) for c in s}
@@ -121,6 +204,9 @@ class RemappingEscaper(CharEscaper):
 	def __call__(self, c: str) -> str:
 		return c.translate(self.mapping)
 
+	def getAffectedChars(self) -> CharSet:
+		return CharSet.fromRanges(range(cc, cc + 1) for cc in self.mapping)
+
 
 pythonRegExpEscaper = RemappingEscaper(ourSpecialCharsMap)
 
@@ -149,6 +235,12 @@ class PythonREEscaper(CharEscaper):
 	def __call__(self, c: str) -> str:
 		return re.escape(c)
 
+	def getAffectedChars(self) -> typing.Optional[CharSet]:
+		specialChars = getattr(re, "_special_chars_map", None)  # pylint:disable=protected-access
+		if specialChars is None:
+			return None
+		return CharSet.fromRanges(range(cc, cc + 1) for cc in specialChars)
+
 
 pythonReprEscaper = PythonReprEscaper()
 pythonREEscaper = PythonREEscaper()
@@ -0,0 +1,123 @@
+"""Watching files for modifications. Uses inotify if `inotify_simple` is available, otherwise polls mtimes."""
+
+import typing
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+try:
+	from inotify_simple import INotify, flags
+except ImportError:
+	INotify = None
+
+__all__ = ("FileWatcher", "InotifyFileWatcher", "PollingFileWatcher", "createFileWatcher")
+
+
+class FileWatcher(ABC):
+	"""Tracks a set of files. `wait` blocks until some of them are modified and returns them."""
+
+	__slots__ = ("files",)
+
+	def __init__(self) -> None:
+		self.files = set()
+
+	def watch(self, files: typing.Iterable[Path]) -> None:
+		"""Replaces the set of watched files"""
+		self.files = {Path(f).absolute() for f in files}
+
+	@abstractmethod
+	def wait(self, timeout: typing.Optional[float] = None) -> typing.Set[Path]:
+		raise NotImplementedError
+
+	def close(self) -> None:
+		pass
+
+	def __enter__(self) -> "FileWatcher":
+		return self
+
+	def __exit__(self, *args, **kwargs) -> None:
+		self.close()
+
+
+class PollingFileWatcher(FileWatcher):
+	__slots__ = ("interval", "stamps")
+
+	def __init__(self, interval: float = 0.2) -> None:
+		super().__init__()
+		self.interval = interval
+		self.stamps = {}
+
+	@staticmethod
+	def getStamp(f: Path) -> typing.Optional[typing.Tuple[int, int]]:
+		try:
+			st = f.stat()
+		except FileNotFoundError:
+			return None
+		return (st.st_mtime_ns, st.st_size)
+
+	def watch(self, files: typing.Iterable[Path]) -> None:
+		super().watch(files)
+		self.stamps = {f: self.stamps[f] if f in self.stamps else self.getStamp(f) for f in self.files}
+
+	def wait(self, timeout: typing.Optional[float] = None) -> typing.Set[Path]:
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			res = set()
+			for f, oldStamp in self.stamps.items():
+				newStamp = self.getStamp(f)
+				if newStamp != oldStamp:
+					self.stamps[f] = newStamp
+					res.add(f)
+
+			if res or (deadline is not None and time.monotonic() >= deadline):
+				return res
+			time.sleep(self.interval)
+
+
+class InotifyFileWatcher(FileWatcher):
+	"""Watches the dirs containing the files, since editors often save files by replacing them"""
+
+	__slots__ = ("inotify", "dirsWatches", "debounce")
+
+	MASK = (flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE) if INotify is not None else None
+
+	def __init__(self, debounce: float = 0.05) -> None:
+		super().__init__()
+		self.inotify = INotify()
+		self.dirsWatches = {}
+		self.debounce = debounce
+
+	def watch(self, files: typing.Iterable[Path]) -> None:
+		super().watch(files)
+		dirs = {f.parent for f in self.files}
+		for wd, d in tuple(self.dirsWatches.items()):
+			if d not in dirs:
+				self.inotify.rm_watch(wd)
+				del self.dirsWatches[wd]
+
+		watchedDirs = set(self.dirsWatches.values())
+		for d in dirs - watchedDirs:
+			self.dirsWatches[self.inotify.add_watch(d, self.MASK)] = d
+
+	def wait(self, timeout: typing.Optional[float] = None) -> typing.Set[Path]:
+		events = self.inotify.read(timeout=None if timeout is None else int(timeout * 1000), read_delay=int(self.debounce * 1000))
+		res = set()
+		for e in events:
+			d = self.dirsWatches.get(e.wd, None)
+			if d is not None:
+				f = d / e.name
+				if f in self.files:
+					res.add(f)
+		return res
+
+	def close(self) -> None:
+		self.inotify.close()
+
+
+def createFileWatcher() -> FileWatcher:
+	if INotify is not None:
+		try:
+			return InotifyFileWatcher()
+		except OSError:
+			pass
+	return PollingFileWatcher()
@@ -0,0 +1,140 @@
+"""A graph of tasks with dependencies and a work-stealing executor of it"""
+
+import typing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from threading import Condition, Thread
+
+__all__ = ("Task", "TaskStatus", "WorkStealingExecutor")
+
+
+class TaskStatus:  # pylint: disable=too-few-public-methods
+	pending = "pending"
+	done = "done"
+	upToDate = "up-to-date"
+	failed = "failed"
+	cancelled = "cancelled"  # a dependency has failed
+
+
+class Task:
+	"""A node of a tasks graph. `func` is called with `Task`s results of `deps` (in the same order) as arguments."""
+
+	__slots__ = ("name", "kind", "func", "deps", "dependents", "key", "result", "status", "duration", "error", "_pendingDepsCount")
+
+	def __init__(self, name: str, kind: str, func: typing.Callable, deps: typing.Iterable["Task"] = (), key: typing.Optional[str] = None) -> None:
+		self.name = name
+		self.kind = kind
+		self.func = func
+		self.deps = tuple(deps)
+		self.dependents = []
+		for d in self.deps:
+			d.dependents.append(self)
+		self.key = key
+		self.result = None
+		self.status = TaskStatus.pending
+		self.duration = None
+		self.error = None
+		self._pendingDepsCount = 0
+
+	def __repr__(self):
+		return self.__class__.__name__ + "(" + repr(self.name) + ", " + repr(self.status) + ")"
+
+
+class WorkStealingExecutor:
+	"""Executes a graph of tasks in `jobs` threads. Each thread has an own deque of ready tasks: it takes the most recently readied ones from its own deque and steals the oldest ones from the others. The tasks becoming ready after a task is done are put into the deque of the thread having done it, so they run where their inputs are hot. CPU-bound pure computations can be offloaded to a processes pool via `runInProcess`, since threads are constrained by GIL."""
+
+	__slots__ = ("jobs", "processPool", "deques", "cond", "remaining", "fatal")
+
+	def __init__(self, jobs: int, processPool: typing.Optional[ProcessPoolExecutor] = None) -> None:
+		self.jobs = jobs
+		self.processPool = processPool
+		self.deques = [deque() for i in range(jobs)]
+		self.cond = Condition()
+		self.remaining = 0
+		self.fatal = None  # a `BaseException` which is not an `Exception` raised by a task, the execution is stopped and it is reraised
+
+	def runInProcess(self, func: typing.Callable, *args) -> typing.Any:
+		"""Runs a picklable function in the processes pool, if there is one, blocking the calling thread"""
+		if self.processPool is None:
+			return func(*args)
+		return self.processPool.submit(func, *args).result()
+
+	def _takeTask(self, workerId: int) -> typing.Optional[Task]:
+		own = self.deques[workerId]
+		if own:
+			return own.pop()
+		for i in range(1, self.jobs):
+			victim = self.deques[(workerId + i) % self.jobs]
+			if victim:
+				return victim.popleft()
+		return None
+
+	def _cancelDependents(self, task: Task) -> None:
+		stack = list(task.dependents)
+		while stack:
+			t = stack.pop()
+			if t.status == TaskStatus.pending:
+				t.status = TaskStatus.cancelled
+				self.remaining -= 1
+				stack.extend(t.dependents)
+
+	def _worker(self, workerId: int) -> None:
+		while True:
+			with self.cond:
+				task = None
+				while self.fatal is None:
+					task = self._takeTask(workerId)
+					if task is not None or not self.remaining:
+						break
+					self.cond.wait()
+				if task is None:
+					return
+
+			startTime = time.perf_counter()
+			status = TaskStatus.failed
+			try:
+				task.result = task.func(*(d.result for d in task.deps))
+				status = TaskStatus.done
+			except Exception as ex:  # pylint: disable=broad-except
+				task.error = ex
+			except BaseException as ex:  # pylint: disable=broad-except
+				task.error = ex
+				with self.cond:
+					self.fatal = ex
+			finally:
+				task.duration = time.perf_counter() - startTime
+				with self.cond:
+					task.status = status
+					self.remaining -= 1
+					if status == TaskStatus.failed:
+						self._cancelDependents(task)
+					else:
+						for t in task.dependents:
+							if t.status == TaskStatus.pending:
+								t._pendingDepsCount -= 1
+								if not t._pendingDepsCount:
+									self.deques[workerId].append(t)
+					self.cond.notify_all()
+
+	def __call__(self, tasks: typing.Iterable[Task]) -> None:
+		"""Executes the pending tasks. Tasks having other statuses are considered already finished."""
+		tasks = [t for t in tasks if t.status == TaskStatus.pending]
+		self.remaining = len(tasks)
+		self.fatal = None
+
+		for i, t in enumerate(tasks):
+			t._pendingDepsCount = sum(1 for d in t.deps if d.status == TaskStatus.pending)
+			if any(d.status in (TaskStatus.failed, TaskStatus.cancelled) for d in t.deps):
+				raise ValueError("A task depending on a failed one is pending", t)
+			if not t._pendingDepsCount:
+				self.deques[i % self.jobs].append(t)
+
+		threads = [Thread(target=self._worker, args=(i,), name="UniGrammar worker " + str(i), daemon=True) for i in range(self.jobs)]
+		for th in threads:
+			th.start()
+		for th in threads:
+			th.join()
+
+		if self.fatal is not None:
+			raise self.fatal
@@ -0,0 +1,12 @@
+"""Names of the temporary files used to replace files atomically: the new content is written into a temporary file in the same dir, which then replaces the file via `os.replace`"""
+
+import os
+import threading
+from pathlib import Path
+
+__all__ = ("getTempPath",)
+
+
+def getTempPath(path: Path) -> Path:
+	"""The name is unique for the thread, not only for the process: the daemon serves concurrent requests writing the same files in threads of one process"""
+	return path.parent / (path.name + "." + str(os.getpid()) + "-" + str(threading.get_ident()) + ".tmp")
@@ -0,0 +1,231 @@
+"""Sets of chars having a value of a Unicode property: a general category (from `unicodedata`) or a script (from the optional `regex` module, `unicodedata` has no scripts). Computing a set takes scanning all the code points, so the sets are computed once per version of the Unicode database and cached in memory and on disk, in compact binary tables."""
+
+import typing
+import os
+import struct
+import sys
+import unicodedata
+from array import array
+from itertools import groupby
+from pathlib import Path
+from threading import Lock
+
+from .charSet import BOUNDS_TYPE_CODE, CODE_POINTS_COUNT, CharSet
+from .tempFiles import getTempPath
+
+try:
+	import regex
+except ImportError:
+	regex = None
+
+__all__ = ("getUnicodePropertyCharSet", "getUnicodePropertyTable", "validateUnicodeProperty", "UnicodePropertyTable", "CATEGORY", "SCRIPT", "UNICODE_PROPERTIES_KINDS", "CATEGORIES")
+
+CATEGORY = "category"
+SCRIPT = "script"
+UNICODE_PROPERTIES_KINDS = (CATEGORY, SCRIPT)
+
+CATEGORIES = frozenset((
+	"Lu", "Ll", "Lt", "Lm", "Lo",
+	"Mn", "Mc", "Me",
+	"Nd", "Nl", "No",
+	"Pc", "Pd", "Ps", "Pe", "Pi", "Pf", "Po",
+	"Sm", "Sc", "Sk", "So",
+	"Zs", "Zl", "Zp",
+	"Cc", "Cf", "Cs", "Co", "Cn",
+))  # the major categories (`L`, `M`, ...) and `LC` (cased letters) are unions of them
+CASED_LETTERS_CATEGORIES = ("Lu", "Ll", "Lt")
+
+TABLE_MAGIC = b"UGup"
+TABLE_FILE_EXTENSION = ".bin"
+_entryHeader = struct.Struct("<BI")  # length of the value, count of bounds
+
+
+class UnicodePropertyTable:
+	"""The sets of chars for the values of a Unicode property. They are loaded from the file in the cache dir (`TABLE_MAGIC`, the length and the bytes of `versionKey`, then for each value its length, the count of the bounds of its set, the value and the bounds as little-endian `uint32`s) and computed if missing there."""
+
+	__slots__ = ("versionKey", "sets", "lock", "_loaded")
+
+	KIND = None
+
+	def __init__(self, versionKey: str) -> None:
+		self.versionKey = versionKey
+		self.sets = {}
+		self.lock = Lock()
+		self._loaded = False
+
+	@property
+	def path(self) -> Path:
+		from ..cache import getDefaultCacheDir  # pylint:disable=import-outside-toplevel
+
+		return getDefaultCacheDir() / "unicode" / (self.__class__.KIND + "-" + self.versionKey + TABLE_FILE_EXTENSION)
+
+	def __getitem__(self, value: str) -> CharSet:
+		try:
+			return self.sets[value]
+		except KeyError:
+			pass
+
+		with self.lock:
+			if not self._loaded:
+				self.load()
+				self._loaded = True
+
+			res = self.sets.get(value, None)
+			if res is None:
+				computed = self.compute(value)
+				self.sets.update(computed)
+				self.save()
+				res = computed[value]
+			return res
+
+	def compute(self, value: str) -> typing.Mapping[str, CharSet]:
+		"""Computes the set for `value`, may compute the sets for the other values at once. Raises `ValueError` for unknown values."""
+		raise NotImplementedError
+
+	def load(self) -> None:
+		try:
+			data = self.path.read_bytes()
+		except OSError:
+			return
+
+		prefix = self._getPrefix()
+		if not data.startswith(prefix):
+			return
+
+		offset = len(prefix)
+		sets = {}
+		try:
+			while offset < len(data):
+				valueLen, boundsCount = _entryHeader.unpack_from(data, offset)
+				offset += _entryHeader.size
+				value = data[offset: offset + valueLen].decode("ascii")
+				offset += valueLen
+				bounds = array("I")
+				bounds.frombytes(data[offset: offset + boundsCount * bounds.itemsize])
+				offset += boundsCount * bounds.itemsize
+				if sys.byteorder != "little":
+					bounds.byteswap()
+				if BOUNDS_TYPE_CODE != "I":
+					bounds = array(BOUNDS_TYPE_CODE, bounds)
+				sets[value] = CharSet(bounds)
+		except (struct.error, ValueError):  # truncated or corrupted, will be rewritten
+			return
+		self.sets.update(sets)
+
+	def save(self) -> None:
+		parts = [self._getPrefix()]
+		for value, charSet in sorted(self.sets.items()):
+			bounds = array("I", charSet.bounds)
+			if sys.byteorder != "little":
+				bounds.byteswap()
+			valueBytes = value.encode("ascii")
+			parts.append(_entryHeader.pack(len(valueBytes), len(bounds)))
+			parts.append(valueBytes)
+			parts.append(bounds.tobytes())
+
+		p = self.path
+		try:
+			p.parent.mkdir(parents=True, exist_ok=True)
+			tmp = getTempPath(p)
+			tmp.write_bytes(b"".join(parts))
+			os.replace(tmp, p)
+		except OSError:  # the cache is an optimization, not being able to write it is not an error
+			pass
+
+	def _getPrefix(self) -> bytes:
+		versionKey = self.versionKey.encode("ascii")
+		return TABLE_MAGIC + bytes((len(versionKey),)) + versionKey
+
+
+def _getCategoryMembers(value: str) -> typing.Tuple[str, ...]:
+	"""The categories making up a major category or `LC`"""
+	if value == "LC":
+		return CASED_LETTERS_CATEGORIES
+	members = tuple(c for c in CATEGORIES if c[0] == value)
+	if not members:
+		raise ValueError("Unknown Unicode general category", value)
+	return members
+
+
+class UnicodeCategoriesTable(UnicodePropertyTable):
+	"""General categories, from `unicodedata`. All of them are computed at once, in a single scan."""
+
+	__slots__ = ()
+
+	KIND = CATEGORY
+
+	def __init__(self) -> None:
+		super().__init__(unicodedata.unidata_version)
+
+	def __getitem__(self, value: str) -> CharSet:
+		if value in CATEGORIES:
+			return super().__getitem__(value)
+		getMember = super().__getitem__
+		return CharSet.unite(getMember(c) for c in _getCategoryMembers(value))
+
+	def compute(self, value: str) -> typing.Mapping[str, CharSet]:
+		ranges = {c: [] for c in CATEGORIES}
+		start = 0
+		for category, group in groupby(map(unicodedata.category, map(chr, range(CODE_POINTS_COUNT)))):
+			stop = start + sum(1 for _ in group)
+			ranges[category].append((start, stop))
+			start = stop
+		return {c: CharSet.fromRanges(r) for c, r in ranges.items()}
+
+
+class UnicodeScriptsTable(UnicodePropertyTable):
+	"""Scripts, from the `regex` module, computed one by one, when needed"""
+
+	__slots__ = ()
+
+	KIND = SCRIPT
+
+	def __init__(self) -> None:
+		super().__init__("regex-" + (regex.__version__ if regex is not None else "none"))
+
+	def compute(self, value: str) -> typing.Mapping[str, CharSet]:
+		if regex is None:
+			raise ImportError("Install `regex` to get the chars of Unicode scripts, `unicodedata` has no scripts")
+		try:
+			pattern = regex.compile(r"\p{Script=" + value + "}+")
+		except regex.error as ex:
+			raise ValueError("Unknown Unicode script", value) from ex
+		allChars = "".join(map(chr, range(CODE_POINTS_COUNT)))
+		return {value: CharSet.fromRanges(m.span() for m in pattern.finditer(allChars))}
+
+
+def validateUnicodeProperty(kind: str, value: str) -> None:
+	"""Raises `ValueError` if `value` is not a value of the property `kind`. Scripts are checked only if `regex` is installed."""
+	if kind == CATEGORY:
+		if value not in CATEGORIES:
+			_getCategoryMembers(value)
+	elif kind == SCRIPT:
+		if regex is not None:
+			try:
+				regex.compile(r"\p{Script=" + value + "}")
+			except regex.error as ex:
+				raise ValueError("Unknown Unicode script", value) from ex
+	else:
+		raise ValueError("Unknown kind of Unicode property", kind)
+
+
+_tablesTypes = {t.KIND: t for t in (UnicodeCategoriesTable, UnicodeScriptsTable)}
+_tables = {}
+
+
+def getUnicodePropertyTable(kind: str) -> UnicodePropertyTable:
+	try:
+		return _tables[kind]
+	except KeyError:
+		pass
+
+	try:
+		tableType = _tablesTypes[kind]
+	except KeyError:
+		raise ValueError("Unknown kind of Unicode property", kind) from None
+	return _tables.setdefault(kind, tableType())
+
+
+def getUnicodePropertyCharSet(kind: str, value: str) -> CharSet:
+	"""Returns the chars having `value` of the property `kind` (`CATEGORY` or `SCRIPT`)"""
+	return getUnicodePropertyTable(kind)[value]
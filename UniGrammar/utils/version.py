@@ -0,0 +1,32 @@
+"""The version of UniGrammar, used to invalidate the caches produced by other versions of it"""
+
+from hashlib import sha256
+from pathlib import Path
+
+__all__ = ("getUniGrammarVersion",)
+
+_version = None
+
+
+def getUniGrammarVersion() -> str:
+	"""Returns the version of UniGrammar. If it is not installed, a fingerprint of its source files is used instead, so modifying them invalidates the cache."""
+	global _version  # pylint:disable=global-statement
+	if _version is None:
+		try:
+			from importlib.metadata import version, PackageNotFoundError  # pylint:disable=import-outside-toplevel
+		except ImportError:
+			version = None
+
+		if version is not None:
+			try:
+				_version = version("UniGrammar")
+			except PackageNotFoundError:
+				pass
+
+		if _version is None:
+			h = sha256()
+			for f in sorted(Path(__file__).parent.parent.glob("**/*.py")):
+				st = f.stat()
+				h.update((str(f) + "\0" + str(st.st_mtime_ns) + "\0" + str(st.st_size) + "\n").encode("utf-8"))
+			_version = "0+src." + h.hexdigest()[:16]
+	return _version
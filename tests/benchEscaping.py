@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compares escaping whole strings with the compiled escapers (`CharEscaper.escapeString`) against escaping them char by char, for the escapers of all the backends which can be imported. Fails if the results differ."""
+
+import sys
+import typing
+from importlib import import_module
+from pathlib import Path
+from timeit import timeit
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from UniGrammar import tools  # noqa: E402
+from UniGrammar.utils import escapelib  # noqa: E402
+from UniGrammar.utils.escapelib import CharEscaper  # noqa: E402
+
+SAMPLES = {
+	"ascii": "identifier_with_some_words_and_digits_0123456789 " * 8,
+	"special": "\"quoted\" 'single' [brackets] \\backslashes\\ \t\r\n\0 ^-$." * 8,
+	"bmp": "Съешь же ещё этих мягких французских булок — ∀x∈ℝ " * 8,
+	"astral": "emoji 😀🙃 math 𝔘𝔫𝔦 private \U000F0000\U0010FFFD " * 8,
+}
+
+
+def iterEscapers() -> typing.Iterator[typing.Tuple[str, CharEscaper]]:
+	"""Yields the escapers defined in `escapelib` and in the modules of the backends, and the ones set in their generators"""
+	modules = [escapelib]
+	toolsDir = Path(tools.__file__).parent
+	for f in sorted(toolsDir.glob("*/*.py")):  # the subpackages are namespace ones, `pkgutil` doesn't see them
+		name = tools.__name__ + "." + ".".join(f.relative_to(toolsDir).with_suffix("").parts)
+		try:
+			modules.append(import_module(name))
+		except Exception as ex:  # pylint:disable=broad-except
+			print("Skipping", name, "(" + repr(ex) + ")", file=sys.stderr)
+
+	seen = set()
+	for mod in modules:
+		for k, v in vars(mod).items():
+			candidates = [(mod.__name__ + "." + k, v)]
+			generator = getattr(v, "GENERATOR", None)
+			if isinstance(v, type) and generator is not None:
+				for attr in ("charClassEscaper", "stringEscaper"):
+					candidates.append((mod.__name__ + "." + k + ".GENERATOR." + attr, getattr(generator, attr, None)))
+
+			for name, e in candidates:
+				if isinstance(e, CharEscaper) and id(e) not in seen:
+					seen.add(id(e))
+					yield name, e
+
+
+def escapeCharByChar(e: CharEscaper, s: str) -> str:
+	return "".join(e(c) for c in s)
+
+
+def main() -> int:
+	number = 200
+	failed = False
+	print("escaper", *(k + " per-char/compiled, us" for k in SAMPLES), sep="\t")
+	for name, e in iterEscapers():
+		compileTime = timeit(lambda e=e: e.escapeString(""), number=1)
+		cells = [name + " (compiled in " + format(compileTime * 1000, ".1f") + " ms)"]
+		for sampleName, s in SAMPLES.items():
+			if escapeCharByChar(e, s) != e.escapeString(s):
+				print("MISMATCH", name, sampleName, file=sys.stderr)
+				failed = True
+			perChar = timeit(lambda e=e, s=s: escapeCharByChar(e, s), number=number) / number * 1e6
+			compiled = timeit(lambda e=e, s=s: e.escapeString(s), number=number) / number * 1e6
+			cells.append(format(perChar, ".1f") + "/" + format(compiled, ".1f") + " (x" + format(perChar / compiled, ".0f") + ")")
+		print(*cells, sep="\t")
+	return int(failed)
+
+
+if __name__ == "__main__":
+	sys.exit(main())
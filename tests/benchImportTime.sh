@@ -0,0 +1,22 @@
+#!/usr/bin/env sh
+# Guards the startup latency of the CLI: importing it must not import any backend and must take no more than MAX_IMPORT_TIME_US microseconds.
+set -e
+
+PYTHON=${PYTHON:-python3}
+MAX_IMPORT_TIME_US=${MAX_IMPORT_TIME_US:-500000}
+
+LOG=$($PYTHON -X importtime -c "import UniGrammar.__main__" 2>&1 >/dev/null)
+
+if echo "$LOG" | grep -q "| *UniGrammar\.tools\."; then
+	echo "Backends are imported eagerly:"
+	echo "$LOG" | grep "| *UniGrammar\.tools\."
+	exit 1
+fi
+
+TOTAL=$(echo "$LOG" | grep "| *UniGrammar\.__main__$" | awk -F "|" '{print $2}' | tr -d " ")
+echo "import UniGrammar.__main__: $TOTAL us (max $MAX_IMPORT_TIME_US us)"
+
+if [ "$TOTAL" -gt "$MAX_IMPORT_TIME_US" ]; then
+	echo "The CLI imports too slow"
+	exit 1
+fi
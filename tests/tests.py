@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+import os
+import pickle
+import sys
+import threading
+import typing
+import unittest
+import warnings
+from importlib import import_module
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+thisDir = Path(__file__).absolute().parent
+sys.path.insert(0, str(thisDir.parent))
+
+from UniGrammar import writeLinesToFile  # noqa: E402
+from UniGrammar.cache import TranspilationCache  # noqa: E402
+from UniGrammar.core.backend.Generator import TranspiledResult  # noqa: E402
+from UniGrammar.core.ast import Grammar  # noqa: E402
+from UniGrammar.core.ast.base import Node, Ref  # noqa: E402
+from UniGrammar.core.ast.compact import CompactGrammar, _serializationHeader  # noqa: E402
+from UniGrammar.core.ast.transformations import rewriteReferences, walkAST  # noqa: E402
+from UniGrammar.core.ast.traversal import getChildren  # noqa: E402
+from UniGrammar.ownGrammarFormat import parseUniGrammar  # noqa: E402
+
+
+def parseProds(*prods: typing.Mapping[str, typing.Any]) -> Grammar:
+	return parseUniGrammar({
+		"meta": {"id": "test", "title": "Test", "license": "Unlicense"},
+		"doc": "A grammar for tests",
+		"chars": [
+			{"id": "a", "lit": "a"},
+			{"id": "b", "lit": "b"},
+			{"id": "c", "lit": "c"},
+			{"id": "x", "lit": "x"},
+		],
+		"prods": list(prods),
+	})
+
+
+def parseSharing() -> Grammar:
+	"""`r1` and `r2` are structurally identical, so they are parsed into a shared subtree"""
+	return parseProds(
+		{"id": "r1", "seq": [{"ref": "a", "cap": "f"}, {"ref": "x", "cap": "s"}]},
+		{"id": "r2", "seq": [{"ref": "a", "cap": "f"}, {"ref": "x", "cap": "s"}]},
+	)
+
+
+def getRefsNames(node: Node) -> typing.List[str]:
+	if isinstance(node, Ref):
+		return [node.name]
+	res = []
+	for child in getChildren(node):
+		res.extend(getRefsNames(child))
+	return res
+
+
+def renameRefsInPlace(node: Node, parent: typing.Optional[Node]) -> typing.Tuple[bool, Node, bool]:  # pylint:disable=unused-argument
+	if isinstance(node, Ref) and node.name == "a":
+		node.name = "b"
+	return True, node, False
+
+
+class SimpleTests(unittest.TestCase):
+	def testRewritingReferencesInSharedSubtrees(self):
+		"""The remap is not idempotent, so the shared `seq` must be rewritten once per rule, not twice"""
+		g = parseSharing()
+		r1 = g.prods.index["r1"]
+		r2 = g.prods.index["r2"]
+		self.assertIs(r1, r2)
+
+		rewriteReferences(g, {"a": "b", "b": "c"})
+		self.assertEqual(getRefsNames(g.prods.index["r1"]), ["b", "x"])
+		self.assertEqual(getRefsNames(g.prods.index["r2"]), ["b", "x"])
+		self.assertEqual(getRefsNames(r1), ["a", "x"])  # the shared subtree is intact
+
+	def testDependenciesAfterRewritingReferences(self):
+		g = parseSharing()
+		self.assertEqual(g.dependencies.getReferences("r1"), {"a", "x"})
+
+		rewriteReferences(g, {"a": "b"})
+		self.assertEqual(g.dependencies.getReferences("r1"), {"b", "x"})
+		self.assertEqual(g.dependencies.getReferences("r2"), {"b", "x"})
+		self.assertIn("a", g.dependencies.getUnreachable())
+		self.assertNotIn("b", g.dependencies.getUnreachable())
+
+	def testDependenciesAfterRewritingReferencesInPlace(self):
+		"""Only `r1` references `a`, so its subtree is not shared and can be rewritten in place"""
+		for walker in (
+			lambda g: rewriteReferences(g, {"a": "b"}, copyOnWrite=False),
+			lambda g: walkAST(g, renameRefsInPlace, copyOnWrite=False),
+		):
+			g = parseProds(
+				{"id": "r1", "seq": [{"ref": "a", "cap": "f"}, {"ref": "x", "cap": "s"}]},
+				{"id": "r2", "ref": "x"},
+			)
+			self.assertEqual(g.dependencies.getReferences("r1"), {"a", "x"})
+
+			self.assertIs(walker(g), g)
+			self.assertEqual(getRefsNames(g.prods.index["r1"]), ["b", "x"])
+			self.assertEqual(g.dependencies.getReferences("r1"), {"b", "x"})
+			self.assertNotIn("b", g.dependencies.getUnreachable())
+
+	def testDigestsAfterRewritingInPlace(self):
+		from UniGrammar.core.ast.digests import getGrammarDigest  # pylint:disable=import-outside-toplevel
+
+		g = parseProds({"id": "r1", "seq": [{"ref": "a", "cap": "f"}, {"ref": "x", "cap": "s"}]})
+		expected = getGrammarDigest(parseProds({"id": "r1", "seq": [{"ref": "b", "cap": "f"}, {"ref": "x", "cap": "s"}]}))
+		self.assertNotEqual(getGrammarDigest(g), expected)
+
+		walkAST(g, renameRefsInPlace, copyOnWrite=False)
+		self.assertEqual(getGrammarDigest(g), expected)
+
+	def testCompactGrammarSerialization(self):
+		g = parseProds(
+			{"id": "r1", "seq": [{"ref": "a", "cap": "f"}, {"ref": "x", "cap": "s"}]},
+			{"id": "items", "template": "delimited", "part": {"ref": "a"}, "delimiter": {"ref": "x"}},
+		)
+		compact = CompactGrammar.fromGrammar(g)
+		data = compact.toBytes()
+
+		restored = CompactGrammar.fromBytes(data)
+		self.assertEqual(restored.strings.strings, compact.strings.strings)
+		self.assertEqual(restored.kinds, compact.kinds)
+		self.assertEqual(restored.meta.id, "test")
+		instantiation = restored.toGrammar().prods.index["items"]
+		self.assertIs(instantiation.template, g.prods.index["items"].template)
+		self.assertEqual(getRefsNames(instantiation.params["part"]), ["a"])
+
+		class Evil:
+			def __reduce__(self):
+				return (os.system, ("exit 1",))
+
+		objectsSize = _serializationHeader.unpack_from(data)[-1]
+		evil = pickle.dumps(Evil())
+		with self.assertRaises(ValueError):
+			CompactGrammar.fromBytes(data[:-objectsSize] + evil)
+
+	def testWritingSameFileFromThreads(self):
+		"""The daemon serves concurrent requests in threads of one process"""
+		with TemporaryDirectory() as d:
+			p = Path(d) / "out.txt"
+			errors = []
+
+			def write(i: int) -> None:
+				try:
+					writeLinesToFile((str(i) for _ in range(20000)), p)
+				except Exception as ex:  # pylint:disable=broad-except
+					errors.append(ex)
+
+			threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+			for t in threads:
+				t.start()
+			for t in threads:
+				t.join()
+
+			self.assertEqual(errors, [])
+			lines = p.read_text(encoding="utf-8").split("\n")
+			self.assertEqual(len(lines), 20000)
+			self.assertEqual(len(set(lines)), 1)
+			self.assertEqual(os.listdir(d), ["out.txt"])
+
+	def testUnwritableTranspilationCache(self):
+		"""Storing into the cache must not fail a transpilation which has succeeded"""
+		with TemporaryDirectory() as d:
+			notADir = Path(d) / "file"
+			notADir.write_text("", encoding="utf-8")
+			cache = TranspilationCache(notADir / "cache")
+
+			cache["k"] = TranspiledResult("g", "text")
+			self.assertEqual(list(cache.teeLines("k", "g", ["a", "b"])), ["a", "b"])
+			self.assertIsNone(cache.get("k"))
+
+	def testRenderingSwitchesInvalidateRenderedRules(self):
+		from UniGrammar import transpile  # pylint:disable=import-outside-toplevel
+		from UniGrammar.tools.python.lark import Lark  # pylint:disable=import-outside-toplevel
+
+		g = parseUniGrammar({
+			"meta": {"id": "props", "title": "Props", "license": "Unlicense"},
+			"doc": "Unicode properties",
+			"chars": [{"id": "upper", "unicode-category": "Lu"}],
+			"tokens": [{"id": "Word", "ref": "upper", "min": 1}],
+			"prods": [{"id": "word", "ref": "Word", "cap": "w"}],
+		})
+		gen = Lark.GENERATOR
+		self.assertNotIn("\\p{Lu}", transpile(g.fork(), gen).text)
+		gen.USES_REGEX_MODULE = True
+		try:
+			self.assertIn("\\p{Lu}", transpile(g.fork(), gen).text)
+		finally:
+			gen.USES_REGEX_MODULE = False
+
+	def testStaleBackendDescriptorIsReported(self):
+		from types import ModuleType, SimpleNamespace  # pylint:disable=import-outside-toplevel
+		from UniGrammar.core.backend.Registry import BackendDescriptor, BackendsRegistry  # pylint:disable=import-outside-toplevel
+
+		meta = SimpleNamespace(product=SimpleNamespace(name="fake"), runtimeLib=("python", "js"), grammarClasses=("LL",))
+		module = ModuleType("fakeBackendForTests")
+		module.Fake = SimpleNamespace(RUNNER=SimpleNamespace(PARSER=SimpleNamespace(META=meta)))
+		sys.modules[module.__name__] = module
+		try:
+			registry = BackendsRegistry()
+			upToDate = BackendDescriptor("fakeBackendForTests:Fake", "fake", ("js", "python"), ("LL",))
+			with warnings.catch_warnings(record=True) as caught:
+				warnings.simplefilter("always")
+				registry.load(upToDate)
+			self.assertEqual(caught, [])
+			self.assertIs(registry.describe(upToDate), upToDate)
+
+			registry = BackendsRegistry()
+			stale = BackendDescriptor("fakeBackendForTests:Fake", "fake", ("python",), ("LL",))
+			with warnings.catch_warnings(record=True) as caught:
+				warnings.simplefilter("always")
+				registry.load(stale)
+			self.assertEqual(len(caught), 1)
+			self.assertIn("langs", str(caught[0].message))
+			self.assertEqual(set(registry.describe(stale).langs), {"python", "js"})
+		finally:
+			del sys.modules[module.__name__]
+
+
+	def testTaskGraphReraisesNonExceptions(self):
+		from UniGrammar.utils.taskGraph import Task, TaskStatus, WorkStealingExecutor  # pylint:disable=import-outside-toplevel
+
+		def interrupt():
+			raise KeyboardInterrupt()
+
+		interrupting = Task("interrupting", "test", interrupt)
+		dependent = Task("dependent", "test", lambda res: res, (interrupting,))
+		independent = [Task("independent" + str(i), "test", lambda: None) for i in range(4)]
+		with self.assertRaises(KeyboardInterrupt):
+			WorkStealingExecutor(2)([interrupting, dependent] + independent)
+		self.assertEqual(interrupting.status, TaskStatus.failed)
+		self.assertEqual(dependent.status, TaskStatus.cancelled)
+
+	def testCanonicalizedCharClassesRendering(self):
+		"""`notDigit` is cheaper negated, but the negation is known to be rendered correctly only by some backends. `digit2` is cheaper merged into a single range."""
+		from UniGrammar import transpile  # pylint:disable=import-outside-toplevel
+
+		g = parseUniGrammar({
+			"meta": {"id": "canon", "title": "Canon", "license": "Unlicense"},
+			"doc": "Canonicalization of char classes",
+			"chars": [
+				{"id": "digit", "range": ["0", "9"]},
+				{"id": "notDigit", "alt": [{"range": ["\u0000", "/"]}, {"range": [":", "\U0010ffff"]}]},
+				{"id": "digit2", "alt": [{"range": ["0", "4"]}, {"range": ["5", "9"]}]},
+			],
+			"tokens": [{"id": "Num", "ref": "digit", "min": 1}, {"id": "Other", "ref": "notDigit", "min": 1}, {"id": "Num2", "ref": "digit2", "min": 1}],
+			"prods": [{"id": "r", "alt": [{"ref": "Num", "cap": "n"}, {"ref": "Other", "cap": "o"}, {"ref": "Num2", "cap": "m"}]}],
+		})
+		for moduleName, toolName, notDigitName, negated, positive in (
+			("UniGrammar.tools.python.parglare", "Parglare", "notDigit", "notDigit: /[^0-9]/;", "digit2: /[0-9]/;"),
+			("UniGrammar.tools.python.lark", "Lark", "not_digit", "not_digit: /[^0-9]/", "digit2: /[0-9]/"),
+			("UniGrammar.tools.multilanguage.antlr4", "ANTLR", "notDigit", None, "digit2: [0-9];"),
+			("UniGrammar.tools.multilanguage.waxeye", "Waxeye", "notDigit", None, "digit2 <- [0-9]"),
+		):
+			with self.subTest(toolName):
+				try:
+					tool = getattr(import_module(moduleName), toolName)
+				except ImportError as ex:
+					self.skipTest(repr(ex))
+				lines = transpile(g.fork(), tool.GENERATOR).text.splitlines()
+				self.assertIn(positive, lines)
+				notDigitDefinition = next(l for l in lines if l.startswith(notDigitName + " ") or l.startswith(notDigitName + ":"))
+				if negated is not None:
+					self.assertEqual(notDigitDefinition, negated)
+				else:  # `[^0-9]` is not ANTLR syntax, `![0-9]` in waxeye consumes nothing
+					self.assertNotRegex(notDigitDefinition, r"\[\^|[~!]\[")
+
+	def testUnicodePropertiesWithinUnions(self):
+		from UniGrammar.core.ast.characters import CharClassUnion, CharRange, UnicodeProperty  # pylint:disable=import-outside-toplevel
+
+		for moduleName, toolName, expected in (
+			("UniGrammar.tools.multilanguage.antlr4", "ANTLR", ("[0-9\\p{Lu}]", "[\\p{Lu}\\p{Ll}]")),
+			("UniGrammar.tools.rust.pest", "Pest", ("(/[0-9]/ | UPPERCASE_LETTER)", "(UPPERCASE_LETTER | LOWERCASE_LETTER)")),
+		):
+			with self.subTest(toolName):
+				try:
+					tool = getattr(import_module(moduleName), toolName)
+				except ImportError as ex:
+					self.skipTest(repr(ex))
+				unions = (
+					CharClassUnion(CharRange("0", "9"), UnicodeProperty("category", "Lu")),
+					CharClassUnion(UnicodeProperty("category", "Lu"), UnicodeProperty("category", "Ll")),
+				)
+				self.assertEqual(tuple(tool.GENERATOR.resolve(u, None) for u in unions), expected)
+
+	def testUnknownUnicodePropertiesAreRejectedWhenParsing(self):
+		for value in ("Foo", "LL", "X"):
+			with self.subTest(value):
+				with self.assertRaises(ValueError):
+					parseUniGrammar({
+						"meta": {"id": "props", "title": "Props", "license": "Unlicense"},
+						"doc": "Unicode properties",
+						"chars": [{"id": "c", "unicode-category": value}],
+						"prods": [{"id": "r", "ref": "c", "cap": "c"}],
+					})
+
+
+if __name__ == "__main__":
+	unittest.main()